@@ -1,36 +1,147 @@
 from concurrent.futures import process
 from sys import prefix
 
+import sys
+import time
+
 import bpy
 import ctypes
 
+from .Profiler import traced, count as profile_count
+from .CompositorPlan import (CRYPTO_CATEGORIES, DATA_CATEGORIES, RGB_CATEGORIES, NODE_TYPES,
+                             PlanSettings, SocketInfo, ViewLayerSnapshot, CompositorPlan, PlanCache,
+                             build_view_layer_plan, diff_plan,
+                             is_managed_slot, base_category,
+                             AXIS_GROUP_NAME)
+
 # 常量和全局变量
-CRYPTO_CATEGORIES = ['CryptoObject00', 'CryptoObject01', 'CryptoObject02', 
-                    'CryptoMaterial00', 'CryptoMaterial01', 'CryptoMaterial02',
-                    'CryptoAsset00', 'CryptoAsset01', 'CryptoAsset02']
-DATA_CATEGORIES = [
-    'Depth', 'Mist', 'Position', 'Normal', 'Vector', 'UV',
-    'IndexOB', 'IndexMA', 'Debug Sample Count', 'Denoising Depth',
-    'Denoising Normal', 'Denoising Albedo'
-]
-RGB_CATEGORIES = [
-    'Image', 'Alpha', 'DiffDir', 'DiffInd', 'DiffCol', 'GlossDir',
-    'GlossInd', 'GlossCol', 'TransDir', 'TransInd', 'TransCol',
-    'VolumeDir', 'VolumeInd', 'Emit', 'Env', 'AO', 'Shadow Catcher',
-    'Noisy Image', 'Noisy Shadow Catcher', 'Shadow', 'Transp'
+# post_processing 插入在渲染层与输出节点之间的节点类型
+# 旧版本逐通道插入的轴向修正节点对，运行时迁移为共用节点组
+LEGACY_AXIS_TYPES = ['CompositorNodeSeparateXYZ', 'CompositorNodeCombineXYZ']
+INSERT_NODE_TYPES = ['CompositorNodeDenoise', 'CompositorNodeGroup'] + LEGACY_AXIS_TYPES
+# 渲染层节点上记录视图层指纹的自定义属性
+FINGERPRINT_KEY = "flash_fingerprint"
+# 实测单次操作耗时（秒）{场景名称: 耗时}，只在本次会话中保留，供试运行估算耗时
+op_costs = {}
+DEFAULT_OP_COST = 0.0005
+# 渲染层节点尚未创建时（试运行、新视图层）由视图层的通道开关推算节点端口：(端口名称, 类型, 开关属性)
+RENDER_PASS_SOCKETS = [
+    ('Image', 'RGBA', 'use_pass_combined'), ('Alpha', 'VALUE', 'use_pass_combined'),
+    ('Depth', 'VALUE', 'use_pass_z'), ('Mist', 'VALUE', 'use_pass_mist'),
+    ('Position', 'VECTOR', 'use_pass_position'), ('Normal', 'VECTOR', 'use_pass_normal'),
+    ('Vector', 'VECTOR', 'use_pass_vector'), ('UV', 'VECTOR', 'use_pass_uv'),
+    ('IndexOB', 'VALUE', 'use_pass_object_index'), ('IndexMA', 'VALUE', 'use_pass_material_index'),
+    ('DiffDir', 'RGBA', 'use_pass_diffuse_direct'), ('DiffInd', 'RGBA', 'use_pass_diffuse_indirect'),
+    ('DiffCol', 'RGBA', 'use_pass_diffuse_color'), ('GlossDir', 'RGBA', 'use_pass_glossy_direct'),
+    ('GlossInd', 'RGBA', 'use_pass_glossy_indirect'), ('GlossCol', 'RGBA', 'use_pass_glossy_color'),
+    ('TransDir', 'RGBA', 'use_pass_transmission_direct'), ('TransInd', 'RGBA', 'use_pass_transmission_indirect'),
+    ('TransCol', 'RGBA', 'use_pass_transmission_color'), ('VolumeDir', 'RGBA', 'use_pass_volume_direct'),
+    ('VolumeInd', 'RGBA', 'use_pass_volume_indirect'), ('Emit', 'RGBA', 'use_pass_emit'),
+    ('Env', 'RGBA', 'use_pass_environment'), ('AO', 'RGBA', 'use_pass_ambient_occlusion'),
+    ('Shadow Catcher', 'RGBA', 'use_pass_shadow_catcher'),
 ]
-NODE_TYPES = ['rgb', 'data', 'cryptomatte', 'shaderaov', 'lightgroup']
+DENOISING_DATA_SOCKETS = [('Denoising Normal', 'VECTOR'), ('Denoising Albedo', 'RGBA'), ('Denoising Depth', 'VALUE')]
+CRYPTOMATTE_SOCKET_PREFIXES = {'object': 'CryptoObject', 'material': 'CryptoMaterial', 'asset': 'CryptoAsset'}
+# 增量更新时统计的操作类型
+OP_COUNTERS = ['nodes_created', 'nodes_removed', 'slots_added', 'slots_removed',
+               'links_created', 'links_removed', 'props_changed']
+
+
+def values_differ(current, value):
+    """比较RNA属性值，向量/颜色按分量比较"""
+    try:
+        if len(current) != len(value):
+            return True
+        return any(abs(a - b) > 1e-4 for a, b in zip(current, value))
+    except TypeError:
+        return current != value
+
+
+def _pass_enabled(view_layer, attr):
+    # Cycles 专有的通道开关位于 view_layer.cycles
+    return bool(getattr(view_layer, attr, False) or getattr(view_layer.cycles, attr, False))
+
+
+def pass_sockets(view_layer, denoising_data=False):
+    """由视图层的通道开关、着色器AOV与灯光组推算渲染层节点的已启用端口（只读取，不创建节点）
+    denoising_data: 配置时会启用降噪数据通道（ensure_denoise_passes），按已启用推算
+    """
+    sockets = [SocketInfo(name, name, True, socket_type)
+               for name, socket_type, attr in RENDER_PASS_SOCKETS if _pass_enabled(view_layer, attr)]
+    if denoising_data or view_layer.cycles.get('denoising_store_passes'):
+        sockets.extend(SocketInfo(name, name, True, socket_type) for name, socket_type in DENOISING_DATA_SOCKETS)
+    # 每个 Cryptomatte 端口包含两层
+    crypto_count = (view_layer.pass_cryptomatte_depth + 1) // 2
+    for kind, prefix in CRYPTOMATTE_SOCKET_PREFIXES.items():
+        if getattr(view_layer, 'use_pass_cryptomatte_' + kind, False):
+            sockets.extend(SocketInfo(f"{prefix}{i:02d}", f"{prefix}{i:02d}", True, 'RGBA')
+                           for i in range(crypto_count))
+    for aov in view_layer.aovs:
+        sockets.append(SocketInfo(aov.name, aov.name, True, 'RGBA' if aov.type == 'COLOR' else 'VALUE'))
+    for lightgroup in view_layer.lightgroups:
+        name = 'Combined_' + lightgroup.name
+        sockets.append(SocketInfo(name, name, True, 'RGBA'))
+    return sockets
+
+
+def uses_compositor(scene):
+    """场景是否启用了节点合成器（未启用或没有节点树时不存在 _Flash 节点）"""
+    return bool(scene.use_nodes) and scene.node_tree is not None
+
+# 系统级缩放比例，每次会话只读取一次
+_system_scaling = None
+
+
+def get_system_scaling():
+    """获取系统级缩放比例（缓存）"""
+    global _system_scaling
+    if _system_scaling is None:
+        _system_scaling = _read_system_scaling()
+    return _system_scaling
+
+
+def _read_system_scaling():
+    # 后台模式没有界面，节点尺寸不受显示器缩放影响
+    if getattr(bpy.app, 'background', False):
+        return 1.0
+    if sys.platform == 'win32':
+        # Windows：读取显示器缩放设置
+        try:
+            ctypes.windll.shcore.SetProcessDpiAwareness(1)
+            scale_factor = ctypes.windll.shcore.GetScaleFactorForDevice(0) / 100
+            return round(scale_factor, 2)
+        except (AttributeError, OSError):
+            return 1.0  # 默认无缩放
+    # 其他平台：Blender 的整体缩放除以用户界面缩放即为系统（DPI）缩放
+    try:
+        preferences = bpy.context.preferences
+        scale_factor = preferences.system.ui_scale / preferences.view.ui_scale
+        return round(scale_factor, 2) or 1.0
+    except (AttributeError, ZeroDivisionError):
+        return 1.0
+
 
 """
 节点布局类
 """
 class NodeLayoutManager:
+    # 节点尚未绘制时（dimensions 为 0）用于估算高度的尺寸
+    SOCKET_HEIGHT = 22
+    RENDER_LAYER_HEADER = 100
+    OUTPUT_FILE_HEADER = 140
+    NODE_SPACING = 40
+
     def __init__(self, ui_scale):
         self.ui_scale = ui_scale
 
+    @property
+    def scale(self):
+        """节点尺寸（像素）到节点编辑器坐标的换算系数"""
+        return self.ui_scale * get_system_scaling()
+
     def calculate_node_height(self, node):
         """准确计算节点高度"""
-        height = node.dimensions[1] / self.ui_scale / self.get_system_scaling()
+        height = node.dimensions[1] / self.scale
         return height + 20
 
     def get_nodes_bound(self, user_nodes):
@@ -38,36 +149,232 @@ class NodeLayoutManager:
         if not user_nodes:
             return [0, 0, 0, 0]
 
-        # 初始化首个节点的边界
-        first_node = user_nodes[0]
-        left = first_node.location.x
-        right = left + first_node.width
-        top = first_node.location.y
-        bottom = top - self.calculate_node_height(first_node)
-
-        # 遍历剩余节点更新边界
-        for node in user_nodes[1:]:
-            node_left = node.location.x
-            node_right = node_left + node.width
-            node_top = node.location.y
-            node_bottom = node_top - self.calculate_node_height(node)
-
-            left = min(left, node_left)
-            right = max(right, node_right)
-            top = max(top, node_top)
-            bottom = min(bottom, node_bottom)
+        # 单次遍历累计边界，不构造中间数组
+        scale = self.scale
+        left = bottom = float('inf')
+        right = top = float('-inf')
+        for node in user_nodes:
+            x, y = node.location.x, node.location.y
+            left = min(left, x)
+            right = max(right, x + node.width)
+            top = max(top, y)
+            bottom = min(bottom, y - (node.dimensions[1] / scale + 20))
 
         return [left, right, top, bottom]
 
     def get_system_scaling(self):
-        """获取Windows系统级缩放比例"""
-        try:
-            ctypes.windll.shcore.SetProcessDpiAwareness(1)
-            scale_factor = ctypes.windll.shcore.GetScaleFactorForDevice(
-                0) / 100
-            return round(scale_factor, 2)
-        except:
-            return 1.0  # 默认无缩放
+        """获取系统级缩放比例"""
+        return get_system_scaling()
+
+    def estimate_output_height(self, slot_count):
+        """按插槽数量估算输出文件节点高度"""
+        return self.OUTPUT_FILE_HEADER + slot_count * self.SOCKET_HEIGHT
+
+    def estimate_view_layer_height(self, vl_plan):
+        """按规划估算一个视图层（渲染层 + 输出节点）占用的高度"""
+        socket_count = sum(len(aovs) for aovs in vl_plan.aov_dict.values())
+        render_layer_height = self.RENDER_LAYER_HEADER + socket_count * self.SOCKET_HEIGHT
+        outputs_height = sum(self.estimate_output_height(len(p.slots)) + self.NODE_SPACING
+                             for p in vl_plan.outputs.values())
+        return max(render_layer_height, outputs_height)
+
+
+"""
+视图层网格布局
+每个视图层的节点组占一个单元，按列自上而下排列，超出列高后换到下一列；
+每次放置只看当前列的底部，整体为一次 O(n) 遍历
+"""
+class GridLayout:
+    def __init__(self, column_height=20000, column_width=2400, spacing=500):
+        self.column_height = column_height
+        self.column_width = column_width
+        self.spacing = spacing
+        self.bottoms = {}  # 列序号 -> 下一个单元的顶部y
+        self.column = 0
+
+    def column_of(self, x):
+        return int(round(x / self.column_width))
+
+    def reserve(self, x, bottom):
+        """登记已有节点组占用的区域，新单元排在其下方"""
+        column = self.column_of(x)
+        self.bottoms[column] = min(self.bottoms.get(column, 0), bottom - self.spacing)
+
+    def cursor(self):
+        """下一个单元的左上角（未考虑换列）"""
+        return (self.column * self.column_width, self.bottoms.get(self.column, 0))
+
+    def place(self, height):
+        """放置一个高度为 height 的单元，返回其左上角"""
+        while True:
+            top = self.bottoms.get(self.column, 0)
+            # 空列总能放下一个单元
+            if top == 0 or height - top <= self.column_height:
+                break
+            self.column += 1
+        self.bottoms[self.column] = top - height - self.spacing
+        return (self.column * self.column_width, top)
+
+
+"""
+_Flash 节点索引
+每次运行解析一次 {viewlayer}_{kind}_Flash 名称，
+按 (视图层, 分类, 节点类型) 分桶，创建/删除节点时同步更新
+"""
+class FlashNodeIndex:
+    # 名称可直接解析出视图层的节点类型
+    LAYER_KINDS = ['RLayers', 'OutputFile']
+    # 名称前缀为 {viewlayer}_{端口} 的插入节点类型
+    INSERT_KINDS = ['Denoise', 'AxisCorrect', 'SeparateXYZ', 'CombineXYZ']
+
+    def __init__(self, node_tree, viewlayer_names=()):
+        self.node_tree = node_tree
+        self.viewlayer_names = set(viewlayer_names)
+        self.nodes = {}      # 名称 -> 节点
+        self.keys = {}       # 名称 -> (视图层, 分类, 节点类型)
+        self.buckets = {}    # (视图层, 分类, 节点类型) -> 节点
+        self.by_layer = {}   # 视图层 -> {名称}
+        self.by_kind = {}    # 节点类型 -> {名称}
+        self.user_nodes = {} # 非 _Flash 节点
+        self.rebuild()
+
+    def rebuild(self):
+        """遍历一次节点树建立索引"""
+        for mapping in (self.nodes, self.keys, self.buckets, self.by_layer, self.by_kind, self.user_nodes):
+            mapping.clear()
+
+        pending = []
+        # 场景未启用节点合成器时没有节点树
+        for node in self.node_tree.nodes if self.node_tree is not None else ():
+            if not node.name.endswith("_Flash"):
+                self.user_nodes[node.name] = node
+                continue
+            key = self.parse(node.name)
+            if key is None:
+                pending.append(node)
+                continue
+            # 已删除视图层的名称也需要识别，供插入节点解析
+            self.viewlayer_names.add(key[0])
+            self._insert(node, key)
+
+        for node in pending:
+            self._insert(node, self.parse(node.name))
+
+    def parse(self, name):
+        """解析节点名称，返回 (视图层, 分类, 节点类型)，无法识别返回 None"""
+        parts = name.rsplit('_', 2)
+        if len(parts) != 3 or parts[2] != "Flash":
+            return None
+        prefix, kind = parts[0], parts[1]
+        if kind == 'RLayers':
+            return (prefix, None, kind)
+        if kind == 'OutputFile':
+            viewlayer_name, _, category = prefix.rpartition('_')
+            return (viewlayer_name, category, kind) if viewlayer_name else None
+        if kind in self.INSERT_KINDS:
+            # {viewlayer}_{端口}：取最长的已知视图层名称作为前缀
+            pos = len(prefix)
+            while pos > 0:
+                pos = prefix.rfind('_', 0, pos)
+                if pos <= 0:
+                    break
+                if prefix[:pos] in self.viewlayer_names:
+                    return (prefix[:pos], prefix[pos + 1:], kind)
+        return None
+
+    def _insert(self, node, key):
+        self.nodes[node.name] = node
+        if key is None:
+            return
+        self.keys[node.name] = key
+        self.buckets[key] = node
+        self.by_layer.setdefault(key[0], set()).add(node.name)
+        self.by_kind.setdefault(key[2], set()).add(node.name)
+
+    def add(self, node):
+        """登记新建或重命名后的节点"""
+        if not node.name.endswith("_Flash"):
+            self.user_nodes[node.name] = node
+            return
+        key = self.parse(node.name)
+        if key and key[2] in self.LAYER_KINDS:
+            self.viewlayer_names.add(key[0])
+        self._insert(node, key)
+
+    def discard(self, node):
+        """在节点被删除前调用，移除其索引"""
+        name = node.name
+        self.user_nodes.pop(name, None)
+        if self.nodes.pop(name, None) is None:
+            return
+        key = self.keys.pop(name, None)
+        if key is None:
+            return
+        if self.buckets.get(key) is node:
+            del self.buckets[key]
+        self.by_layer.get(key[0], set()).discard(name)
+        self.by_kind.get(key[2], set()).discard(name)
+
+    def get(self, name):
+        node = self.nodes.get(name)
+        return node if node is not None else self.user_nodes.get(name)
+
+    def find(self, viewlayer_name, category, kind):
+        return self.buckets.get((viewlayer_name, category, kind))
+
+    def nodes_of(self, viewlayer_name=None, kinds=None):
+        """按视图层和/或节点类型筛选节点"""
+        if viewlayer_name is not None:
+            names = self.by_layer.get(viewlayer_name, set())
+        else:
+            names = self.nodes.keys()
+        if kinds is not None:
+            names = [n for n in names if self.keys.get(n, (None, None, None))[2] in kinds]
+        return [self.nodes[n] for n in names]
+
+
+"""
+连接索引
+由 node_tree.links 一次建立 输入端口 -> 上游端口 的映射，
+以端口指针为键，随连接和节点的增删同步更新
+"""
+class LinkIndex:
+    def __init__(self, node_tree):
+        self.node_tree = node_tree
+        self.sources = {}  # 输入端口指针 -> (上游端口, 上游节点)
+        self.targets = {}  # 输出端口指针 -> {输入端口指针}
+        for link in node_tree.links if node_tree is not None else ():
+            self.record(link.from_socket, link.to_socket, link.from_node)
+
+    def record(self, from_socket, to_socket, from_node):
+        """登记新连接，单输入端口上的旧连接会被替换"""
+        to_ptr = to_socket.as_pointer()
+        self.forget(to_socket)
+        self.sources[to_ptr] = (from_socket, from_node)
+        self.targets.setdefault(from_socket.as_pointer(), set()).add(to_ptr)
+
+    def forget(self, to_socket):
+        """移除输入端口上的连接记录"""
+        to_ptr = to_socket.as_pointer()
+        source = self.sources.pop(to_ptr, None)
+        if source:
+            self.targets.get(source[0].as_pointer(), set()).discard(to_ptr)
+
+    def discard_node(self, node):
+        """在节点被删除前调用，清除其所有端口的连接记录"""
+        for socket in node.inputs:
+            self.forget(socket)
+        for socket in node.outputs:
+            for to_ptr in self.targets.pop(socket.as_pointer(), ()):
+                self.sources.pop(to_ptr, None)
+
+    def source(self, to_socket):
+        """返回 (上游端口, 上游节点)，未连接返回 (None, None)"""
+        return self.sources.get(to_socket.as_pointer(), (None, None))
+
+    def is_linked(self, from_socket, to_socket):
+        source = self.sources.get(to_socket.as_pointer())
+        return bool(source) and source[0].as_pointer() == from_socket.as_pointer()
 
 
 """
@@ -80,21 +387,55 @@ class BlenderCompositor:
                  separate_data=0,
                  separate_cryptomatte=1,
                  separate_shaderaov=0,
-                 separate_lightgroup=0):
-        # 启动节点合成器
-        bpy.context.scene.use_nodes = 1
-        # 全局变量
-        self.scene = bpy.context.scene
-        self.node_tree = bpy.context.scene.node_tree
+                 separate_lightgroup=0,
+                 scene=None,
+                 plan_cache=None):
+        # 全局变量（默认处理当前场景）
+        self.scene = scene if scene is not None else bpy.context.scene
+        # 节点合成器只在配置时启用（setup_compositor_steps），其他操作不修改场景
+        self.node_tree = self.scene.node_tree
         self.scene_view_layers = self.scene.view_layers
         self.ui_scale = bpy.context.preferences.view.ui_scale
 
         # 全局设置
         self.enable_denoise = 1
         self.axis_correct = 1
+        # 降噪策略（DenoisePolicy），为 None 时对所有 rgb/灯光组通道降噪
+        self.denoise_policy = None
+        # 逐通道精度策略（PrecisionPolicy），为 None 时每个节点使用统一的位深
+        self.precision_policy = None
+        # 输出节点拆分策略（ShardPolicy），为 None 时每个分类一个节点
+        self.shard_policy = None
+        # 各分类输出节点的颜色 {分类: (r, g, b)}，未指定时使用默认颜色
+        self.node_colors = {}
         self.render_out_nodes_width = 800
         self.view_layer_nodes_width = 500
+        # 网格布局：渲染层相对单元原点的偏移、列高与列宽
+        self.render_layer_offset = -400
+        self.column_height = 20000
+        self.column_width = 2400
         self.supported_classes = NODE_TYPES
+        # 增量模式：只对已有_Flash节点做最小修改，不再重排已有节点
+        self.incremental = 0
+        self.stats = {key: 0 for key in OP_COUNTERS}
+        # 最近一次运行生成的规划
+        self.plan = None
+        self._node_index = None
+        self._link_index = None
+        # 本次运行已计算的视图层规划 {视图层: (设置, ViewLayerPlan)}
+        self._layer_plans = {}
+        # 分类缓存，批量处理多个场景时共享同一个实例
+        self.plan_cache = plan_cache if plan_cache is not None else PlanCache()
+        # 增量模式下因指纹未变而跳过的视图层
+        self.skipped_view_layers = []
+        # 预处理中清理的失效视图层节点数量
+        self.invalid_nodes_removed = 0
+        # 本次运行中未能完成的操作，由调用方写入报告，不输出到控制台
+        self.warnings = []
+        # 试运行：只读取与规划，不修改节点树
+        self.dry_run = False
+        # 分步执行时由调用方置位，完成当前视图层后停止
+        self.cancelled = False
 
         # 添加分离控制参数
         self.separate_data = separate_data
@@ -104,32 +445,95 @@ class BlenderCompositor:
 
         self.node_layout = NodeLayoutManager(self.ui_scale)
 
+    @property
+    def op_count(self):
+        """本次运行实际执行的修改操作总数"""
+        return sum(self.stats.values())
+
+    def _count(self, key, n=1):
+        self.stats[key] += n
+        profile_count(key, n)
+
+    def _warn(self, message):
+        self.warnings.append(message)
+
+    def _set_prop(self, obj, attr, value):
+        """仅在属性值变化时写入，避免无意义的RNA写操作"""
+        if values_differ(getattr(obj, attr), value):
+            setattr(obj, attr, value)
+            self._count('props_changed')
+            return True
+        return False
+
+    def _new_link(self, from_socket, to_socket):
+        link = self.node_tree.links.new(from_socket, to_socket)
+        self.link_index.record(from_socket, to_socket, link.from_node)
+        self._count('links_created')
+        return link
+
+    def _remove_link(self, link):
+        self.link_index.forget(link.to_socket)
+        self.node_tree.links.remove(link)
+        self._count('links_removed')
+
+    def _remove_node(self, node):
+        self.node_index.discard(node)
+        self.link_index.discard_node(node)
+        self.node_tree.nodes.remove(node)
+        self._count('nodes_removed')
+
+    def refresh_indexes(self):
+        """丢弃节点与连接索引，下次访问时按节点树现状重建；
+        分步执行的间隙中用户可能增删了节点，每次继续执行前调用
+        """
+        self.node_tree = self.scene.node_tree
+        self._node_index = None
+        self._link_index = None
+
+    @property
+    def node_index(self):
+        """本次运行的 _Flash 节点索引，首次访问时建立"""
+        if self._node_index is None:
+            self._node_index = FlashNodeIndex(
+                self.node_tree, [vl.name for vl in self.scene.view_layers])
+        return self._node_index
+
+    @property
+    def link_index(self):
+        """本次运行的连接索引，首次访问时建立"""
+        if self._link_index is None:
+            self._link_index = LinkIndex(self.node_tree)
+        return self._link_index
+
     def find_user_nodes(self):
-        # 遍历节点，筛选名称以 "Flash" 结尾的节点（区分大小写）
-        return [node for node in self.node_tree.nodes 
-                if node.name and not node.name.endswith("Flash")]
+        # 筛选名称不以 "Flash" 结尾的用户节点（区分大小写）
+        return [node for node in self.node_index.user_nodes.values() if node.name]
 
-    def create_node(self, bl_idname, location=(0, 0), prefix=None):
-        """创建或获取一个节点"""
+    def create_node(self, bl_idname, location=(0, 0), prefix=None, kind=None):
+        """创建或获取一个节点，kind 为名称中的节点类型（默认取自 bl_idname）"""
         # 生成唯一节点名称
-        node_name = f"{prefix}_{bl_idname[14:]}_Flash"
+        node_name = f"{prefix}_{kind or bl_idname[14:]}_Flash"
 
         # 检查现有节点
-        existing_node = self.node_tree.nodes.get(node_name)
+        existing_node = self.node_index.get(node_name)
         if existing_node and existing_node.bl_idname == bl_idname:
-            # 复用现有节点
+            # 复用现有节点，增量模式下保留用户调整过的位置
             node = existing_node
-            node.location = location
+            if not self.incremental:
+                self._set_prop(node, 'location', location)
         else:
             # 创建新节点
             node = self.node_tree.nodes.new(bl_idname)
             node.location = location
             node.name = node_name
+            self.node_index.add(node)
+            self._count('nodes_created')
 
         return node
 
+    @traced()
     def set_render_layer_node(self, view_layer, location=(0, 0)):
-        """为指定视图层创建/更新渲染节点"""
+        """为指定视图层创建/更新渲染节点（已有节点的位置由调用方维护）"""
         # 获取视图层名称
         viewlayer_name = view_layer.name if hasattr(
             view_layer, 'name') else view_layer
@@ -138,64 +542,93 @@ class BlenderCompositor:
         target_name = f"{viewlayer_name}_RLayers_Flash"
 
         # 查找现有节点
-        existing_node = self.node_tree.nodes.get(target_name)
+        existing_node = self.node_index.get(target_name)
         if existing_node and existing_node.type == 'R_LAYERS':
             # 复用现有节点
             node = existing_node
-            node.layer = viewlayer_name  # 更新视图层关联
-            node.location = location
+            # 先绑定场景，layer 按节点所属场景的视图层解析
+            scene_changed = self._set_prop(node, 'scene', self.scene)
+            if self._set_prop(node, 'layer', viewlayer_name) or scene_changed:  # 更新视图层关联
+                self.invalidate_aov_cache(viewlayer_name)
         else:
             # 创建新节点
             node = self.create_node(
                 'CompositorNodeRLayers', location=location, prefix=viewlayer_name)
             node.label = viewlayer_name
+            # 新建的渲染层节点绑定 bpy.context.scene，需先指定本场景再设置视图层
+            node.scene = self.scene
             node.layer = viewlayer_name
-            
+            # 快照从渲染层节点读取端口，新建节点后需重新分类
+            self.invalidate_aov_cache(viewlayer_name)
 
         return node
 
-    def get_viewlayer_aov(self, viewlayer_name: str) -> dict:
-        # 需要先存在视图层节点，否则会报错
-        # 初始化数据结构
-        aov_dict = {category: [] for category in NODE_TYPES}
-
-        # 查找对应的视图层对象
-        target_view_layer = next(
-            (vl for vl in self.scene.view_layers if vl.name == viewlayer_name), None)
-        if not target_view_layer:
-            print(f"ViewLayer '{viewlayer_name}' not found")
-            return aov_dict
+    def plan_settings(self) -> PlanSettings:
+        """当前开关对应的规划设置"""
+        return PlanSettings(
+            separate_data=self.separate_data,
+            separate_cryptomatte=self.separate_cryptomatte,
+            separate_shaderaov=self.separate_shaderaov,
+            separate_lightgroup=self.separate_lightgroup,
+            enable_denoise=self.enable_denoise,
+            axis_correct=self.axis_correct,
+            denoise_policy=self.denoise_policy,
+            precision_policy=self.precision_policy,
+            shard_policy=self.shard_policy,
+        )
 
-        # 获取关联的渲染层节点
-        target_name = f"{viewlayer_name}_RLayers_Flash"
-        render_layer_node = self.node_tree.nodes.get(target_name)
+    @traced()
+    def snapshot_view_layer(self, view_layer) -> ViewLayerSnapshot:
+        """读取视图层与其渲染层节点，生成不依赖bpy的快照"""
+        # 渲染层节点尚未创建时（试运行、新视图层的布局估算）按视图层的通道开关推算端口
+        target_name = f"{view_layer.name}_RLayers_Flash"
+        render_layer_node = self.node_index.get(target_name)
         if not render_layer_node:
-            print(f"RenderLayer node for '{viewlayer_name}' not found")
-            return aov_dict
+            sockets = pass_sockets(view_layer, denoising_data=bool(self.enable_denoise))
+        else:
+            sockets = [SocketInfo(o.identifier, o.name, o.enabled, o.type)
+                       for o in render_layer_node.outputs if o.name]
+
+        return ViewLayerSnapshot(
+            view_layer.name,
+            sockets=sockets,
+            shader_aovs=[aov.name for aov in view_layer.aovs],
+            lightgroups=[lg.name for lg in view_layer.lightgroups],
+        )
 
-        # 收集Shader AOV（从指定视图层获取）
-        aov_dict['shaderaov'] = ["shd_" +aov.name for aov in target_view_layer.aovs]
+    def get_view_layer_plan(self, view_layer):
+        """视图层的AOV分类与规划，每次运行只计算一次，各阶段共用"""
+        settings = self.plan_settings()
+        cached = self._layer_plans.get(view_layer.name)
+        if cached and cached[0] == settings.to_dict():
+            return cached[1]
+        vl_plan = build_view_layer_plan(self.snapshot_view_layer(view_layer), settings,
+                                        self.plan_cache)
+        self._layer_plans[view_layer.name] = (settings.to_dict(), vl_plan)
+        return vl_plan
+
+    def is_view_layer_unchanged(self, render_layer_node, vl_plan):
+        """指纹未变且规划中的节点都存在时，视图层无需重新配置"""
+        if render_layer_node.get(FINGERPRINT_KEY) != vl_plan.fingerprint:
+            return False
+        return all(self.node_index.get(name) for name in vl_plan.node_names())
+
+    def invalidate_aov_cache(self, viewlayer_name=None):
+        """渲染通道变化后清除缓存，不指定视图层时全部清除"""
+        if viewlayer_name is None:
+            self._layer_plans.clear()
+        else:
+            self._layer_plans.pop(viewlayer_name, None)
 
-        # 收集LightGroups（从指定视图层获取）
-        aov_dict['lightgroup'] = ["lgt_" + lg.name for lg in target_view_layer.lightgroups]
+    def build_plan(self) -> CompositorPlan:
+        """根据已有的渲染层节点为所有视图层生成规划（不修改节点树）"""
+        return CompositorPlan(self.plan_settings(), [
+            self.get_view_layer_plan(vl) for vl in self.scene.view_layers
+        ])
 
-        # 分析节点输出端口
-        for output in render_layer_node.outputs:
-            # 跳过空端口
-            if not output.enabled or not output.name:
-                continue
-            
-            # 分类逻辑
-        for i in render_layer_node.outputs:
-            if i.enabled:
-                if i.identifier in RGB_CATEGORIES:
-                    aov_dict['rgb'].append(i.name)
-                if i.identifier in DATA_CATEGORIES:
-                    aov_dict['data'].append(i.name)
-                if i.identifier in CRYPTO_CATEGORIES:
-                    aov_dict['cryptomatte'].append(i.name)
-
-        return aov_dict
+    def _is_insert_node(self, node):
+        """是否为 post_processing 插入的 _Flash 降噪/轴向修正节点"""
+        return node.name.endswith("_Flash") and node.bl_idname in INSERT_NODE_TYPES
 
     def link_nodes(self, from_node, from_socket_name, to_node, to_socket_name):
         """连接两个节点，若插槽不存在则跳过"""
@@ -208,269 +641,141 @@ class BlenderCompositor:
         if not to_socket:
             return
 
-        if not any(link.from_node == from_node and link.from_socket == from_socket for link in to_socket.links):
-            self.node_tree.links.new(from_socket, to_socket)
+        if not self.link_index.is_linked(from_socket, to_socket):
+            self._new_link(from_socket, to_socket)
 
-    def _process_aov_data(self, aov_dict):
-        """统一处理AOV分类数据（合并adjust_separate_aov功能）"""
-        processed = {category: aov_dict.get(category, []).copy() for category in NODE_TYPES}
-
-        # 特殊处理
-        processed['rgb'] = [
-            'rgba' if aov == 'Image' else aov  # 将 'Image' 替换为 'rgba'
-            for aov in processed['rgb']
-            if aov not in {'Alpha'}  # 过滤掉 'Alpha'
-        ]
-        processed['data'] = [aov for aov in processed['data'] if aov not in {'Denoising Normal', 'Denoising Albedo', 'Debug Sample Count', 'IndexOB', 'IndexMA'}]
-
-        # 合并处理逻辑
-        merge_categories = []
-        for category, should_separate in [
-            ('data', self.separate_data),
-            ('cryptomatte', self.separate_cryptomatte),
-            ('shaderaov', self.separate_shaderaov),
-            ('lightgroup', self.separate_lightgroup)
-        ]:
-            if should_separate:
-                processed[category] = processed.get(category, [])
-            else:
-                merge_categories.append(category)
-                processed['rgb'].extend(processed.get(category, []))
-
-        # 清空被合并的分类
-        for category in merge_categories:
-            processed[category] = []
-
-        return processed
+    @traced()
+    def connect_sockets(self, from_node, to_node, pairs, skip_inserted=False):
+        """批量连接 [(上游端口名, 下游端口名)]，只创建缺失的连接，返回新建数量
+        skip_inserted: 跳过已由降噪/轴向修正节点连接的下游端口
+        """
+        # 与 outputs.get/inputs.get 一致：同名端口取第一个
+        outputs = {}
+        for socket in from_node.outputs:
+            outputs.setdefault(socket.name, socket)
+        inputs = {}
+        for socket in to_node.inputs:
+            inputs.setdefault(socket.name, socket)
+
+        created = 0
+        for from_socket_name, to_socket_name in pairs:
+            from_socket = outputs.get(from_socket_name)
+            to_socket = inputs.get(to_socket_name)
+            if not from_socket or not to_socket:
+                continue
+            current_socket, current_node = self.link_index.source(to_socket)
+            if current_socket is not None:
+                if current_socket.as_pointer() == from_socket.as_pointer():
+                    continue
+                if skip_inserted and self._is_insert_node(current_node):
+                    continue
+            self._new_link(from_socket, to_socket)
+            created += 1
+        return created
 
-        
-    def set_output_nodes(self, view_layer, location=(0, 0)) -> dict:
+    @traced()
+    def set_output_nodes(self, view_layer, location=(0, 0), vl_plan=None) -> dict:
         """为指定视图层创建完整输出节点系统
         返回: {类型: 节点} 的字典 (如 {'rgb': OutputFileNode, 'data': OutputFileNode})
         """
-        # 获取AOV数据
-        aov_dict = self.get_viewlayer_aov(view_layer.name)
-        modified_aov = self._process_aov_data(aov_dict)
-        
+        if vl_plan is None:
+            vl_plan = self.get_view_layer_plan(view_layer)
+
         # 创建输出文件节点字典
         output_nodes = {}
         x_offset = location[0]
         y_offset = location[1]
 
-        # 配置分类规则
-        category_rules = [
-            ('rgb', True),  # RGB 总是需要创建
-            ('data', self.separate_data),
-            ('cryptomatte', self.separate_cryptomatte),
-            ('shaderaov', self.separate_shaderaov),
-            ('lightgroup', self.separate_lightgroup)
-        ]
-
-        for category, enabled in category_rules:
-            # 仅当分类有内容且启用时创建节点
-            if enabled and modified_aov.get(category):
-                node = self._get_output_node(
-                    position=(x_offset, y_offset),
-                    modified_aovs = modified_aov,
-                    aov_dict = aov_dict,
-                    view_layer=view_layer,
-                    category=category,
-                )
-                output_nodes[category] = node
-                # 更新Y轴偏移量
-                y_offset -= self.node_layout.calculate_node_height(node) + 20
+        # 规划中只包含启用且有内容的分类
+        for category, output_plan in vl_plan.outputs.items():
+            node = self._get_output_node(
+                position=(x_offset, y_offset),
+                output_plan=output_plan,
+            )
+            output_nodes[category] = node
+            # 更新Y轴偏移量（新建节点尚未绘制时按插槽数估算）
+            height = max(self.node_layout.calculate_node_height(node),
+                         self.node_layout.estimate_output_height(len(output_plan.slots)))
+            y_offset -= height + 20
 
-        # print(output_nodes)
         return output_nodes
 
-    def _get_output_node(self, position, modified_aovs, aov_dict, view_layer, category, width=500):
+    @traced()
+    def reconcile_file_slots(self, node, slots):
+        """一次遍历同步输出节点的插槽：通过数据API删除过期插槽并补齐缺失插槽
+        不依赖 NODE_EDITOR 区域与 bpy.ops，保留的插槽连接不受影响
+        返回 (删除数量, 新增数量)
+        """
+        wanted = set(slots)
+        existing = set()
+        stale = []
+        for socket in node.inputs:
+            if socket.name in wanted:
+                existing.add(socket.name)
+            elif is_managed_slot(socket.name):
+                stale.append(socket)
+
+        for socket in stale:
+            # 删除插槽时 Blender 会一并删除其连接，这里同步连接索引
+            if self.link_index.source(socket)[0] is not None:
+                self.link_index.forget(socket)
+                self._count('links_removed')
+            node.file_slots.remove(socket)
+        self._count('slots_removed', len(stale))
+
+        added = 0
+        for aov in slots:
+            if aov not in existing:
+                node.file_slots.new(aov)
+                existing.add(aov)
+                added += 1
+        self._count('slots_added', added)
+        return len(stale), added
+
+    def _get_output_node(self, position, output_plan, width=500):
         # 创建或复用一个指定分类（category）的输出文件节点（Output File Node），
         # 并根据当前 AOV（Arbitrary Output Variable）配置动态管理其插槽（file slots），
         # 以确保节点状态与数据一致。
-        from contextlib import contextmanager
-        @contextmanager
-        def override_area(area_type='NODE_EDITOR'):
-            for area in bpy.context.screen.areas:
-                if area.type == area_type:
-                    for region in area.regions:
-                        if region.type == 'WINDOW':
-                            override = {
-                                'window': bpy.context.window,
-                                'screen': bpy.context.screen,
-                                'area': area,
-                                'region': region,
-                                'scene': bpy.context.scene,
-                                'space_data': area.spaces.active,
-                            }
-                            with bpy.context.temp_override(**override):
-                                yield
-                            return
-            yield
-
-        def remove_named_slot_from_output_node(node: bpy.types.Node, name: str):
-            # 从输出文件节点中删除指定名称的插槽（file slot），
-            # 并断开该插槽的所有连接，最后重建其余插槽。
-            # print(name)
-            if node and node.type == 'OUTPUT_FILE':
-                node_tree = self.scene.node_tree
-                # 设置节点为当前活动节点（激活节点）
-                node_tree.nodes.active = node
-                # 断开输入 socket 对应链接
-                socket = node.inputs.get(name)
-                if socket:
-                    for link in list(socket.links):
-                        node_tree.links.remove(link)
-                        
-                    
-            # 直接遍历插槽并删除匹配名称的插槽
-            for i, slot in enumerate(node.file_slots):
-                if slot.path == name:
-                    # 设置当前插槽为激活状态
-                    node.active_input_index = i
-                    # 删除激活插槽
-                    bpy.ops.node.output_file_remove_active_socket()
-                    print(f"已从节点 {node.name} 中删除插槽{name}")
-                    break  # 因为名称唯一，找到后即可退出循环
-            else:
-                print("请提供一个有效的 Output File 节点。")
-                
-        
         """创建/匹配单个分类的输出节点"""
-        node_name = f"{view_layer.name}_{category}_OutputFile_Flash"
-        node = self.node_tree.nodes.get(node_name)
+        category = output_plan.category
+        slots = output_plan.slots
+        node_name = output_plan.name
+        node = self.node_index.get(node_name)
 
-
-        # 将 modified_aovs 字典合并为一个去重后的列表
-        all_aovs = RGB_CATEGORIES + DATA_CATEGORIES + CRYPTO_CATEGORIES
-        print(modified_aovs[category])
         if node and node.type == 'OUTPUT_FILE':
-            # 移除在 aovs 中且不在输入类别的aov_dict 中的端口
-            existing_slots = {slot.path for slot in node.file_slots}
+            # 同步 layer_slots 与 file_slots 的名称
             for i, slotname in enumerate(node.layer_slots.keys()):
                 if not node.layer_slots[i].name == node.file_slots[i].path:
                     node.file_slots[i].path = slotname
                     node.layer_slots[i].name  = slotname
 
-            for i, slotname in enumerate(node.layer_slots.keys()):
-                if slotname not in modified_aovs[category] and slotname in all_aovs:
-                    remove_named_slot_from_output_node(node, slotname)
-                elif slotname not in modified_aovs[category] and slotname[:4] in ["shd_", "lgt_"]:
-                    remove_named_slot_from_output_node(node, slotname)
-                    print(slotname)
-            print("###")
-            
         else:
             # 创建新节点并设置前缀
-            prefix = f"{view_layer.name}_{category}"
+            prefix = f"{output_plan.view_layer}_{category}"
             node = self.create_node(
                 'CompositorNodeOutputFile', position, prefix=prefix)
             node.name = node_name
             # 删除名为 "Image" 的插槽（如果存在）
             if len(node.file_slots) == 1:
                 node.file_slots.clear()
-            # 添加初始插槽
-            for aov in modified_aovs[category]:
-                node.file_slots.new(aov)
 
-        node.use_custom_color = True
-        if category in ['rgb', 'lightgroup']:
-            node.color = (0.15, 0.25, 0.15)
-        else:
-            node.color = (0.19, 0.15, 0.25)
+        self._set_prop(node, 'use_custom_color', True)
+        color = self.node_colors.get(base_category(category))
+        if color is None:
+            color = (0.15, 0.25, 0.15) if base_category(category) in ['rgb', 'lightgroup'] else (0.19, 0.15, 0.25)
+        self._set_prop(node, 'color', color)
 
-        # 添加需要的插槽（确保不重复添加）
-        existing_slots = {slot.path for slot in node.file_slots}
-        for aov in modified_aovs[category]:
-            if aov not in existing_slots:
-                node.file_slots.new(aov)
+        # 删除过期插槽并添加需要的插槽（确保不重复添加）
+        self.reconcile_file_slots(node, slots)
 
         # 设置节点属性
-        node.location = position
-        node.width = width
-        node.label = f"{view_layer.name} {category}"
+        if not self.incremental:
+            self._set_prop(node, 'location', position)
+        self._set_prop(node, 'width', width)
+        self._set_prop(node, 'label', output_plan.label)
 
         return node
 
-
-    def _get_normalized_render_aov_name(self, view_layer, aov_name: str) -> str:
-        """集中处理所有特殊端口名称转换"""
-        # 处理前缀问题
-        if aov_name == "rgba":
-            return "Image"
-        names = aov_name.split('_', 1)
-        if len(names)==2:
-            if names[0] == "lgt":
-                return f"Combined_{names[1]}"
-            if names[0] == "shd":
-                return names[1]
-
-        return aov_name
-
-    def _get_normalized_out_aov_name(self, aov_name: str) -> str:
-        """集中处理所有特殊端口名称转换"""
-        # # 处理 LightGroup 前缀问题
-        # names = aov_name.split('_', 1)
-        # if len(names)==2:
-        #     if names[0] == "lgt":
-        #         return f"lgt_{names[1]}"
-        #     if names[0] == "shd":
-        #         return names[1]
-        return aov_name
-
-    def auto_connect_aov(self, from_node, to_node, view_layer, aov_name: str):
-        """智能连接方法（替换原link_nodes直接调用）"""
-        normalized_render_name = self._get_normalized_render_aov_name(view_layer, aov_name)
-        normalized_out_name = self._get_normalized_out_aov_name(aov_name)
-        
-        # print(normalized_render_name, normalized_out_name)
-
-        try:
-            # 修正连接方向：原始输出端口 -> 标准化输入端口
-            self.link_nodes(from_node, normalized_render_name, to_node, normalized_out_name)
-            # self.link_nodes(from_node, aov_name, to_node, aov_name)
-            pass
-        except KeyError:
-            # 回退到原始名称连接
-            try:
-                print(f"警告: 使用回退连接 {aov_name}")
-            except Exception as e:
-                print(f"连接失败: {aov_name} -> {str(e)}")
-
-    def get_connected_nodes(self, start_node):
-        """获取从指定节点开始的所有连接节点"""
-        nodes = [start_node]
-        visited = set()
-        stack = [start_node]
-        while stack:
-            current_node = stack.pop()
-            if current_node not in visited:
-                visited.add(current_node)
-                for output in current_node.outputs:
-                    for link in output.links:
-                        if link.to_node not in visited:
-                            nodes.append(link.to_node)
-                            stack.append(link.to_node)
-        return nodes
-
-    def connect_denoise_node(self, render_layer_node, output_files, aov_name, y_offset):
-        """连接Denoise节点的输入和输出端口"""
-        denoise_node = self.create_node(
-            'CompositorNodeDenoise', location=(600, y_offset))
-        denoise_node.hide = True  # 设置 Denoise 节点为最小折叠状态
-
-        if not self.scene.cycles['use_denoising']:
-            self.scene.cycles['use_denoising_store_passes'] = True
-        self.link_nodes(render_layer_node, aov_name, denoise_node, 'Image')
-        self.link_nodes(render_layer_node, 'Denoising Normal',
-                        denoise_node, 'Normal')
-        self.link_nodes(render_layer_node, 'Denoising Albedo',
-                        denoise_node, 'Albedo')
-        self.link_nodes(denoise_node, 'Image', output_files, aov_name)
-
-        # 返回下一个节点的y偏移量
-        return y_offset - 30
-
-
     def insert_node_between(self,
                             from_node,
                             to_node,
@@ -480,7 +785,9 @@ class BlenderCompositor:
                             prefix=None,
                             extra_links=None,
                             location_offset=(200, 0),
-                            hide_node=True):
+                            hide_node=True,
+                            kind=None,
+                            node_tree=None):
         """
         插入一个新节点，并自动处理上下游连接。
         支持多插槽连接。
@@ -494,15 +801,21 @@ class BlenderCompositor:
         - prefix: 节点名称前缀
         - location_offset: 新节点位置偏移量
         - hide_node: 是否折叠节点
+        - kind: 节点名称中的类型，默认取自 new_bl_idname
+        - node_tree: 节点组节点使用的节点组
         """
         # 创建新节点
         new_node = self.create_node(
             new_bl_idname,
             location=(to_node.location.x + location_offset[0],
                     to_node.location.y + location_offset[1]),
-            prefix=prefix or f"{from_node.name}_{to_node.name}"
+            prefix=prefix or f"{from_node.name}_{to_node.name}",
+            kind=kind
         )
-        new_node.hide = hide_node
+        self._set_prop(new_node, 'hide', hide_node)
+        # 节点组的端口由节点组接口决定，需要先指定节点组
+        if node_tree is not None:
+            self._set_prop(new_node, 'node_tree', node_tree)
 
         # 获取新节点的输入和输出端口名
         in_sockets = list(new_node.inputs.keys())
@@ -517,8 +830,8 @@ class BlenderCompositor:
                 self.link_nodes(new_node, out_sock, to_node, to_sock)
 
         except KeyError as e:
-            print(f"连接失败: {str(e)}")
-            self.node_tree.nodes.remove(new_node)
+            self._warn(f"连接失败: {e}")
+            self._remove_node(new_node)
             return None
 
         return new_node
@@ -531,7 +844,7 @@ class BlenderCompositor:
         - middle_node: 要移除的中间节点
         """
         if not middle_node:
-            print("中间节点为空，无法移除")
+            self._warn("中间节点为空，无法移除")
             return
 
         # 获取上游节点和下游节点
@@ -561,137 +874,303 @@ class BlenderCompositor:
                 # 断开中间节点的所有输入输出连接
                 for input_socket in middle_node.inputs:
                     for link in input_socket.links:
-                        self.node_tree.links.remove(link)
+                        self._remove_link(link)
                 for output_socket in middle_node.outputs:
                     for link in output_socket.links:
-                        self.node_tree.links.remove(link)
+                        self._remove_link(link)
                 
                 # 重新连接上下游节点
                 self.link_nodes(from_node, from_socket_name, to_node, to_socket_name)
             except Exception as e:
-                print(f"连接恢复失败: {str(e)}")
+                self._warn(f"连接恢复失败: {e}")
 
         # 无论是否成功重新连接，最终移除中间节点
-        self.node_tree.nodes.remove(middle_node)
+        self._remove_node(middle_node)
 
-    def post_processing(self, viewlayer):
-        """为指定视图层的输出节点添加降噪"""
+    @traced()
+    def post_processing(self, viewlayer, vl_plan=None):
+        """为指定视图层的输出节点插入规划中的降噪与轴向修正节点"""
+        if vl_plan is None:
+            vl_plan = self.get_view_layer_plan(viewlayer)
 
-        axis_corr_layers = ['Position', 'Normal', 'Vector']
+        if self.enable_denoise:
+            self.ensure_denoise_passes(viewlayer)
 
-        for category in ['rgb', 'lightgroup', 'data']:
-            output_node = self.node_tree.nodes.get(
-                f"{viewlayer.name}_{category}_OutputFile_Flash")
+        for insert in vl_plan.inserts:
+            output_node = self.node_index.get(insert.output)
             if not output_node:
                 continue
-            
-            # 遍历outfile node
-            y_offset = 0  # 初始偏移量
-            
-            if self.enable_denoise:
-                viewlayer.cycles['denoising_store_passes'] = 1
-                aov_dict = self.get_viewlayer_aov(viewlayer.name)
-                processed_aov = {
-                    'rgb': ['rgba' if x == 'Image' else x for x in aov_dict.get('rgb', [])],
-                    'lightgroup': aov_dict.get('lightgroup', []),
-                }
-                denoise_layers = processed_aov['rgb'] + processed_aov['lightgroup']
-            else:
-                for node in self.node_tree.nodes:
-                    if node.bl_idname == 'CompositorNodeDenoise' and node.name.endswith("_Flash"):
-                        self.remove_node_between(node)
-                        
-            if not self.axis_correct:
-                for node in self.node_tree.nodes:
-                    if node.bl_idname in ["CompositorNodeSeparateXYZ", "CompositorNodeCombineXYZ"] and node.name.endswith("_Flash"):
-                        self.remove_node_between(node)
-                
-            for input_socket in output_node.inputs:
-                if self.enable_denoise:
-                    if input_socket.is_linked and input_socket.name in denoise_layers:
-                        # 获取上游连接
-                        from_node = input_socket.links[0].from_node
-                        from_socket = input_socket.links[0].from_socket
-                        
-                        if from_node.bl_idname == 'CompositorNodeRLayers':
-                            # 插入降噪节点
-                            self.insert_node_between(
-                                from_node=from_node,
-                                to_node=output_node,
-                                new_bl_idname='CompositorNodeDenoise',
-                                from_sockets=[from_socket.name, 'Denoising Normal', 'Denoising Albedo'],
-                                to_sockets=[input_socket.name],
-                                prefix=f"{viewlayer.name}_{from_socket.name}",
-                                location_offset=(-500, y_offset),
-                                hide_node=True
-                            )
-                            y_offset -= 30  # 垂直间距调整
-                            
-                if self.axis_correct:
-                    if input_socket.is_linked and input_socket.name in axis_corr_layers:
-                        # 获取上游连接
-                        from_node = input_socket.links[0].from_node
-                        from_socket = input_socket.links[0].from_socket
-                        if from_node.bl_idname == 'CompositorNodeRLayers':
-                            
-                            self.insert_node_between(
-                                from_node=from_node,
-                                to_node=output_node,
-                                new_bl_idname='CompositorNodeCombineXYZ',
-                                from_sockets=[from_socket.name],
-                                to_sockets=[input_socket.name],
-                                prefix=f"{viewlayer.name}_{from_socket.name}",
-                                location_offset=(-400, y_offset),
-                                hide_node=True
-                            )
-                            
-                            to_node = self.node_tree.nodes.get(
-                                f"{viewlayer.name}_{from_socket.name}_CombineXYZ_Flash")
-                            
-                            self.insert_node_between(
-                                from_node=from_node,
-                                to_node=to_node,
-                                new_bl_idname='CompositorNodeSeparateXYZ',
-                                from_sockets=[from_socket.name],
-                                to_sockets=['X', 'Z', 'Y'],
-                                prefix=f"{viewlayer.name}_{from_socket.name}",
-                                location_offset=(-200, 0),
-                                hide_node=True
-                            )
-                        
-                        y_offset -= 30  # 垂直间距调整
+            input_socket = output_node.inputs.get(insert.slot)
+            if not input_socket:
+                continue
 
+            # 处理直接来自渲染层的连接；已插入的规划节点只检查其输入连接，用户自定义的上游保持不变
+            from_socket, from_node = self.link_index.source(input_socket)
+            if from_node is not None and from_node.name == insert.node_names()[0]:
+                from_node = self.node_index.get(vl_plan.render_layer)
+                from_socket = from_node.outputs.get(insert.socket) if from_node else None
+                if from_socket is None:
+                    continue
+            if from_node is None or from_node.bl_idname != 'CompositorNodeRLayers':
+                continue
 
-        
+            y_offset = -30 * insert.index  # 垂直间距调整
+            if insert.kind == 'denoise':
+                # 插入降噪节点
+                self.insert_node_between(
+                    from_node=from_node,
+                    to_node=output_node,
+                    new_bl_idname='CompositorNodeDenoise',
+                    from_sockets=[from_socket.name, 'Denoising Normal', 'Denoising Albedo'],
+                    to_sockets=[input_socket.name],
+                    prefix=insert.prefix,
+                    location_offset=(-500, y_offset),
+                    hide_node=True
+                )
+            elif insert.kind == 'axis':
+                # 插入共用轴向修正节点组的实例
+                self.insert_node_between(
+                    from_node=from_node,
+                    to_node=output_node,
+                    new_bl_idname='CompositorNodeGroup',
+                    from_sockets=[from_socket.name],
+                    to_sockets=[input_socket.name],
+                    prefix=insert.prefix,
+                    location_offset=(-400, y_offset),
+                    hide_node=True,
+                    kind='AxisCorrect',
+                    node_tree=self.ensure_axis_group()
+                )
 
-    def preprocess_compositor_nodes(self):
-        """预处理合成器节点"""
-        # 新增逻辑：清理失效视图层节点（优先执行）
+        # 按降噪策略设置预过滤/质量（已有的降噪节点同样更新）
+        for insert in vl_plan.inserts:
+            if insert.options:
+                node = self.node_index.get(insert.node_names()[0])
+                if node:
+                    self.apply_node_options(node, insert.options)
+
+    def ensure_axis_group(self):
+        """获取或创建共用的轴向修正节点组：Vector -> 分离XYZ -> (X, Z, Y) -> 合并XYZ -> Vector"""
+        group = bpy.data.node_groups.get(AXIS_GROUP_NAME)
+        if group is not None:
+            return group
+
+        group = bpy.data.node_groups.new(AXIS_GROUP_NAME, type='CompositorNodeTree')
+        if hasattr(group, 'interface'):
+            # Blender 4.0+
+            group.interface.new_socket('Vector', in_out='INPUT', socket_type='NodeSocketVector')
+            group.interface.new_socket('Vector', in_out='OUTPUT', socket_type='NodeSocketVector')
+        else:
+            group.inputs.new('NodeSocketVector', 'Vector')
+            group.outputs.new('NodeSocketVector', 'Vector')
+
+        nodes, links = group.nodes, group.links
+        group_input = nodes.new('NodeGroupInput')
+        group_input.location = (-400, 0)
+        separate = nodes.new('CompositorNodeSeparateXYZ')
+        separate.location = (-200, 0)
+        combine = nodes.new('CompositorNodeCombineXYZ')
+        combine.location = (0, 0)
+        group_output = nodes.new('NodeGroupOutput')
+        group_output.location = (200, 0)
+
+        links.new(group_input.outputs[0], separate.inputs['Vector'])
+        for a, b in [('X', 'X'), ('Y', 'Z'), ('Z', 'Y')]:
+            links.new(separate.outputs[a], combine.inputs[b])
+        links.new(combine.outputs['Vector'], group_output.inputs[0])
+        return group
+
+    @traced()
+    def migrate_axis_pairs(self):
+        """将旧版本逐通道插入的 SeparateXYZ/CombineXYZ 节点对替换为渲染层直连，
+        随后由 post_processing 插入共用节点组，返回迁移的节点对数量
+        """
+        index = self.node_index
+        migrated = 0
+        for combine in index.nodes_of(kinds=['CombineXYZ']):
+            if combine.bl_idname != 'CompositorNodeCombineXYZ':
+                continue
+            separate = index.get(combine.name[:-len("_CombineXYZ_Flash")] + "_SeparateXYZ_Flash")
+            source = (None, None)
+            if separate is not None and separate.bl_idname == 'CompositorNodeSeparateXYZ':
+                source = self.link_index.source(separate.inputs['Vector'])
+            targets = [link.to_socket for socket in combine.outputs for link in socket.links]
+
+            self._remove_node(combine)
+            if separate is not None:
+                self._remove_node(separate)
+            from_socket, from_node = source
+            if from_node is not None and from_node.bl_idname == 'CompositorNodeRLayers':
+                for to_socket in targets:
+                    self._new_link(from_socket, to_socket)
+            migrated += 1
+
+        # 没有对应合并节点的分离节点
+        for separate in index.nodes_of(kinds=['SeparateXYZ']):
+            if separate.bl_idname == 'CompositorNodeSeparateXYZ':
+                self._remove_node(separate)
+        return migrated
+
+    def apply_node_options(self, node, options):
+        """写入插入节点的属性，当前 Blender 版本不支持的属性跳过"""
+        for attr, value in options.items():
+            if hasattr(node, attr):
+                self._set_prop(node, attr, value)
+
+    def denoise_report(self, plan=None) -> dict:
+        """每帧与整个镜头的降噪节点执行次数"""
+        summary = (plan or self.plan or self.build_plan()).denoise_summary()
+        frames = self.scene.frame_end - self.scene.frame_start + 1
+        summary['frames'] = frames
+        summary['per_shot'] = summary['per_frame'] * frames
+        return summary
+
+    def ensure_denoise_passes(self, viewlayer):
+        """降噪节点需要渲染层输出 Denoising Normal/Albedo"""
+        if not viewlayer.cycles.get('denoising_store_passes'):
+            viewlayer.cycles['denoising_store_passes'] = 1
+            self._count('props_changed')
+            # 渲染层端口发生变化
+            self.invalidate_aov_cache(viewlayer.name)
+
+    @traced()
+    def remove_stale_inserts(self, plan):
+        """移除规划中已不存在的降噪/轴向修正节点，并恢复直接连接
+        只处理规划包含的视图层（已删除视图层的节点在预处理中清理）
+        """
+        planned = plan.node_names()
+        for vl_plan in plan.view_layers:
+            for node in self.node_index.nodes_of(vl_plan.name, kinds=FlashNodeIndex.INSERT_KINDS):
+                if self._is_insert_node(node) and node.name not in planned:
+                    self.remove_node_between(node)
+
+    @traced()
+    def remove_invalid_viewlayer_nodes(self):
+        """删除已失效视图层的全部 _Flash 节点，返回删除数量"""
         scene_viewlayer_names = {vl.name for vl in self.scene.view_layers}
-        # 查找所有RLayers节点（不包含自定义节点）
-        rlayer_nodes = [node for node in self.node_tree.nodes 
-                        if node.name.endswith("_RLayers_Flash")]
-            
-        # 验证并清理失效节点
-        invalid_viewlayers = set()
-        for node in rlayer_nodes:
-            # 关键验证：节点关联的视图层是否存在
-            viewlayer_name = node.name[:-len("_RLayers_Flash")]
-            if not node.layer == viewlayer_name:
+        index = self.node_index
+
+        # 按节点名称解析出的视图层已不存在
+        invalid_viewlayers = {name for name, names in index.by_layer.items()
+                              if names and name not in scene_viewlayer_names}
+        # 渲染层节点关联的视图层与名称不一致（视图层被重命名）
+        for node in index.nodes_of(kinds=['RLayers']):
+            viewlayer_name = index.keys[node.name][0]
+            if node.layer != viewlayer_name:
                 invalid_viewlayers.add(viewlayer_name)
-                self.node_tree.nodes.remove(node)
-        
 
-        # 清理与失效视图层相关的所有节点
-        if invalid_viewlayers:
-            for node in self.node_tree.nodes:
-                # 检查节点名称是否包含任何失效视图层名称
-                if any(name in node.name for name in invalid_viewlayers):
-                    # 安全移除节点
-                    try:
-                        self.node_tree.nodes.remove(node)
-                    except ReferenceError:
-                        pass  # 节点已被其他过程移除
+        removed = 0
+        for viewlayer_name in invalid_viewlayers:
+            for node in index.nodes_of(viewlayer_name):
+                self._remove_node(node)
+                removed += 1
+        return removed
+
+    @traced()
+    def teardown(self, keep_render_layers=False, restore_links=True) -> dict:
+        """一次遍历删除全部 _Flash 节点，返回删除统计
+        keep_render_layers: 保留插件创建的渲染层节点（清除其指纹，下次配置时重新检查）
+        restore_links: 经过降噪/轴向修正节点连到用户节点的连接改为从上游直连
+        节点与连接各遍历一次，不使用逐个端口查询 socket.links
+        """
+        start = time.perf_counter()
+        self.stats = {key: 0 for key in OP_COUNTERS}
+        self._node_index = None
+        self._link_index = None
+        self.plan = None
+        if not uses_compositor(self.scene):
+            # 未启用节点合成器的场景没有 _Flash 节点，不启用也不修改
+            return {'scene': self.scene.name, 'nodes_removed': 0, 'render_layers_kept': 0,
+                    'links_restored': 0, 'node_groups_removed': 0, 'user_nodes': 0,
+                    'time': round(time.perf_counter() - start, 4)}
+        nodes = self.node_tree.nodes
+
+        removed = set()
+        kept_render_layers = []
+        user_count = 0
+        for node in nodes:
+            if not node.name.endswith("_Flash"):
+                user_count += 1
+            elif keep_render_layers and node.bl_idname == 'CompositorNodeRLayers':
+                kept_render_layers.append(node)
+            else:
+                removed.add(node.as_pointer())
+
+        # 删除前记录需要恢复的连接：(上游端口, 用户节点的输入端口)
+        restore = []
+        if restore_links and removed:
+            # 插入节点输入端口 -> 上游，按端口顺序取第一个连接作为直通输入
+            first_input = {}
+            boundary = []
+            for link in self.node_tree.links:
+                from_node, to_node = link.from_node, link.to_node
+                if to_node.as_pointer() in removed:
+                    if self._is_insert_node(to_node):
+                        inputs = first_input.setdefault(to_node.as_pointer(), {})
+                        inputs[link.to_socket.as_pointer()] = link
+                elif from_node.as_pointer() in removed and self._is_insert_node(from_node):
+                    boundary.append(link)
+
+            def upstream(node):
+                """沿插入节点的第一个已连接输入向上查找未被删除的上游端口"""
+                seen = set()
+                while node.as_pointer() in removed and node.as_pointer() not in seen:
+                    seen.add(node.as_pointer())
+                    inputs = first_input.get(node.as_pointer())
+                    if not inputs:
+                        return None
+                    link = next((inputs[socket.as_pointer()] for socket in node.inputs
+                                 if socket.as_pointer() in inputs), None)
+                    if link is None:
+                        return None
+                    if link.from_node.as_pointer() not in removed:
+                        return link.from_socket
+                    node = link.from_node
+                return None
+
+            for link in boundary:
+                from_socket = upstream(link.from_node)
+                if from_socket is not None:
+                    restore.append((from_socket, link.to_socket))
+
+        if removed and user_count == 0 and not kept_render_layers:
+            # 节点树中只有 _Flash 节点时整体清空
+            nodes.clear()
+        else:
+            for node in [node for node in nodes if node.as_pointer() in removed]:
+                nodes.remove(node)
+        self._count('nodes_removed', len(removed))
+
+        for from_socket, to_socket in restore:
+            self.node_tree.links.new(from_socket, to_socket)
+        self._count('links_created', len(restore))
+
+        for node in kept_render_layers:
+            if FINGERPRINT_KEY in node:
+                del node[FINGERPRINT_KEY]
+
+        # 不再被使用的轴向修正节点组
+        groups_removed = 0
+        group = bpy.data.node_groups.get(AXIS_GROUP_NAME)
+        if group is not None and group.users == 0:
+            bpy.data.node_groups.remove(group)
+            groups_removed = 1
+
+        return {
+            'scene': self.scene.name,
+            'nodes_removed': len(removed),
+            'render_layers_kept': len(kept_render_layers),
+            'links_restored': len(restore),
+            'node_groups_removed': groups_removed,
+            'user_nodes': user_count,
+            'time': round(time.perf_counter() - start, 4),
+        }
+
+    @traced()
+    def preprocess_compositor_nodes(self):
+        """预处理合成器节点，返回清理的失效视图层节点数量"""
+        # 清理失效视图层节点（优先执行）
+        removed = self.remove_invalid_viewlayer_nodes()
 
         # 删除默认节点
         user_nodes = self.find_user_nodes()
@@ -699,8 +1178,8 @@ class BlenderCompositor:
             node_names = {n.name for n in user_nodes}
             if node_names == {'Render Layers', 'Composite'}:
                 for node in user_nodes:
-                    self.node_tree.nodes.remove(node)
-                return
+                    self._remove_node(node)
+                return removed
 
         # 原有逻辑：情况2 - 调整用户节点布局
         if user_nodes:
@@ -708,41 +1187,35 @@ class BlenderCompositor:
             if bounds[3] < 0:
                 move_offset = -bounds[3] + 200
                 for node in user_nodes:
-                    node.location.y += move_offset
+                    self._set_prop(node, 'location', (node.location.x, node.location.y + move_offset))
 
         # 原有逻辑：移除无用降噪节点
-        for node in self.node_tree.nodes:
-            if node.bl_idname == 'CompositorNodeDenoise' and node.name.endswith("_Flash"):
+        for node in self.node_index.nodes_of(kinds=['Denoise']):
+            if node.bl_idname == 'CompositorNodeDenoise':
                 has_output_links = any(output.is_linked for output in node.outputs)
                 if not has_output_links:
-                    self.node_tree.nodes.remove(node)
+                    self._remove_node(node)
+        return removed
 
 
-    def reconfigure_output_nodes(self):
+    @traced()
+    def reconfigure_output_nodes(self, plan=None):
         """重新配置已经存在的 File Output 节点"""
-        # 创建一个字典来存储每个分类的分离状态
-        separation_status = {
-            'data': self.separate_data,
-            'cryptomatte': self.separate_cryptomatte,
-            'shaderaov': self.separate_shaderaov,
-            'lightgroup': self.separate_lightgroup
-        }
-
-        # 遍历每个视图层
-        for view_layer in self.scene.view_layers:
-            viewlayer_name = view_layer.name
-
-            # 获取 AOV 数据
-            aov_dict = self.get_viewlayer_aov(viewlayer_name)
-            processed_aov = self._process_aov_data(aov_dict)
-
-            # 检查每个分类的 File Output 节点
-            for category in separation_status:
-                node_name = f"{viewlayer_name}_{category}_OutputFile_Flash"
-                node = self.node_tree.nodes.get(node_name)
-                if node and node.type == 'OUTPUT_FILE':
-                    if not separation_status[category] or not processed_aov.get(category, []):
-                        self.node_tree.nodes.remove(node)
+        if plan is None:
+            plan = self.build_plan()
+
+        # 遍历每个视图层，移除规划中不再需要的分类节点（包括按精度/预算拆分的节点）
+        for vl_plan in plan.view_layers:
+            rgb_planned = any(base_category(key) == 'rgb' for key in vl_plan.outputs)
+            for node in self.node_index.nodes_of(vl_plan.name, kinds=['OutputFile']):
+                category = self.node_index.keys[node.name][1]
+                if base_category(category) not in NODE_TYPES:
+                    continue
+                # rgb 节点没有插槽时也保留；rgb 被拆分后移除未拆分的节点
+                if category == 'rgb' and not rgb_planned:
+                    continue
+                if category not in vl_plan.outputs and node.type == 'OUTPUT_FILE':
+                    self._remove_node(node)
 
     def get_output_nodes_by_name(self) -> dict:
         """通过节点名查找输出文件节点，返回{视图层: {类型: 节点}}结构"""
@@ -750,84 +1223,211 @@ class BlenderCompositor:
         
         # 支持的输出类型列表
         valid_types = ['rgb', 'data', 'cryptomatte', 'shaderaov', 'lightgroup']
-        
-        for node in self.node_tree.nodes:
-            # 筛选输出文件节点且名称符合命名规则
-            if node.type == 'OUTPUT_FILE' and node.name.endswith("_OutputFile_Flash"):
-                # 解析节点名称结构：{viewlayer}_{type}_OutputFile_Flash
-                parts = node.name.rsplit('_', 3)  # 从后往前分割，分割成最多4部分
-                if len(parts) != 4:
-                    continue  # 跳过不符合命名规则的节点
-                
-                # 提取视图层名称和类型
-                viewlayer_name = "_".join(parts[:-3])  # 合并所有部分，除了最后三个
-                node_type = parts[-3]
-                
-                if node_type not in valid_types:
-                    continue  # 没有找到有效类型
-                
-                # 验证视图层是否存在
-                if not any(vl.name == viewlayer_name for vl in self.scene.view_layers):
-                    continue
-                
-                # 构建数据结构
-                if viewlayer_name not in output_structure:
-                    output_structure[viewlayer_name] = {}
-                
-                output_structure[viewlayer_name][node_type] = node
+        scene_viewlayer_names = {vl.name for vl in self.scene.view_layers}
+
+        # 名称已在索引中解析为 {viewlayer}_{type}_OutputFile_Flash
+        for node in self.node_index.nodes_of(kinds=['OutputFile']):
+            viewlayer_name, node_type, _ = self.node_index.keys[node.name]
+            if node.type != 'OUTPUT_FILE' or base_category(node_type) not in valid_types:
+                continue
+            # 验证视图层是否存在
+            if viewlayer_name not in scene_viewlayer_names:
+                continue
+
+            output_structure.setdefault(viewlayer_name, {})[node_type] = node
 
         return output_structure
 
 ############
-    def setup_compositor_nodes(self):
-        self.preprocess_compositor_nodes()
-        
+    def collect_tree_state(self) -> dict:
+        """节点树现状的纯数据描述：_Flash 节点、输出插槽及其上游连接"""
+        state = {'nodes': sorted(self.node_index.keys), 'slots': {}, 'sources': {}}
+        for node in self.node_index.nodes_of(kinds=['OutputFile']):
+            sources = {}
+            for socket in node.inputs:
+                from_socket, from_node = self.link_index.source(socket)
+                if from_node is not None:
+                    sources[socket.name] = (from_node.name, from_socket.name)
+            state['slots'][node.name] = [socket.name for socket in node.inputs]
+            state['sources'][node.name] = sources
+        return state
+
+    @traced()
+    def plan_changes(self) -> dict:
+        """试运行：生成规划并与节点树现状对比，返回修改清单、操作数与耗时估算
+        op_estimate 只统计规划差异中节点、插槽与连接的增删，是近似值：
+        属性写入与插入节点时的中间连接不计入，实际 op_count 通常更大
+        """
+        start = time.perf_counter()
+        self._node_index = None
+        self._link_index = None
+        self.invalidate_aov_cache()
+        self.dry_run = True
+        try:
+            plan = self.build_plan()
+            # 供 preview_scene 估算格式与路径的写入
+            self.plan = plan
+        finally:
+            self.dry_run = False
+            # 试运行的规划基于推算的端口，不留给正式运行使用
+            self.invalidate_aov_cache()
+        changes = diff_plan(plan, self.collect_tree_state())
+        planning_time = time.perf_counter() - start
+
+        op_estimate = sum(len(changes[key]) for key in OP_COUNTERS if key in changes)
+        op_cost = op_costs.get(self.scene.name, DEFAULT_OP_COST)
+        return {
+            'scene': self.scene.name,
+            'plan': plan.to_dict(),
+            'changes': changes,
+            'op_estimate': op_estimate,
+            'denoise': self.denoise_report(plan),
+            'planning_time': round(planning_time, 4),
+            'runtime_estimate': round(planning_time + op_estimate * op_cost, 4),
+        }
+
+    def view_layer_grid(self):
+        """创建本次运行的网格布局；增量模式下先登记已有视图层占用的区域"""
+        layout = GridLayout(self.column_height, self.column_width, self.view_layer_nodes_width)
+        if self.incremental:
+            for view_layer in self.scene.view_layers:
+                node = self.node_index.get(f"{view_layer.name}_RLayers_Flash")
+                if node is None or node.type != 'R_LAYERS':
+                    continue
+                bounds = self.node_layout.get_nodes_bound(self.node_index.nodes_of(view_layer.name))
+                layout.reserve(node.location.x - self.render_layer_offset, bounds[3])
+        return layout
+
+    @traced()
+    def setup_compositor_nodes(self, dry_run=False):
+        """配置所有视图层的输出节点，返回 {视图层: {类型: 节点}}
+        每个视图层先读取快照生成规划（CompositorPlan），再写入节点树；
+        增量模式下只应用与目标状态的差异，操作数记录在 self.stats
+        dry_run 时不修改节点树，返回 plan_changes() 的报告
+        """
+        if dry_run:
+            return self.plan_changes()
+        return run_steps(self.setup_compositor_steps())
+
+    def setup_compositor_steps(self):
+        """setup_compositor_nodes 的分步版本（生成器），供模态操作符分批执行
+        每完成一个视图层 yield (已完成, 总数)，结束时返回 {视图层: {类型: 节点}}；
+        self.cancelled 置位后不再开始新的视图层，已配置的视图层完整可用，其余保持原状
+        """
+        start = time.perf_counter()
+        self.stats = {key: 0 for key in OP_COUNTERS}
+        self.cancelled = False
+        # 启动节点合成器
+        if not self.scene.use_nodes:
+            self.scene.use_nodes = True
+        self.node_tree = self.scene.node_tree
+        # 每次运行重新建立节点与连接索引，之后随增删同步更新
+        self._node_index = None
+        self._link_index = None
+        self.invalidate_aov_cache()
+        self.skipped_view_layers = []
+        self.warnings = []
+        self.invalid_nodes_removed = self.preprocess_compositor_nodes()
+        self.migrate_axis_pairs()
+
+        settings = self.plan_settings()
+        viewlayer_plans = []
         viewlayer_outfile_nodes = {}
-        vertical_offset = 0  # 垂直布局起始偏移量
-        
-        # 遍历所有视图层
-        for view_layer in self.scene.view_layers:
-            # 创建渲染层节点
-            self.set_render_layer_node(
-                view_layer, 
-                location=(-400, vertical_offset)
-            )
-            
+        layout = self.view_layer_grid()
+        # 只保存名称：分步执行的间隙中视图层可能被删除，每一步重新按名称查找
+        view_layer_names = [view_layer.name for view_layer in self.scene.view_layers]
+
+        # 逐个视图层完成配置，中途取消时节点树保持一致
+        for i, view_layer_name in enumerate(view_layer_names):
+            if self.cancelled:
+                break
+            view_layer = self.scene.view_layers.get(view_layer_name)
+            if view_layer is None:
+                continue
+            vl_plan, output_nodes = self.setup_view_layer(view_layer, layout, settings)
+            viewlayer_plans.append(vl_plan)
+            viewlayer_outfile_nodes[view_layer.name] = output_nodes
+            self.plan = CompositorPlan(settings, viewlayer_plans)
+            yield i + 1, len(view_layer_names)
+
+        self.plan = CompositorPlan(settings, viewlayer_plans)
+
+        # 记录实测的单次操作耗时，供试运行估算
+        if self.op_count:
+            op_costs[self.scene.name] = (time.perf_counter() - start) / self.op_count
+
+        return viewlayer_outfile_nodes
+
+    @traced()
+    def setup_view_layer(self, view_layer, layout, settings):
+        """配置单个视图层：渲染层、输出节点、连接、后处理与指纹，返回 (ViewLayerPlan, {类型: 节点})"""
+        existing_node = self.node_index.get(f"{view_layer.name}_RLayers_Flash")
+        if existing_node and existing_node.type != 'R_LAYERS':
+            existing_node = None
+        if self.enable_denoise:
+            self.ensure_denoise_passes(view_layer)
+
+        # 网格布局：按规划估算高度放置单元，放不下时换列
+        # 先确定位置再写入，渲染层节点的位置每次运行最多写一次
+        if existing_node and self.incremental:
+            # 增量模式下已有的视图层保持原位置
+            origin = (existing_node.location.x - self.render_layer_offset, existing_node.location.y)
+        else:
+            # 新视图层按通道开关推算的规划估算高度
+            origin = layout.place(self.node_layout.estimate_view_layer_height(
+                self.get_view_layer_plan(view_layer)))
+        location = (origin[0] + self.render_layer_offset, origin[1])
+
+        # 创建渲染层节点（新建节点后快照改为读取节点端口）
+        render_layer_node = self.set_render_layer_node(view_layer, location=location)
+        if existing_node:
+            self._set_prop(render_layer_node, 'location', location)
+
+        # 规划：纯数据计算目标状态
+        vl_plan = self.get_view_layer_plan(view_layer)
+        layer_plan = CompositorPlan(settings, [vl_plan])
+
+        skipped = self.incremental and self.is_view_layer_unchanged(render_layer_node, vl_plan)
+        if skipped:
+            # 指纹未变：沿用已有节点，跳过插槽、连接与后处理
+            self.skipped_view_layers.append(view_layer.name)
+            output_nodes = {category: self.node_index.get(output_plan.name)
+                            for category, output_plan in vl_plan.outputs.items()}
+        else:
             # 创建输出节点系统
             output_nodes = self.set_output_nodes(
                 view_layer,
-                location=(self.render_out_nodes_width, vertical_offset)
+                location=(origin[0] + self.render_out_nodes_width, origin[1]),
+                vl_plan=vl_plan
             )
-            
-            # 记录节点到返回字典
-            viewlayer_outfile_nodes[view_layer.name] = output_nodes
-            
-            # 自动连接所有AOV通道
-            def connect_aov_channels(output_node, category):
-                if output_node:
-                    for file_slot in output_node.file_slots:
-                        self.auto_connect_aov(
-                            self.node_tree.nodes.get(f"{view_layer.name}_RLayers_Flash"),
-                            output_node,
-                            view_layer,
-                            file_slot.path
-                        )
-            
-            # 连接所有输出类型
-            for category in output_nodes:
-                connect_aov_channels(output_nodes[category], category)
-            
-            # 计算下一个视图层的垂直偏移
-            if output_nodes:
-                nodes_list = list(output_nodes.values())
-                bounds = self.node_layout.get_nodes_bound(nodes_list)
-                vertical_offset += bounds[3] - bounds[2] - self.view_layer_nodes_width
+
+            # 按规划批量连接所有AOV通道
+            # 已经经过降噪/轴向节点的插槽由post_processing维护
+            for category, output_node in output_nodes.items():
+                self.connect_sockets(render_layer_node, output_node,
+                                     vl_plan.outputs[category].links,
+                                     skip_inserted=True)
 
         # 配置output节点
-        self.reconfigure_output_nodes()
-        
+        self.reconfigure_output_nodes(layer_plan)
+
         # 后处理
-        for view_layer in self.scene.view_layers:
-            self.post_processing(view_layer)
-        
-        return viewlayer_outfile_nodes
\ No newline at end of file
+        if not skipped:
+            self.post_processing(view_layer, vl_plan)
+        self.remove_stale_inserts(layer_plan)
+
+        # 记录指纹，下次运行时跳过未改动的视图层
+        render_layer_node = self.node_index.get(vl_plan.render_layer)
+        if render_layer_node and render_layer_node.get(FINGERPRINT_KEY) != vl_plan.fingerprint:
+            render_layer_node[FINGERPRINT_KEY] = vl_plan.fingerprint
+
+        return vl_plan, output_nodes
+
+
+def run_steps(steps):
+    """执行分步生成器直到结束，返回其返回值"""
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
@@ -0,0 +1,664 @@
+"""
+合成器节点规划
+纯Python实现，不依赖bpy：
+视图层快照 -> 输出节点 -> 插槽 -> 连接 -> 降噪/轴向修正插入
+BlenderCompositor 负责读取快照并把规划结果写入 scene.node_tree
+"""
+import hashlib
+import json
+from fnmatch import fnmatchcase
+
+from .OutputEstimate import slot_channels, bytes_per_channel, compression_ratio
+
+# 常量
+CRYPTO_CATEGORIES = ['CryptoObject00', 'CryptoObject01', 'CryptoObject02',
+                    'CryptoMaterial00', 'CryptoMaterial01', 'CryptoMaterial02',
+                    'CryptoAsset00', 'CryptoAsset01', 'CryptoAsset02']
+DATA_CATEGORIES = [
+    'Depth', 'Mist', 'Position', 'Normal', 'Vector', 'UV',
+    'IndexOB', 'IndexMA', 'Debug Sample Count', 'Denoising Depth',
+    'Denoising Normal', 'Denoising Albedo'
+]
+RGB_CATEGORIES = [
+    'Image', 'Alpha', 'DiffDir', 'DiffInd', 'DiffCol', 'GlossDir',
+    'GlossInd', 'GlossCol', 'TransDir', 'TransInd', 'TransCol',
+    'VolumeDir', 'VolumeInd', 'Emit', 'Env', 'AO', 'Shadow Catcher',
+    'Noisy Image', 'Noisy Shadow Catcher', 'Shadow', 'Transp'
+]
+NODE_TYPES = ['rgb', 'data', 'cryptomatte', 'shaderaov', 'lightgroup']
+# 开启降噪后渲染层会额外输出的通道
+DENOISING_PASSES = ['Denoising Normal', 'Denoising Albedo', 'Denoising Depth']
+# 需要轴向修正（Y/Z互换）的通道
+AXIS_CORRECT_PASSES = ['Position', 'Normal', 'Vector']
+# 轴向修正共用的节点组，每个通道插入一个实例
+AXIS_GROUP_NAME = "Flash_AxisCorrect"
+# 会被插槽同步逻辑管理（可删除）的插槽名称
+MANAGED_SLOTS = set(RGB_CATEGORIES + DATA_CATEGORIES + CRYPTO_CATEGORIES)
+# 可插入降噪节点的分类
+DENOISE_CATEGORIES = ['rgb', 'lightgroup']
+# 逐通道精度策略：各分类默认精度（'16' 半精度，'32' 全精度）与需要全精度的通道
+PRECISION_DEFAULTS = {'rgb': '16', 'data': '16', 'cryptomatte': '32', 'shaderaov': '16', 'lightgroup': '16'}
+FULL_FLOAT_PASSES = ['Depth', 'Position', 'Vector', 'UV', 'IndexOB', 'IndexMA', 'Denoising Depth']
+PRECISION_NAMES = {'16': 'half', '32': 'full'}
+
+
+def is_managed_slot(slot_name):
+    """插槽是否由本插件生成（用户手动添加的插槽不做删除）"""
+    return slot_name in MANAGED_SLOTS or slot_name[:4] in ["shd_", "lgt_"]
+
+
+def base_category(key):
+    """输出节点键（如 rgb-full）对应的分类"""
+    return key.split('-', 1)[0]
+
+
+def shard_of(key):
+    """输出节点键的分片后缀（如 rgb-s02 -> s02），未分片返回空字符串"""
+    suffix = key.rsplit('-', 1)[-1]
+    return suffix if len(suffix) == 3 and suffix[0] == 's' and suffix[1:].isdigit() else ''
+
+
+def slot_category(slot_name):
+    """插槽来源的分类（与所在输出节点无关）"""
+    if slot_name.startswith('lgt_'):
+        return 'lightgroup'
+    if slot_name.startswith('shd_'):
+        return 'shaderaov'
+    if slot_name in CRYPTO_CATEGORIES:
+        return 'cryptomatte'
+    if slot_name in DATA_CATEGORIES:
+        return 'data'
+    return 'rgb'
+
+
+def render_socket_name(aov_name):
+    """输出插槽名称 -> 渲染层端口名称"""
+    if aov_name == "rgba":
+        return "Image"
+    names = aov_name.split('_', 1)
+    if len(names) == 2:
+        if names[0] == "lgt":
+            return f"Combined_{names[1]}"
+        if names[0] == "shd":
+            return names[1]
+    return aov_name
+
+
+class DenoisePolicy:
+    """降噪策略：按分类（rgb/灯光组）启用降噪并设置预过滤与质量，
+    exclude 为按通道名称排除的通配符（匹配插槽名或渲染层端口名，如 "Emit, lgt_rim*"）
+    """
+    def __init__(self, categories=None, exclude=()):
+        # 默认与 Blender 降噪节点的默认值一致
+        self.categories = {category: {'enabled': True, 'prefilter': 'ACCURATE', 'quality': 'FOLLOW_SCENE'}
+                           for category in DENOISE_CATEGORIES}
+        for category, options in (categories or {}).items():
+            self.categories[category].update(options)
+        if isinstance(exclude, str):
+            exclude = exclude.split(',')
+        self.exclude = [pattern.strip() for pattern in exclude if pattern.strip()]
+
+    @staticmethod
+    def category_of(slot):
+        """降噪插槽所属的分类（未分离的灯光组插槽也按灯光组处理）"""
+        return 'lightgroup' if slot.startswith('lgt_') else 'rgb'
+
+    def match(self, slot, socket=None):
+        """返回插槽对应的降噪分类，不降噪时返回 None"""
+        category = self.category_of(slot)
+        if not self.categories[category]['enabled']:
+            return None
+        names = [slot] if socket is None else [slot, socket]
+        if any(fnmatchcase(name, pattern) for name in names for pattern in self.exclude):
+            return None
+        return category
+
+    def options(self, category):
+        """降噪节点属性"""
+        options = self.categories[category]
+        return {'prefilter': options['prefilter'], 'quality': options['quality']}
+
+    def to_dict(self):
+        return {
+            'categories': {category: dict(options) for category, options in self.categories.items()},
+            'exclude': list(self.exclude),
+        }
+
+
+class PrecisionPolicy:
+    """逐通道精度策略：每个插槽写入半精度（'16'）或全精度（'32'）
+    overrides 按插槽/通道名称（支持通配符）或分类覆盖默认值，如 "Emit=32, lgt_*=half, shaderaov=full"；
+    Cryptomatte 始终为全精度。
+    multilayer 为使用多层 EXR 的分类：一个文件只有一种位深，精度不同的插槽拆分到
+    {分类}-half / {分类}-full 节点；其他分类（单层 EXR）通过插槽格式逐个设置
+    """
+    def __init__(self, overrides=(), multilayer=()):
+        self.defaults = dict(PRECISION_DEFAULTS)
+        self.overrides = []  # [(通配符, 位深)]
+        if isinstance(overrides, str):
+            overrides = overrides.split(',')
+        for item in overrides:
+            pattern, _, value = item.partition('=')
+            depth = self.parse_depth(value)
+            pattern = pattern.strip()
+            if not pattern or depth is None:
+                continue
+            if pattern in self.defaults:
+                self.defaults[pattern] = depth
+            else:
+                self.overrides.append((pattern, depth))
+        self.defaults['cryptomatte'] = '32'
+        self.multilayer = set(multilayer)
+
+    @staticmethod
+    def parse_depth(value):
+        """'16'/'half' -> '16'，'32'/'full' -> '32'，无法识别返回 None"""
+        value = value.strip().lower()
+        return {'16': '16', 'half': '16', '32': '32', 'full': '32'}.get(value)
+
+    def depth(self, slot):
+        """插槽的位深"""
+        category = slot_category(slot)
+        if category == 'cryptomatte':
+            return '32'
+        socket = render_socket_name(slot)
+        for pattern, depth in self.overrides:
+            if fnmatchcase(slot, pattern) or fnmatchcase(socket, pattern):
+                return depth
+        if socket in FULL_FLOAT_PASSES:
+            return '32'
+        return self.defaults[category]
+
+    def route(self, category, slots):
+        """将分类的插槽分配到输出节点，返回 [(节点键, 插槽, 节点位深, {插槽: 位深})]"""
+        depths = {slot: self.depth(slot) for slot in slots}
+        base = self.defaults[category]
+        if category not in self.multilayer:
+            return [(category, slots, base, depths)]
+        groups = {}
+        for slot in slots:
+            groups.setdefault(depths[slot], []).append(slot)
+        if len(groups) == 1:
+            depth = next(iter(groups))
+            return [(category, slots, depth, {})]
+        other = '32' if base == '16' else '16'
+        return [(category, groups[base], base, {}),
+                (f"{category}-{PRECISION_NAMES[other]}", groups[other], other, {})]
+
+    def to_dict(self):
+        return {
+            'defaults': dict(self.defaults),
+            'overrides': [list(item) for item in self.overrides],
+            'multilayer': sorted(self.multilayer),
+        }
+
+
+class ShardPolicy:
+    """按通道数与估算字节数拆分多层 EXR 输出节点
+    max_channels / max_bytes 为单个节点每帧的上限（0 表示不限制），超出时按插槽顺序
+    依次装入 {节点键}-s01、-s02 ...，拆分结果只取决于插槽列表，重复运行保持一致。
+    formats 为 {分类: 格式字典}（file_format/color_depth/exr_codec/color_mode），pixels 为渲染像素数
+    """
+    def __init__(self, max_channels=0, max_bytes=0, pixels=0, formats=None, multilayer=()):
+        self.max_channels = int(max_channels)
+        self.max_bytes = int(max_bytes)
+        self.pixels = int(pixels)
+        self.formats = {category: dict(fmt) for category, fmt in (formats or {}).items()}
+        self.multilayer = set(multilayer)
+
+    def slot_cost(self, category, socket_type, depth=None):
+        """插槽每帧的 (通道数, 估算字节数)"""
+        fmt = dict(self.formats.get(category, {'file_format': 'OPEN_EXR_MULTILAYER'}))
+        if depth:
+            fmt['color_depth'] = depth
+        channels = slot_channels(socket_type, fmt)
+        size = self.pixels * channels * bytes_per_channel(fmt) * compression_ratio(fmt)
+        return channels, int(size)
+
+    def split(self, key, slots, socket_types, depth=None):
+        """返回 [(节点键, 插槽)]，未超出预算时不拆分"""
+        category = base_category(key)
+        if category not in self.multilayer or not (self.max_channels or self.max_bytes):
+            return [(key, slots)]
+        shards = [[]]
+        channels = size = 0
+        for slot in slots:
+            n, slot_size = self.slot_cost(category, socket_types.get(slot, 'RGBA'), depth)
+            over = ((self.max_channels and channels + n > self.max_channels)
+                    or (self.max_bytes and size + slot_size > self.max_bytes))
+            if over and shards[-1]:
+                shards.append([])
+                channels = size = 0
+            shards[-1].append(slot)
+            channels += n
+            size += slot_size
+        if len(shards) == 1:
+            return [(key, slots)]
+        return [(f"{key}-s{i:02d}", shard) for i, shard in enumerate(shards, 1)]
+
+    def to_dict(self):
+        return {
+            'max_channels': self.max_channels,
+            'max_bytes': self.max_bytes,
+            'pixels': self.pixels,
+            'formats': {category: dict(fmt) for category, fmt in sorted(self.formats.items())},
+            'multilayer': sorted(self.multilayer),
+        }
+
+
+class PlanSettings:
+    """影响规划结果的开关"""
+    def __init__(self,
+                 separate_data=0,
+                 separate_cryptomatte=1,
+                 separate_shaderaov=0,
+                 separate_lightgroup=0,
+                 enable_denoise=1,
+                 axis_correct=1,
+                 denoise_policy=None,
+                 precision_policy=None,
+                 shard_policy=None):
+        self.separate_data = bool(separate_data)
+        self.separate_cryptomatte = bool(separate_cryptomatte)
+        self.separate_shaderaov = bool(separate_shaderaov)
+        self.separate_lightgroup = bool(separate_lightgroup)
+        self.enable_denoise = bool(enable_denoise)
+        self.axis_correct = bool(axis_correct)
+        self.denoise_policy = denoise_policy or DenoisePolicy()
+        # 逐通道精度策略（PrecisionPolicy），为 None 时每个节点使用统一的格式设置
+        self.precision_policy = precision_policy
+        # 输出节点拆分策略（ShardPolicy），为 None 时每个分类一个节点
+        self.shard_policy = shard_policy
+
+    def separation(self):
+        """{分类: 是否分离到独立节点}，rgb 始终独立"""
+        return {
+            'rgb': True,
+            'data': self.separate_data,
+            'cryptomatte': self.separate_cryptomatte,
+            'shaderaov': self.separate_shaderaov,
+            'lightgroup': self.separate_lightgroup,
+        }
+
+    def to_dict(self):
+        data = dict(vars(self))
+        data['denoise_policy'] = self.denoise_policy.to_dict()
+        if self.precision_policy is not None:
+            data['precision_policy'] = self.precision_policy.to_dict()
+        if self.shard_policy is not None:
+            data['shard_policy'] = self.shard_policy.to_dict()
+        return data
+
+
+class SocketInfo:
+    """渲染层输出端口的纯数据描述"""
+    def __init__(self, identifier, name, enabled=True, type='RGBA'):
+        self.identifier = identifier
+        self.name = name
+        self.enabled = bool(enabled)
+        self.type = type
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class ViewLayerSnapshot:
+    """视图层的纯数据快照：渲染层端口、Shader AOV 与灯光组"""
+    def __init__(self, name, sockets=(), shader_aovs=(), lightgroups=()):
+        self.name = name
+        self.sockets = [s if isinstance(s, SocketInfo) else SocketInfo(*s) for s in sockets]
+        self.shader_aovs = list(shader_aovs)
+        self.lightgroups = list(lightgroups)
+
+    def socket_names(self):
+        return {s.name for s in self.sockets}
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'sockets': [s.to_dict() for s in self.sockets],
+            'shader_aovs': list(self.shader_aovs),
+            'lightgroups': list(self.lightgroups),
+        }
+
+
+class OutputNodePlan:
+    """单个输出文件节点：插槽列表与 (渲染层端口, 插槽) 连接
+    category 为节点键（如 rgb、rgb-full），depth/slot_depths 为精度策略给出的节点与插槽位深
+    """
+    def __init__(self, view_layer, category, slots, links, depth=None, slot_depths=None):
+        self.view_layer = view_layer
+        self.category = category
+        self.name = f"{view_layer}_{category}_OutputFile_Flash"
+        self.label = f"{view_layer} {category}"
+        self.slots = list(slots)
+        self.links = list(links)
+        self.depth = depth
+        self.slot_depths = dict(slot_depths or {})
+
+    def to_dict(self):
+        data = {
+            'name': self.name,
+            'category': self.category,
+            'slots': list(self.slots),
+            'links': [list(link) for link in self.links],
+        }
+        if self.depth:
+            data['depth'] = self.depth
+        if self.slot_depths:
+            data['slot_depths'] = dict(self.slot_depths)
+        return data
+
+
+class InsertPlan:
+    """插入在渲染层与输出插槽之间的降噪或轴向修正节点"""
+    def __init__(self, kind, view_layer, socket, output, slot, index=0, options=None):
+        self.kind = kind  # 'denoise' 或 'axis'
+        self.view_layer = view_layer
+        self.socket = socket
+        self.output = output
+        self.slot = slot
+        self.index = index  # 在同一输出节点中的序号，用于排布
+        self.options = dict(options or {})  # 插入节点的属性（降噪的预过滤/质量）
+
+    @property
+    def prefix(self):
+        return f"{self.view_layer}_{self.socket}"
+
+    def node_names(self):
+        """插入的节点名称，按从渲染层到输出节点的顺序"""
+        if self.kind == 'denoise':
+            return [f"{self.prefix}_Denoise_Flash"]
+        return [f"{self.prefix}_AxisCorrect_Flash"]
+
+    def to_dict(self):
+        data = {
+            'kind': self.kind,
+            'socket': self.socket,
+            'output': self.output,
+            'slot': self.slot,
+            'nodes': self.node_names(),
+        }
+        if self.options:
+            data['options'] = dict(self.options)
+        return data
+
+
+class ViewLayerPlan:
+    def __init__(self, name, aov_dict, outputs, inserts, fingerprint=''):
+        self.name = name
+        self.render_layer = f"{name}_RLayers_Flash"
+        self.aov_dict = aov_dict
+        self.outputs = outputs  # {分类: OutputNodePlan}
+        self.inserts = inserts
+        self.fingerprint = fingerprint
+
+    def node_names(self):
+        names = [self.render_layer] + [p.name for p in self.outputs.values()]
+        for insert in self.inserts:
+            names.extend(insert.node_names())
+        return names
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'fingerprint': self.fingerprint,
+            'render_layer': self.render_layer,
+            'outputs': {category: p.to_dict() for category, p in self.outputs.items()},
+            'inserts': [insert.to_dict() for insert in self.inserts],
+        }
+
+
+class CompositorPlan:
+    def __init__(self, settings, view_layers):
+        self.settings = settings
+        self.view_layers = view_layers
+
+    def get(self, viewlayer_name):
+        return next((p for p in self.view_layers if p.name == viewlayer_name), None)
+
+    def node_names(self):
+        return {name for p in self.view_layers for name in p.node_names()}
+
+    def denoise_summary(self):
+        """每帧的降噪节点执行次数，按分类、模式（预过滤/质量）与视图层统计"""
+        summary = {'per_frame': 0, 'by_category': {}, 'by_mode': {}, 'by_view_layer': {}}
+        for vl_plan in self.view_layers:
+            count = 0
+            for insert in vl_plan.inserts:
+                if insert.kind != 'denoise':
+                    continue
+                count += 1
+                category = DenoisePolicy.category_of(insert.slot)
+                mode = f"{insert.options.get('prefilter')}/{insert.options.get('quality')}"
+                summary['by_category'][category] = summary['by_category'].get(category, 0) + 1
+                summary['by_mode'][mode] = summary['by_mode'].get(mode, 0) + 1
+            summary['by_view_layer'][vl_plan.name] = count
+            summary['per_frame'] += count
+        return summary
+
+    def to_dict(self):
+        return {
+            'settings': self.settings.to_dict(),
+            'view_layers': [p.to_dict() for p in self.view_layers],
+        }
+
+
+def view_layer_fingerprint(snapshot, settings):
+    """视图层的紧凑指纹：启用的通道、Shader AOV、灯光组与各项开关"""
+    data = {
+        'passes': [s.identifier for s in snapshot.sockets if s.enabled],
+        'shader_aovs': snapshot.shader_aovs,
+        'lightgroups': snapshot.lightgroups,
+        'settings': settings.to_dict(),
+    }
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def classify_view_layer(snapshot, assume_enabled=()):
+    """按分类收集视图层的AOV，assume_enabled 中的端口视为已启用"""
+    aov_dict = {category: [] for category in NODE_TYPES}
+    aov_dict['shaderaov'] = ["shd_" + name for name in snapshot.shader_aovs]
+    aov_dict['lightgroup'] = ["lgt_" + name for name in snapshot.lightgroups]
+
+    for socket in snapshot.sockets:
+        if not (socket.enabled or socket.identifier in assume_enabled):
+            continue
+        if socket.identifier in RGB_CATEGORIES:
+            aov_dict['rgb'].append(socket.name)
+        if socket.identifier in DATA_CATEGORIES:
+            aov_dict['data'].append(socket.name)
+        if socket.identifier in CRYPTO_CATEGORIES:
+            aov_dict['cryptomatte'].append(socket.name)
+    return aov_dict
+
+
+def process_aov_data(aov_dict, settings):
+    """按分离设置合并分类，返回每个输出节点的插槽列表"""
+    processed = {category: aov_dict.get(category, []).copy() for category in NODE_TYPES}
+
+    # 特殊处理
+    processed['rgb'] = [
+        'rgba' if aov == 'Image' else aov  # 将 'Image' 替换为 'rgba'
+        for aov in processed['rgb']
+        if aov not in {'Alpha'}  # 过滤掉 'Alpha'
+    ]
+    processed['data'] = [aov for aov in processed['data'] if aov not in {'Denoising Normal', 'Denoising Albedo', 'Debug Sample Count', 'IndexOB', 'IndexMA'}]
+
+    # 未分离的分类合并到 rgb
+    separation = settings.separation()
+    for category in NODE_TYPES[1:]:
+        if not separation[category]:
+            processed['rgb'].extend(processed[category])
+            processed[category] = []
+
+    return processed
+
+
+class PlanCache:
+    """可在多个视图层/场景间共享的分类缓存：通道配置相同的快照只分类一次"""
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(snapshot, settings, fingerprint):
+        # 以规划时已计算的视图层指纹为键（不含视图层名称，不同场景中通道相同的视图层共用同一结果），
+        # 另加未启用但按设置视为启用的降噪端口，它们不计入指纹
+        assume_enabled = DENOISING_PASSES if settings.enable_denoise else ()
+        return fingerprint, tuple(s.identifier for s in snapshot.sockets
+                                  if not s.enabled and s.identifier in assume_enabled)
+
+    def classify(self, snapshot, settings, fingerprint):
+        """返回 (aov_dict, processed)"""
+        key = self.key(snapshot, settings, fingerprint)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            entry = _classify(snapshot, settings)
+            self.entries[key] = entry
+        else:
+            self.hits += 1
+        # 返回副本，避免规划之间共享可变列表
+        return tuple({category: list(aovs) for category, aovs in d.items()} for d in entry)
+
+
+def _classify(snapshot, settings):
+    assume_enabled = DENOISING_PASSES if settings.enable_denoise else ()
+    aov_dict = classify_view_layer(snapshot, assume_enabled)
+    return aov_dict, process_aov_data(aov_dict, settings)
+
+
+def build_view_layer_plan(snapshot, settings, cache=None):
+    """根据快照与设置计算视图层的目标节点状态，cache 为可选的 PlanCache"""
+    assume_enabled = DENOISING_PASSES if settings.enable_denoise else ()
+    fingerprint = view_layer_fingerprint(snapshot, settings)
+    if cache is not None:
+        aov_dict, processed = cache.classify(snapshot, settings, fingerprint)
+    else:
+        aov_dict, processed = _classify(snapshot, settings)
+    socket_names = snapshot.socket_names() | set(assume_enabled)
+
+    outputs = {}
+    separation = settings.separation()
+    precision = settings.precision_policy
+    shards = settings.shard_policy
+    socket_types = {}
+    if shards is not None:
+        types = {s.name: s.type for s in snapshot.sockets}
+        socket_types = {slot: types.get(render_socket_name(slot), 'RGBA')
+                        for category in NODE_TYPES for slot in processed[category]}
+    for category in NODE_TYPES:
+        if not (separation[category] and processed[category]):
+            continue
+        if precision is not None:
+            routes = precision.route(category, processed[category])
+        else:
+            routes = [(category, processed[category], None, None)]
+        for key, slots, depth, slot_depths in routes:
+            split = shards.split(key, slots, socket_types, depth) if shards is not None else [(key, slots)]
+            for shard_key, shard_slots in split:
+                links = [(render_socket_name(slot), slot) for slot in shard_slots
+                         if render_socket_name(slot) in socket_names]
+                outputs[shard_key] = OutputNodePlan(snapshot.name, shard_key, shard_slots, links,
+                                                    depth, slot_depths)
+
+    # 降噪：rgb 与灯光组通道（按降噪策略筛选）；轴向修正：位置/法线/矢量
+    denoise_layers = set()
+    if settings.enable_denoise:
+        denoise_layers = {'rgba' if x == 'Image' else x for x in aov_dict['rgb']}
+        denoise_layers.update(aov_dict['lightgroup'])
+    policy = settings.denoise_policy
+
+    inserts = []
+    insert_outputs = [output for category in ['rgb', 'lightgroup', 'data']
+                      for key, output in outputs.items() if base_category(key) == category]
+    for output in insert_outputs:
+        index = 0
+        for socket, slot in output.links:
+            options = None
+            denoise_category = policy.match(slot, socket) if slot in denoise_layers else None
+            if denoise_category:
+                kind = 'denoise'
+                options = policy.options(denoise_category)
+            elif settings.axis_correct and slot in AXIS_CORRECT_PASSES:
+                kind = 'axis'
+            else:
+                continue
+            inserts.append(InsertPlan(kind, snapshot.name, socket, output.name, slot, index, options))
+            index += 1
+
+    return ViewLayerPlan(snapshot.name, aov_dict, outputs, inserts, fingerprint)
+
+
+def build_plan(snapshots, settings, cache=None):
+    """为一组视图层快照计算完整的合成器规划"""
+    return CompositorPlan(settings, [build_view_layer_plan(s, settings, cache) for s in snapshots])
+
+
+def _insert_links(insert, render_layer):
+    """插入节点内部的连接（渲染层 -> 插入节点 -> 插入节点）"""
+    first = insert.node_names()[0]
+    if insert.kind == 'denoise':
+        return [[f"{render_layer}:{socket}", f"{first}:{to}"]
+                for socket, to in [(insert.socket, 'Image'), ('Denoising Normal', 'Normal'),
+                                   ('Denoising Albedo', 'Albedo')]]
+    # 轴向修正的 Y/Z 互换在共用节点组内部完成
+    return [[f"{render_layer}:{insert.socket}", f"{first}:Vector"]]
+
+
+def diff_plan(plan, state):
+    """对比规划与节点树现状，返回将要执行的结构性修改
+    state: {'nodes': [_Flash节点名称],
+            'slots': {输出节点: [插槽]},
+            'sources': {输出节点: {插槽: (上游节点, 上游端口)}}}
+    """
+    planned = plan.node_names()
+    existing = set(state.get('nodes', ()))
+    changes = {
+        'nodes_created': sorted(planned - existing),
+        'nodes_removed': sorted(existing - planned),
+        'slots_added': [],
+        'slots_removed': [],
+        'links_created': [],
+        'links_removed': [],
+        'inserts': [],
+    }
+    all_sources = state.get('sources', {})
+
+    for vl_plan in plan.view_layers:
+        inserts = {(insert.output, insert.slot): insert for insert in vl_plan.inserts}
+        for output in vl_plan.outputs.values():
+            current_slots = state.get('slots', {}).get(output.name, [])
+            sources = all_sources.get(output.name, {})
+            wanted = set(output.slots)
+            for slot in current_slots:
+                if slot not in wanted and is_managed_slot(slot):
+                    changes['slots_removed'].append([output.name, slot])
+                    if slot in sources:
+                        changes['links_removed'].append([":".join(sources[slot]), f"{output.name}:{slot}"])
+            changes['slots_added'] += [[output.name, slot] for slot in output.slots
+                                       if slot not in current_slots]
+
+            for socket, slot in output.links:
+                insert = inserts.get((output.name, slot))
+                # 有插入节点时插槽应来自最后一个插入节点，否则直接来自渲染层端口
+                if insert:
+                    expected = (insert.node_names()[-1], None)
+                else:
+                    expected = (vl_plan.render_layer, socket)
+                source = sources.get(slot)
+                if source and source[0] == expected[0] and expected[1] in (None, source[1]):
+                    continue
+                if source:
+                    changes['links_removed'].append([":".join(source), f"{output.name}:{slot}"])
+                from_socket = expected[1] if expected[1] else ('Image' if insert.kind == 'denoise' else 'Vector')
+                changes['links_created'].append([f"{expected[0]}:{from_socket}", f"{output.name}:{slot}"])
+
+        for insert in vl_plan.inserts:
+            if not all(name in existing for name in insert.node_names()):
+                changes['inserts'].append(insert.to_dict())
+                changes['links_created'] += _insert_links(insert, vl_plan.render_layer)
+
+    return changes
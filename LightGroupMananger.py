@@ -347,8 +347,9 @@ class LIGHTGROUP_OT_add_to(bpy.types.Operator):
         view_layer = context.view_layer
         selected_objects = context.selected_objects
 
-        # 确保当前视图层存在这个 Light Group
-        bpy.ops.scene.view_layer_add_lightgroup(name=group_name)
+        # 确保当前视图层存在这个 Light Group（同名时 add 会自动加后缀，需要先检查）
+        if group_name not in view_layer.lightgroups:
+            view_layer.lightgroups.add(name=group_name)
 
         lights = [obj for obj in selected_objects if obj.type in OBJTYPE]
         if not lights:
@@ -639,9 +640,10 @@ class LIGHTGROUP_OT_create_empty(bpy.types.Operator):
         view_layer = context.view_layer
         group_list = scene.lightgroup_list
 
-        # 在 view_layer.lightgroups 中创建新组
-        bpy.ops.scene.view_layer_add_lightgroup()
-        new_group_name = view_layer.active_lightgroup.name
+        # 在 view_layer.lightgroups 中创建新组（默认名称 Lightgroup，自动加后缀）
+        new_group_name = view_layer.lightgroups.add().name
+        # 与 view_layer_add_lightgroup 一致，新建的组设为活动组
+        view_layer.active_lightgroup_index = len(view_layer.lightgroups) - 1
 
         # 在 lightgroup_list 中添加对应项
         new_item = group_list.add()
@@ -709,7 +711,7 @@ class LIGHTGROUP_OT_create_from_selected(bpy.types.Operator):
                 # 检查该组名是否已存在于 view_layer.lightgroups 中
                 if group_name not in [lg.name for lg in view_layer.lightgroups]:
                     # 创建新的灯光组
-                    bpy.ops.scene.view_layer_add_lightgroup(name=group_name)
+                    view_layer.lightgroups.add(name=group_name)
                     created_count += 1
                 else:
                     skipped_count += 1  # 组名已存在，跳过创建
@@ -830,7 +832,7 @@ class LIGHTGROUP_OT_create_from_collection(bpy.types.Operator):
             self.report({'INFO'}, translate("灯光组已存在，跳过创建"))
         else:
             try:
-                bpy.ops.scene.view_layer_add_lightgroup(name=group_name)
+                view_layer.lightgroups.add(name=group_name)
                 created_count += 1
             except RuntimeError as e:
                 self.report({'ERROR'}, str(e))
@@ -958,7 +960,7 @@ class LIGHTGROUP_OT_create_world_group(bpy.types.Operator):
             self.report({'INFO'}, translate("WorldGroup 已存在，跳过创建"))
         else:
             # 创建新的灯光组
-            bpy.ops.scene.view_layer_add_lightgroup(name=group_name)
+            view_layer.lightgroups.add(name=group_name)
             self.report({'INFO'}, translate(
                 "已创建世界环境灯光组: {}").format(group_name))
 
@@ -0,0 +1,445 @@
+"""
+输出配置
+不依赖界面的输出格式与路径设置：操作符、批量处理与命令行共用
+"""
+import json
+import os
+from types import SimpleNamespace
+
+import bpy
+
+from .CompositorOutfileSet import BlenderCompositor, values_differ, uses_compositor
+from .CompositorPlan import (DenoisePolicy, PrecisionPolicy, ShardPolicy, NODE_TYPES, base_category,
+                             slot_category, is_managed_slot, shard_of)
+from .OutputEstimate import estimate_node, summarize
+from .Profiler import traced
+
+
+def get_project_name():
+    """.blend 文件名（不含扩展名），批量处理时只需读取一次"""
+    return os.path.splitext(os.path.basename(bpy.data.filepath))[0] if bpy.data.filepath else "MyProject"
+
+
+def scene_path_variables(scene, project_name=None) -> dict:
+    """场景级路径变量，同一场景的所有输出节点共用"""
+    camera = scene.camera
+    return {
+        'scene': scene.name,
+        'v': f"v{scene.flash_aov.version_number:02d}",
+        'prj': project_name if project_name is not None else get_project_name(),
+        'cam': camera.name if camera else "Camera",
+        'fps': scene.render.fps,
+        'fstart': scene.frame_start,
+        'fend': scene.frame_end,
+        'w': scene.render.resolution_x,
+        'h': scene.render.resolution_y,
+    }
+
+
+@traced()
+def resolve_output_path(scene, viewlayer_outfile_nodes, project_name=None) -> dict:
+    path_template = scene.flash_aov.render_path
+    name_template = scene.flash_aov.render_name
+    variables = scene_path_variables(scene, project_name)
+    paths_dict = {}
+
+
+    for view_layer_name, nodes in viewlayer_outfile_nodes.items():
+        try:
+            for node_type, node in nodes.items():
+                # {type} 包含分片后缀（如 rgb-s01），{shard} 只有后缀，未分片时为空
+                shard = shard_of(node_type)
+                resolved_path = path_template.format(
+                    viewlayer=view_layer_name, type=node_type, shard=shard, **variables)
+                resolved_name = name_template.format(
+                    viewlayer=view_layer_name, type=node_type, shard=shard, **variables)
+
+                full_path = os.path.join(resolved_path, resolved_name)
+
+                if resolved_path.startswith("//"):
+                    resolved_path = bpy.path.abspath(resolved_path)
+
+                if view_layer_name not in paths_dict:
+                    paths_dict[view_layer_name] = {}
+
+                paths_dict[view_layer_name][node_type] = full_path
+
+        except Exception as e:
+            if view_layer_name not in paths_dict:
+                paths_dict[view_layer_name] = {}
+
+            paths_dict[view_layer_name][node_type] = f"Error: {str(e)}"
+
+    return paths_dict
+
+@traced()
+def assign_paths_to_nodes(viewlayer_outfile_nodes, paths_dict, set_prop=None, warnings=None):
+    """将路径字典赋值给合成器输出节点，路径未变化时不写入
+    返回警告列表（传入 warnings 时追加到其中）
+    """
+    set_prop = set_prop or set_if_changed
+    warnings = warnings if warnings is not None else []
+    for view_layer_name, nodes in viewlayer_outfile_nodes.items():
+        # 获取该视图层的路径配置
+        viewlayer_paths = paths_dict.get(view_layer_name, {})
+        
+        # 遍历每个输出类型和对应节点
+        for node_type, node in nodes.items():
+            # 获取对应类型的路径
+            path = viewlayer_paths.get(node_type)
+            
+            if path and node:
+                try:
+                    set_prop(node, 'base_path', path)
+                    # print(f"成功设置路径 | 视图层：{view_layer_name} | 类型：{node_type} | 路径：{path}")
+                except Exception as e:
+                    warnings.append(f"路径设置失败 | 视图层：{view_layer_name} | 类型：{node_type} | 错误：{e}")
+            else:
+                missing_info = []
+                if not path: missing_info.append("路径")
+                if not node: missing_info.append("节点")
+                warnings.append(f"配置缺失 | 视图层：{view_layer_name} | 类型：{node_type} | 缺失：{'、'.join(missing_info)}")
+    return warnings
+
+
+# 有损 EXR 编码，Cryptomatte 不能使用
+LOSSY_EXR_CODECS = {'DWAA', 'DWAB', 'PXR24', 'B44', 'B44A'}
+
+
+def set_if_changed(obj, attr, value):
+    """仅在属性值变化时写入（不计数），返回是否写入"""
+    if values_differ(getattr(obj, attr), value):
+        setattr(obj, attr, value)
+        return True
+    return False
+
+
+def _apply_format(node, fmt, color_mode_fallback, jpg_quality, set_prop=set_if_changed):
+    """将格式属性组写入输出节点"""
+    image_format = node.format
+    if fmt.format == 'OPEN_EXR_MULTILAYER' or fmt.format == 'OPEN_EXR':
+        if fmt.format == 'OPEN_EXR':
+            set_prop(image_format, 'color_mode', fmt.color_mode)
+        set_prop(image_format, 'file_format', fmt.format)
+        set_prop(image_format, 'color_depth', fmt.exr_color_depth)
+        set_prop(image_format, 'exr_codec', fmt.exr_codec)
+    elif fmt.format == 'PNG':
+        set_prop(image_format, 'file_format', fmt.format)
+        set_prop(image_format, 'color_mode', color_mode_fallback)
+        set_prop(image_format, 'color_depth', fmt.png_color_depth)
+        set_prop(image_format, 'compression', fmt.png_compression)
+    elif fmt.format == 'JPEG':
+        set_prop(image_format, 'file_format', fmt.format)
+        set_prop(image_format, 'color_mode', fmt.jpg_color_mode)
+        set_prop(image_format, 'quality', jpg_quality)
+
+
+# 分离输出沿用的格式组（与单独格式设置出现之前一致）
+BASE_FORMAT_GROUPS = {'lightgroup': 'rgb', 'shaderaov': 'data', 'cryptomatte': 'data'}
+
+
+def format_group(flash_aov, category):
+    """分类（或节点键）使用的格式属性组，未启用单独格式时返回沿用的格式组"""
+    category = base_category(category)
+    group = getattr(flash_aov, category)
+    if getattr(group, 'use_base_format', False):
+        return getattr(flash_aov, BASE_FORMAT_GROUPS[category])
+    return group
+
+
+def node_color(fmt):
+    """格式属性组中的节点颜色（线性值开方后用于界面显示）"""
+    return tuple(ch ** (1 / 2) for ch in fmt.node_color)
+
+
+def _make_lossless(image_format, set_prop=set_if_changed):
+    """Cryptomatte 的ID哈希必须无损全精度保存"""
+    if image_format.file_format not in ('OPEN_EXR', 'OPEN_EXR_MULTILAYER'):
+        set_prop(image_format, 'file_format', 'OPEN_EXR_MULTILAYER')
+    set_prop(image_format, 'color_depth', '32')
+    if str(image_format.exr_codec).upper() in LOSSY_EXR_CODECS:
+        set_prop(image_format, 'exr_codec', 'ZIP')
+
+
+def _copy_node_format(slot, node, set_prop):
+    """单层 EXR 插槽改用自身格式时沿用节点的格式、颜色模式与编码"""
+    set_prop(slot, 'use_node_format', False)
+    set_prop(slot.format, 'file_format', node.format.file_format)
+    set_prop(slot.format, 'color_mode', node.format.color_mode)
+    set_prop(slot.format, 'exr_codec', node.format.exr_codec)
+
+
+def _protect_cryptomatte(node, node_type, set_prop=set_if_changed):
+    """Cryptomatte 节点整体无损；合并到其他节点时，多层 EXR 整体无损，单层 EXR 只处理对应插槽"""
+    if base_category(node_type) == 'cryptomatte':
+        _make_lossless(node.format, set_prop)
+        return
+    crypto_slots = [i for i, socket in enumerate(node.inputs) if slot_category(socket.name) == 'cryptomatte']
+    if not crypto_slots:
+        return
+    if node.format.file_format == 'OPEN_EXR_MULTILAYER':
+        _make_lossless(node.format, set_prop)
+    elif node.format.file_format == 'OPEN_EXR':
+        for i in crypto_slots:
+            slot = node.file_slots[i]
+            if slot.use_node_format:
+                _copy_node_format(slot, node, set_prop)
+            _make_lossless(slot.format, set_prop)
+
+
+def _apply_precision(node, output_plan, set_prop=set_if_changed):
+    """按精度策略设置位深：多层 EXR 设置节点位深，单层 EXR 逐个设置插槽格式；
+    未指定位深的插件插槽恢复使用节点格式，用户添加的插槽保持不变
+    """
+    if node.format.file_format not in ('OPEN_EXR', 'OPEN_EXR_MULTILAYER'):
+        return
+    if output_plan.depth:
+        set_prop(node.format, 'color_depth', output_plan.depth)
+    if node.format.file_format != 'OPEN_EXR':
+        return
+    for i, socket in enumerate(node.inputs):
+        slot = node.file_slots[i]
+        depth = output_plan.slot_depths.get(socket.name)
+        if depth is None or depth == node.format.color_depth:
+            # Cryptomatte 插槽的格式由 _protect_cryptomatte 维护
+            if is_managed_slot(socket.name) and slot_category(socket.name) != 'cryptomatte':
+                set_prop(slot, 'use_node_format', True)
+            continue
+        _copy_node_format(slot, node, set_prop)
+        set_prop(slot.format, 'color_depth', depth)
+
+
+@traced()
+def apply_output_formats(flash_aov, viewlayer_outfile_nodes, plan=None, set_prop=set_if_changed):
+    """按各分类的格式设置配置输出节点的颜色与文件格式，
+    指定 plan 时再按规划中精度策略给出的位深设置节点/插槽，最后保证 Cryptomatte 无损；
+    set_prop 传入 BlenderCompositor._set_prop 时写入计入操作数；
+    各步骤先在节点副本上执行，只把最终值与节点不同的属性写回，重复运行不产生写入
+    """
+    for view_layer_name, nodes in viewlayer_outfile_nodes.items():
+        vl_plan = plan.get(view_layer_name) if plan is not None else None
+        for node_type, node in nodes.items():
+            output_plan = vl_plan.outputs.get(node_type) if vl_plan else None
+            writes = _WriteRecorder()
+            _configure_output(flash_aov, _output_proxy(node), node_type, output_plan, writes)
+            for target, attr, value in writes.changes():
+                set_prop(target, attr, value)
+
+
+def _configure_output(flash_aov, node, node_type, output_plan, set_prop):
+    """依次写入颜色、文件格式、精度位深与 Cryptomatte 无损设置，后面的步骤可覆盖前面的值"""
+    fmt = format_group(flash_aov, node_type)
+    # 与创建节点时的颜色一致（create_compositor 传入 node_colors）
+    set_prop(node, 'use_custom_color', True)
+    set_prop(node, 'color', node_color(fmt))
+    # data 沿用 rgb 的 PNG 颜色模式与 JPEG 质量
+    fallback = flash_aov.rgb if base_category(node_type) == 'data' else fmt
+    _apply_format(node, fmt, fallback.color_mode, fallback.jpg_quality, set_prop)
+    if output_plan is not None:
+        _apply_precision(node, output_plan, set_prop)
+    _protect_cryptomatte(node, node_type, set_prop)
+
+
+class _WriteRecorder:
+    """在节点副本上执行写入，记录每个属性的初始值，最终只返回与初始值不同的属性"""
+
+    def __init__(self):
+        self.initial = {}
+
+    def __call__(self, obj, attr, value):
+        key = (id(obj), attr)
+        if key not in self.initial:
+            self.initial[key] = (obj, attr, getattr(obj, attr))
+        setattr(obj, attr, value)
+        return True
+
+    def changes(self):
+        """按首次写入的顺序返回 [(原对象, 属性, 最终值)]"""
+        return [(obj.target, attr, getattr(obj, attr)) for obj, attr, initial in self.initial.values()
+                if values_differ(initial, getattr(obj, attr))]
+
+
+def precision_policy_from_props(flash_aov):
+    """由面板设置生成精度策略，未启用时返回 None"""
+    if not flash_aov.precision_policy:
+        return None
+    multilayer = [category for category in NODE_TYPES
+                  if format_group(flash_aov, category).format == 'OPEN_EXR_MULTILAYER']
+    return PrecisionPolicy(flash_aov.precision_overrides, multilayer)
+
+
+def denoise_policy_from_props(flash_aov):
+    """由面板设置生成降噪策略"""
+    categories = {}
+    for category in ['rgb', 'lightgroup']:
+        props = getattr(flash_aov, f"denoise_{category}")
+        categories[category] = {'enabled': props.enabled, 'prefilter': props.prefilter,
+                                'quality': props.quality}
+    return DenoisePolicy(categories, flash_aov.denoise_exclude)
+
+
+def shard_policy_from_props(scene):
+    """由面板设置生成输出节点拆分策略，未启用时返回 None"""
+    flash_aov = scene.flash_aov
+    if not flash_aov.shard_outputs:
+        return None
+    render = scene.render
+    scale = render.resolution_percentage / 100
+    pixels = int(render.resolution_x * scale) * int(render.resolution_y * scale)
+    formats = {}
+    multilayer = []
+    for category in NODE_TYPES:
+        fmt = format_group(flash_aov, category)
+        formats[category] = {'file_format': fmt.format, 'color_depth': fmt.exr_color_depth,
+                             'exr_codec': fmt.exr_codec, 'color_mode': fmt.color_mode}
+        if fmt.format == 'OPEN_EXR_MULTILAYER':
+            multilayer.append(category)
+    return ShardPolicy(flash_aov.shard_max_channels, int(flash_aov.shard_max_size * 1024 * 1024),
+                       pixels, formats, multilayer)
+
+
+def create_compositor(scene, plan_cache=None):
+    """按场景的 Flash AOV 设置创建 BlenderCompositor"""
+    flash_aov = scene.flash_aov
+
+    compositor = BlenderCompositor(
+        separate_data=flash_aov.separate_data,
+        separate_cryptomatte=flash_aov.separate_cryptomatte,
+        separate_shaderaov=flash_aov.separate_shaderaov,
+        separate_lightgroup=flash_aov.separate_lightgroup,
+        scene=scene,
+        plan_cache=plan_cache,
+    )
+    compositor.enable_denoise = flash_aov.enable_denoise
+    compositor.axis_correct = flash_aov.axis_correct
+    compositor.denoise_policy = denoise_policy_from_props(flash_aov)
+    compositor.precision_policy = precision_policy_from_props(flash_aov)
+    compositor.shard_policy = shard_policy_from_props(scene)
+    compositor.incremental = flash_aov.incremental_update
+    compositor.column_height = flash_aov.column_height
+    compositor.node_colors = {category: node_color(format_group(flash_aov, category))
+                              for category in NODE_TYPES}
+    return compositor
+
+
+@traced()
+def configure_scene(scene, plan_cache=None, project_name=None):
+    """按场景自身的 Flash AOV 设置配置输出节点与路径
+    返回 (BlenderCompositor, {视图层: {类型: 路径}})
+    """
+    compositor = create_compositor(scene, plan_cache)
+    viewlayer_outfile_nodes = compositor.setup_compositor_nodes()
+    paths_dict = finish_configure(compositor, viewlayer_outfile_nodes, project_name)
+    return compositor, paths_dict
+
+
+def finish_configure(compositor, viewlayer_outfile_nodes, project_name=None):
+    """节点配置完成后设置输出格式与路径，只处理本次已配置的视图层，返回路径字典
+    输出节点按名称重新查找，分步执行期间被删除的节点不再处理
+    """
+    scene = compositor.scene
+    flash_aov = scene.flash_aov
+    paths_dict = resolve_output_path(scene, viewlayer_outfile_nodes, project_name)
+    viewlayer_outfile_nodes = {name: nodes for name, nodes in compositor.get_output_nodes_by_name().items()
+                               if name in viewlayer_outfile_nodes}
+    apply_output_formats(flash_aov, viewlayer_outfile_nodes, compositor.plan, compositor._set_prop)
+    if not flash_aov.path_protection:
+        assign_paths_to_nodes(viewlayer_outfile_nodes, paths_dict, compositor._set_prop, compositor.warnings)
+    # 配置不计算输出估算（不在计时与撤销步骤内），旧的估算已过期，由估算操作符重新生成
+    last_estimates.pop(scene.name, None)
+    return paths_dict
+
+
+@traced()
+def preview_scene(scene, plan_cache=None, project_name=None):
+    """试运行：不修改节点树，返回修改清单、估算与将要设置的输出路径"""
+    flash_aov = scene.flash_aov
+
+    compositor = create_compositor(scene, plan_cache)
+    report = compositor.setup_compositor_nodes(dry_run=True)
+
+    # 路径只依赖视图层与分类
+    planned_outputs = {vl['name']: {category: None for category in vl['outputs']}
+                       for vl in report['plan']['view_layers']}
+    report['paths'] = {} if flash_aov.path_protection else \
+        resolve_output_path(scene, planned_outputs, project_name)
+    return report
+
+
+# 输出格式中由 apply_output_formats 写入的属性
+FORMAT_ATTRS = ('file_format', 'color_depth', 'exr_codec', 'color_mode', 'compression', 'quality')
+
+
+def _format_proxy(image_format):
+    return SimpleNamespace(target=image_format, **{attr: getattr(image_format, attr) for attr in FORMAT_ATTRS})
+
+
+def _output_proxy(node):
+    """输出节点的可写副本，target 指向原对象"""
+    slots = [SimpleNamespace(target=slot, use_node_format=slot.use_node_format, format=_format_proxy(slot.format))
+             for slot in node.file_slots]
+    return SimpleNamespace(target=node, format=_format_proxy(node.format), inputs=list(node.inputs),
+                           file_slots=slots, use_custom_color=node.use_custom_color, color=tuple(node.color))
+
+
+# 输出估算报告写入的文本数据块
+ESTIMATE_TEXT = "Flash_Estimate.json"
+# 最近一次估算结果 {场景名称: 报告}，供面板显示
+last_estimates = {}
+
+
+def _format_dict(fmt):
+    return {
+        'file_format': fmt.file_format,
+        'color_depth': fmt.color_depth,
+        'exr_codec': fmt.exr_codec,
+        'color_mode': fmt.color_mode,
+        'quality': fmt.quality,
+    }
+
+
+@traced()
+def estimate_scene_output(scene):
+    """估算场景中每个 _Flash 输出节点每帧写入的字节数，按视图层与镜头汇总"""
+    compositor = BlenderCompositor(scene=scene)
+    render = scene.render
+    scale = render.resolution_percentage / 100
+    width, height = int(render.resolution_x * scale), int(render.resolution_y * scale)
+
+    nodes = []
+    # 未启用节点合成器的场景没有输出节点，估算为空
+    outputs_by_layer = compositor.get_output_nodes_by_name() if uses_compositor(scene) else {}
+    for view_layer_name, outputs in outputs_by_layer.items():
+        for category, node in outputs.items():
+            fmt = _format_dict(node.format)
+            slots = []
+            for i, socket in enumerate(node.inputs):
+                # 写入的通道数由上游端口类型决定
+                from_socket = compositor.link_index.source(socket)[0]
+                slot = node.file_slots[i]
+                slot_fmt = None if slot.use_node_format else _format_dict(slot.format)
+                slots.append((socket.name, (from_socket or socket).type, slot_fmt))
+            nodes.append(estimate_node(node.name, slots, fmt, width, height,
+                                       view_layer_name, category))
+
+    report = summarize(nodes, scene.frame_end - scene.frame_start + 1, width, height)
+    report['scene'] = scene.name
+    last_estimates[scene.name] = report
+    return report
+
+
+def write_report_text(report, name):
+    """将报告以 JSON 写入文本数据块，便于在文本编辑器中查看"""
+    text = bpy.data.texts.get(name) or bpy.data.texts.new(name)
+    text.clear()
+    text.write(json.dumps(report, indent=2, ensure_ascii=False))
+    return text
+
+
+@traced()
+def teardown_scene(scene, keep_render_layers=False, restore_links=True):
+    """删除场景中全部 _Flash 节点，返回删除统计"""
+    compositor = BlenderCompositor(scene=scene)
+    report = compositor.teardown(keep_render_layers, restore_links)
+    last_estimates.pop(scene.name, None)
+    return report
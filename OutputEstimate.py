@@ -0,0 +1,127 @@
+"""
+输出带宽与磁盘占用估算
+纯Python实现，不依赖bpy：
+按分辨率、插槽通道数、位深与编码的典型压缩率估算每个输出节点每帧写入的字节数，
+并汇总到视图层与整个镜头。压缩率为渲染素材的经验值，用于容量规划与发现低效设置
+"""
+
+# EXR 编码的典型压缩率（压缩后 / 未压缩），有损编码按默认质量
+EXR_COMPRESSION = {
+    'NONE': 1.0,
+    'RLE': 0.85,
+    'ZIPS': 0.6,
+    'ZIP': 0.55,
+    'PIZ': 0.5,
+    'PXR24': 0.45,
+    'B44': 0.5,
+    'B44A': 0.45,
+    'DWAA': 0.2,
+    'DWAB': 0.2,
+}
+PNG_COMPRESSION = 0.6
+# 每个端口类型写入的通道数
+SOCKET_CHANNELS = {'RGBA': 4, 'VECTOR': 3, 'VALUE': 1}
+COLOR_MODE_CHANNELS = {'BW': 1, 'RGB': 3, 'RGBA': 4}
+# 单个节点每帧超过该字节数时给出提示
+LARGE_NODE_BYTES = 512 * 1024 * 1024
+
+
+def bytes_per_channel(fmt):
+    """每个通道每像素的字节数"""
+    if fmt['file_format'] == 'JPEG':
+        return 1
+    if fmt['file_format'] == 'PNG':
+        return 2 if fmt.get('color_depth') == '16' else 1
+    return 4 if fmt.get('color_depth') == '32' else 2
+
+
+def compression_ratio(fmt):
+    file_format = fmt['file_format']
+    if file_format == 'JPEG':
+        # 质量越高文件越大
+        return 0.05 + 0.25 * fmt.get('quality', 90) / 100
+    if file_format == 'PNG':
+        return PNG_COMPRESSION
+    return EXR_COMPRESSION.get(str(fmt.get('exr_codec', 'ZIP')).upper(), 1.0)
+
+
+def slot_channels(socket_type, fmt):
+    """插槽写入的通道数：多层 EXR 按端口类型，单层文件按颜色模式"""
+    channels = SOCKET_CHANNELS.get(socket_type, 4)
+    if fmt['file_format'] == 'OPEN_EXR_MULTILAYER':
+        if socket_type == 'RGBA' and fmt.get('color_mode') == 'RGB':
+            return 3
+        return channels
+    return COLOR_MODE_CHANNELS.get(fmt.get('color_mode'), channels)
+
+
+def estimate_node(name, slots, fmt, width, height, view_layer='', category=''):
+    """估算单个输出节点每帧写入的字节数
+    slots: [(插槽名称, 上游端口类型, 插槽格式或 None)]，
+    多层 EXR 写入一个文件；其他格式每个插槽一个文件，插槽格式为 None 时使用节点格式
+    """
+    pixels = width * height
+    multilayer = fmt['file_format'] == 'OPEN_EXR_MULTILAYER'
+    channels = 0
+    raw_bytes = 0
+    written = 0.0
+    for slot_name, socket_type, slot_fmt in slots:
+        slot_fmt = fmt if multilayer or slot_fmt is None else slot_fmt
+        n = slot_channels(socket_type, slot_fmt)
+        size = pixels * n * bytes_per_channel(slot_fmt)
+        channels += n
+        raw_bytes += size
+        written += size * compression_ratio(slot_fmt)
+    return {
+        'name': name,
+        'view_layer': view_layer,
+        'category': category,
+        'format': fmt['file_format'],
+        'color_depth': fmt.get('color_depth'),
+        'exr_codec': fmt.get('exr_codec'),
+        'files': (1 if slots else 0) if multilayer else len(slots),
+        'channels': channels,
+        'raw_bytes': raw_bytes,
+        'bytes': int(written),
+    }
+
+
+def node_warnings(entry):
+    """影响读写效率的设置"""
+    warnings = []
+    is_exr = entry['format'] in ('OPEN_EXR', 'OPEN_EXR_MULTILAYER')
+    if is_exr and str(entry['exr_codec']).upper() == 'NONE':
+        warnings.append(f"{entry['name']}: uncompressed EXR")
+    if is_exr and entry['color_depth'] == '32' and entry['category'] in ('rgb', 'lightgroup'):
+        warnings.append(f"{entry['name']}: full float color, half float is usually enough")
+    if entry['bytes'] > LARGE_NODE_BYTES:
+        warnings.append(f"{entry['name']}: {format_bytes(entry['bytes'])} per frame")
+    return warnings
+
+
+def summarize(nodes, frames, width=0, height=0):
+    """汇总节点估算：每个视图层、每帧与整个镜头"""
+    view_layers = {}
+    warnings = []
+    for entry in nodes:
+        view_layers[entry['view_layer']] = view_layers.get(entry['view_layer'], 0) + entry['bytes']
+        warnings.extend(node_warnings(entry))
+    per_frame = sum(entry['bytes'] for entry in nodes)
+    return {
+        'resolution': [width, height],
+        'frames': frames,
+        'per_frame': per_frame,
+        'per_shot': per_frame * frames,
+        'view_layers': view_layers,
+        'nodes': nodes,
+        'warnings': warnings,
+    }
+
+
+def format_bytes(n):
+    """字节数的可读形式"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(n) < 1024:
+            return f"{n:.1f} {unit}" if unit != 'B' else f"{int(n)} B"
+        n /= 1024
+    return f"{n:.2f} TB"
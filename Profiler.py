@@ -0,0 +1,135 @@
+"""
+性能分析
+嵌套计时区间与计数器，可导出为 Chrome Trace（chrome://tracing / Perfetto）格式；
+没有激活的分析器时 span/count 为空操作
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 当前激活的分析器
+_active = None
+# 最近一次完成的分析结果，供面板显示与导出
+last_profile = None
+
+
+class Profiler:
+    def __init__(self, name="Flash AOV"):
+        self.name = name
+        self.events = []     # Chrome Trace 事件
+        self.totals = {}     # 区间名称 -> [总耗时(秒), 调用次数]
+        self.counters = {}   # 计数器名称 -> 数值
+        self.depth = 0
+        self._counters_dirty = False
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._tid = threading.get_ident()
+
+    def _now_us(self):
+        return (time.perf_counter() - self._origin) * 1e6
+
+    @contextmanager
+    def span(self, name, **args):
+        start = time.perf_counter()
+        ts = self._now_us()
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            duration = time.perf_counter() - start
+            event = {'name': name, 'ph': 'X', 'ts': ts, 'dur': duration * 1e6,
+                     'pid': self._pid, 'tid': self._tid}
+            if args:
+                event['args'] = args
+            self.events.append(event)
+            total = self.totals.setdefault(name, [0.0, 0])
+            total[0] += duration
+            total[1] += 1
+            if self._counters_dirty:
+                self._emit_counters()
+
+    def count(self, key, n=1):
+        self.counters[key] = self.counters.get(key, 0) + n
+        self._counters_dirty = True
+
+    def _emit_counters(self):
+        self.events.append({'name': 'ops', 'ph': 'C', 'ts': self._now_us(),
+                            'pid': self._pid, 'tid': self._tid, 'args': dict(self.counters)})
+        self._counters_dirty = False
+
+    def summary(self, limit=None):
+        """按总耗时排序的 [(名称, 总耗时(秒), 调用次数)]"""
+        rows = sorted(((name, total[0], total[1]) for name, total in self.totals.items()),
+                      key=lambda row: row[1], reverse=True)
+        return rows[:limit] if limit else rows
+
+    def to_chrome_trace(self):
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': self._pid,
+                   'args': {'name': self.name}}]
+        events.extend(sorted(self.events, key=lambda e: e['ts']))
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'spans': [{'name': name, 'time': round(t, 6), 'calls': calls}
+                      for name, t, calls in self.summary()],
+            'counters': dict(self.counters),
+        }
+
+    def export_chrome_trace(self, filepath):
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f)
+
+
+@contextmanager
+def profiling(name="Flash AOV"):
+    """在上下文内激活一个新的分析器，结束后保存为 last_profile"""
+    global _active, last_profile
+    previous = _active
+    profiler = Profiler(name)
+    _active = profiler
+    try:
+        with profiler.span(name):
+            yield profiler
+    finally:
+        _active = previous
+        last_profile = profiler
+
+
+def active_profiler():
+    return _active
+
+
+@contextmanager
+def span(name, **args):
+    """在激活的分析器中记录一个计时区间"""
+    if _active is None:
+        yield
+        return
+    with _active.span(name, **args):
+        yield
+
+
+def count(key, n=1):
+    if _active is not None:
+        _active.count(key, n)
+
+
+def traced(name=None):
+    """装饰器：函数调用记录为计时区间"""
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.span(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,228 @@
+"""
+合成器配置基准测试
+生成指定规模的合成场景，测量 setup_compositor_nodes 在
+冷启动（空节点树）、热启动（无改动重跑）与小改动后的耗时、内存峰值与节点/连接数量：
+
+    blender -b --python benchmark.py -- --layers 1,10,50,100,200 --output bench.json
+    python benchmark.py --layers 1,10,50      （使用 pip 安装的 bpy 模块）
+
+内存峰值由 tracemalloc 统计，只包含 Python 侧的分配；
+常驻内存（RSS）增量包含 Blender 的 C 侧分配，各平台都读取当前 RSS（不是峰值）。
+界面模式下每次配置后压入一个撤销步骤，以其 RSS 增量近似撤销栈占用（后台模式没有撤销栈，不统计）。
+对比单一撤销步骤前后的撤销内存时，在同一台机器上分别用两个版本的插件运行：
+
+    blender --python benchmark.py -- --layers 10,50 --output undo_before.json   （user-024 之前的版本）
+    blender --python benchmark.py -- --layers 10,50 --output undo_after.json
+
+已知缺口：上述对比尚未测得。现有数据都来自后台模式或 bpy 替身，没有撤销栈，undo(KB) 一列为空。
+"""
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import bpy
+
+# 可启用的渲染通道（ViewLayer.use_pass_*），按顺序取前 N 个
+PASS_ATTRS = [
+    'z', 'normal', 'position', 'diffuse_direct', 'diffuse_color', 'glossy_direct',
+    'glossy_color', 'emit', 'mist', 'vector', 'uv', 'diffuse_indirect', 'glossy_indirect',
+    'transmission_direct', 'transmission_indirect', 'transmission_color',
+    'environment', 'ambient_occlusion', 'object_index', 'material_index',
+]
+
+
+def build_scene(name, view_layers=10, passes=6, shader_aovs=1, lightgroups=2, cryptomatte_depth=4):
+    """新建一个合成场景，每个视图层启用相同的通道配置"""
+    scene = bpy.data.scenes.new(name)
+    scene.render.engine = 'CYCLES'
+    # 新场景自带一个视图层，统一改名后补齐数量
+    layers = list(scene.view_layers)
+    layers[0].name = "VL_000"
+    for i in range(1, view_layers):
+        layers.append(scene.view_layers.new(f"VL_{i:03d}"))
+
+    for view_layer in layers:
+        for attr in PASS_ATTRS[:passes]:
+            setattr(view_layer, f"use_pass_{attr}", True)
+        view_layer.use_pass_cryptomatte_object = cryptomatte_depth > 0
+        view_layer.use_pass_cryptomatte_material = cryptomatte_depth > 0
+        if cryptomatte_depth > 0:
+            view_layer.pass_cryptomatte_depth = cryptomatte_depth
+        for i in range(shader_aovs):
+            aov = view_layer.aovs.add()
+            aov.name = f"mask{i}"
+        for i in range(lightgroups):
+            view_layer.lightgroups.add(name=f"light{i}")
+    return scene
+
+
+def small_edit(scene):
+    """模拟美术的小改动：一个视图层新增灯光组，另一个视图层多开一个通道"""
+    layers = list(scene.view_layers)
+    layers[0].lightgroups.add(name="light_edit")
+    last = layers[-1]
+    for attr in PASS_ATTRS:
+        if not getattr(last, f"use_pass_{attr}"):
+            setattr(last, f"use_pass_{attr}", True)
+            break
+
+
+def rss_kb():
+    """当前进程的常驻内存（KB），无法读取时返回 None
+    各平台都读取当前值而不是峰值（ru_maxrss），前后相减才能得到增量
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss // 1024
+    except ImportError:
+        pass
+    if sys.platform == 'win32':
+        return _windows_working_set_kb()
+    # macOS 等：Blender 自带的 Python 没有 psutil，用 ps 读取当前 RSS（KB）
+    try:
+        result = subprocess.run(['ps', '-o', 'rss=', '-p', str(os.getpid())],
+                                capture_output=True, text=True, check=True)
+        return int(result.stdout.strip())
+    except (OSError, ValueError, subprocess.CalledProcessError):
+        return None
+
+
+def _windows_working_set_kb():
+    """Windows：GetProcessMemoryInfo 的 WorkingSetSize（当前常驻内存）"""
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    kernel32 = ctypes.windll.kernel32
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    if not kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters.WorkingSetSize // 1024
+
+
+def undo_push_kb(message):
+    """压入一个撤销步骤，返回其 RSS 增量（KB）；后台模式没有撤销栈时返回 None"""
+    if bpy.app.background:
+        return None
+    before = rss_kb()
+    bpy.ops.ed.undo_push(message=message)
+    after = rss_kb()
+    return None if before is None or after is None else after - before
+
+
+def measure(compositor_module, scene, incremental):
+    """运行一次配置并返回测量结果"""
+    compositor = compositor_module.BlenderCompositor(
+        separate_data=1, separate_cryptomatte=1, separate_shaderaov=1, separate_lightgroup=1,
+        scene=scene)
+    compositor.incremental = incremental
+
+    tracemalloc.reset_peak()
+    rss_before = rss_kb()
+    start = time.perf_counter()
+    compositor.setup_compositor_nodes()
+    wall = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    rss_after = rss_kb()
+
+    return {
+        'time': round(wall, 5),
+        'peak_kb': round(peak / 1024, 1),
+        'rss_kb': None if rss_before is None or rss_after is None else rss_after - rss_before,
+        # 与配置操作符一致：整次配置只产生一个撤销步骤
+        'undo_kb': undo_push_kb("Flash AOV benchmark"),
+        'op_count': compositor.op_count,
+        'skipped_view_layers': len(compositor.skipped_view_layers),
+        'nodes': len(scene.node_tree.nodes),
+        'links': len(scene.node_tree.links),
+    }
+
+
+def run_case(compositor_module, view_layers, args):
+    scene = build_scene(f"Bench_{view_layers}", view_layers, args.passes, args.aovs,
+                        args.lightgroups, args.cryptomatte_depth)
+    incremental = not args.full
+    try:
+        result = {'view_layers': view_layers}
+        result['cold'] = measure(compositor_module, scene, incremental)
+        result['warm'] = measure(compositor_module, scene, incremental)
+        small_edit(scene)
+        result['edit'] = measure(compositor_module, scene, incremental)
+    finally:
+        bpy.data.scenes.remove(scene)
+    return result
+
+
+def parse_args(argv=None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    parser = argparse.ArgumentParser(description="Benchmark the Flash AOV compositor setup")
+    parser.add_argument("--layers", default="1,10,50,100",
+                        help="Comma separated view layer counts to sweep")
+    parser.add_argument("--passes", type=int, default=6, help="Enabled passes per view layer")
+    parser.add_argument("--aovs", type=int, default=1, help="Shader AOVs per view layer")
+    parser.add_argument("--lightgroups", type=int, default=2, help="Light groups per view layer")
+    parser.add_argument("--cryptomatte-depth", type=int, default=4, help="Cryptomatte levels (0 disables)")
+    parser.add_argument("--full", action="store_true", help="Disable incremental mode")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from . import CompositorOutfileSet
+
+    args = parse_args(argv)
+    counts = [int(n) for n in args.layers.split(",") if n.strip()]
+
+    tracemalloc.start()
+    try:
+        results = [run_case(CompositorOutfileSet, n, args) for n in counts]
+    finally:
+        tracemalloc.stop()
+
+    report = {
+        'blender': getattr(bpy.app, 'version_string', ''),
+        'settings': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': results,
+    }
+    print(f"{'layers':>7} {'phase':>5} {'time(s)':>9} {'peak(KB)':>10} {'rss(KB)':>9} {'undo(KB)':>9} "
+          f"{'ops':>7} {'nodes':>7} {'links':>7}")
+    for result in results:
+        for phase in ('cold', 'warm', 'edit'):
+            r = result[phase]
+            rss = '-' if r['rss_kb'] is None else r['rss_kb']
+            undo = '-' if r['undo_kb'] is None else r['undo_kb']
+            print(f"{result['view_layers']:>7} {phase:>5} {r['time']:>9.4f} {r['peak_kb']:>10.1f} {rss:>9} {undo:>9} "
+                  f"{r['op_count']:>7} {r['nodes']:>7} {r['links']:>7}")
+    if all(result[phase]['undo_kb'] is None for result in results for phase in ('cold', 'warm', 'edit')):
+        print("undo(KB): 后台模式没有撤销栈，未测量；请在界面模式下运行以对比撤销栈内存")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    # 以脚本方式运行时，按插件目录名导入包
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(package_dir))
+    module = importlib.import_module(os.path.basename(package_dir) + ".benchmark")
+    module.main()
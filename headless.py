@@ -0,0 +1,209 @@
+"""
+命令行入口
+渲染农场提交前在后台模式下配置输出节点，不依赖界面与 NODE_EDITOR 区域：
+
+    blender -b shot.blend --python headless.py -- --version 3 --separate-data --save --report report.json
+    blender -b shot.blend --python headless.py -- --teardown --save
+
+参数写入场景的 Flash AOV 设置后执行与“配置输出”相同的流程，
+结果（耗时、节点数量、操作数、解析后的路径）以 JSON 输出
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+
+import bpy
+
+
+def parse_args(argv=None):
+    """解析 "--" 之后的参数，未指定的开关沿用场景中已保存的设置"""
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    parser = argparse.ArgumentParser(
+        prog="blender -b file.blend --python headless.py --",
+        description="Configure Flash AOV compositor outputs without the UI")
+    parser.add_argument("--scene", action="append", default=None,
+                        help="Scene to configure, can be repeated (default: all scenes)")
+    parser.add_argument("--version", type=int, default=None, help="Version number for {v}")
+    parser.add_argument("--render-path", default=None, help="Output path template")
+    parser.add_argument("--render-name", default=None, help="Output file name template")
+    parser.add_argument("--denoise-exclude", default=None,
+                        help="Comma separated pass names or wildcards that are never denoised")
+    parser.add_argument("--precision-overrides", default=None,
+                        help="Per-pass precision overrides, e.g. Emit=32,lgt_*=16")
+    parser.add_argument("--shard-max-channels", type=int, default=None,
+                        help="Maximum channels per output node when sharding")
+    parser.add_argument("--shard-max-size", type=float, default=None,
+                        help="Maximum estimated MB per output file and frame when sharding")
+    for flag, prop in [("separate-data", "separate_data"),
+                       ("separate-cryptomatte", "separate_cryptomatte"),
+                       ("separate-shaderaov", "separate_shaderaov"),
+                       ("separate-lightgroup", "separate_lightgroup"),
+                       ("denoise", "enable_denoise"),
+                       ("axis-correct", "axis_correct"),
+                       ("precision-policy", "precision_policy"),
+                       ("shard-outputs", "shard_outputs"),
+                       ("incremental", "incremental_update"),
+                       ("path-protection", "path_protection")]:
+        parser.add_argument(f"--{flag}", dest=prop, action=argparse.BooleanOptionalAction, default=None)
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only report the planned changes, do not modify the node trees "
+                             "(op_estimate is approximate: node, slot and link changes only)")
+    parser.add_argument("--estimate", action="store_true",
+                        help="Add the per-node output size estimate to the report")
+    parser.add_argument("--teardown", action="store_true",
+                        help="Remove every _Flash node instead of configuring the outputs")
+    parser.add_argument("--keep-render-layers", action="store_true",
+                        help="With --teardown, keep the render layer nodes created by the add-on")
+    parser.add_argument("--restore-links", action=argparse.BooleanOptionalAction, default=True,
+                        help="With --teardown, link user nodes fed by removed denoise/axis nodes to the render layer")
+    parser.add_argument("--save", action="store_true", help="Save the .blend file after configuring")
+    parser.add_argument("--trace", default=None, help="Write a Chrome trace JSON file of the run")
+    parser.add_argument("--report", default=None, help="Write the JSON report to this file (default: stdout)")
+    return parser.parse_args(argv)
+
+
+# 命令行参数 -> FlashAOVProperties 属性
+SETTING_ARGS = {
+    'version': 'version_number',
+    'render_path': 'render_path',
+    'render_name': 'render_name',
+    'denoise_exclude': 'denoise_exclude',
+    'precision_overrides': 'precision_overrides',
+    'shard_max_channels': 'shard_max_channels',
+    'shard_max_size': 'shard_max_size',
+    'separate_data': 'separate_data',
+    'separate_cryptomatte': 'separate_cryptomatte',
+    'separate_shaderaov': 'separate_shaderaov',
+    'separate_lightgroup': 'separate_lightgroup',
+    'enable_denoise': 'enable_denoise',
+    'axis_correct': 'axis_correct',
+    'precision_policy': 'precision_policy',
+    'shard_outputs': 'shard_outputs',
+    'incremental_update': 'incremental_update',
+    'path_protection': 'path_protection',
+}
+
+
+def apply_settings(scene, args):
+    """将命令行中指定的参数写入场景的 Flash AOV 设置，返回被覆盖的原值 {属性: 值}"""
+    previous = {}
+    for arg, prop in SETTING_ARGS.items():
+        value = getattr(args, arg, None)
+        if value is not None:
+            previous[prop] = getattr(scene.flash_aov, prop)
+            setattr(scene.flash_aov, prop, value)
+    return previous
+
+
+def restore_settings(scene, previous):
+    """恢复 apply_settings 覆盖前的设置"""
+    for prop, value in previous.items():
+        setattr(scene.flash_aov, prop, value)
+
+
+def ensure_registered():
+    """以脚本方式运行时插件可能未启用，需要先注册属性"""
+    if not hasattr(bpy.types.Scene, "flash_aov"):
+        from . import register
+        register()
+
+
+def run(args):
+    """配置场景并返回 JSON 报告（dict）"""
+    from .CompositorPlan import PlanCache
+    from .OutputConfig import (configure_scene, preview_scene, get_project_name, estimate_scene_output,
+                               teardown_scene)
+
+    ensure_registered()
+    names = args.scene or [scene.name for scene in bpy.data.scenes]
+    scenes = [bpy.data.scenes.get(name) for name in names]
+
+    plan_cache = PlanCache()
+    project_name = get_project_name()
+    report = {
+        'file': bpy.data.filepath,
+        'blender': bpy.app.version_string,
+        'scenes': [],
+    }
+    start = time.perf_counter()
+    for name, scene in zip(names, scenes):
+        if scene is None:
+            # 场景不存在时记录错误，main 据此返回非零退出码
+            report['scenes'].append({'scene': name, 'error': f"Scene not found: {name}", 'time': 0.0})
+            continue
+        scene_start = time.perf_counter()
+        entry = {'scene': scene.name}
+        previous = {}
+        try:
+            previous = apply_settings(scene, args)
+            if args.teardown:
+                # 移除插件创建的全部节点
+                entry.update(teardown_scene(scene, args.keep_render_layers, args.restore_links))
+                node_tree = scene.node_tree
+                entry['node_count'] = len(node_tree.nodes) if node_tree is not None else 0
+                entry['link_count'] = len(node_tree.links) if node_tree is not None else 0
+            elif args.dry_run:
+                # 试运行：修改清单与估算，不改动节点树
+                entry.update(preview_scene(scene, plan_cache, project_name))
+            else:
+                compositor, paths_dict = configure_scene(scene, plan_cache, project_name)
+                entry.update({
+                    'op_count': compositor.op_count,
+                    'stats': dict(compositor.stats),
+                    'node_count': len(scene.node_tree.nodes),
+                    'link_count': len(scene.node_tree.links),
+                    'view_layers': len(scene.view_layers),
+                    'skipped_view_layers': list(compositor.skipped_view_layers),
+                    'denoise': compositor.denoise_report(),
+                    'paths': paths_dict,
+                    'warnings': list(compositor.warnings),
+                })
+                if args.estimate:
+                    entry['estimate'] = estimate_scene_output(scene)
+        except Exception as e:
+            entry['error'] = str(e)
+        finally:
+            if args.dry_run:
+                # 试运行只在本次规划中使用命令行参数，不改动场景设置
+                restore_settings(scene, previous)
+        entry['time'] = round(time.perf_counter() - scene_start, 4)
+        report['scenes'].append(entry)
+    report['time'] = round(time.perf_counter() - start, 4)
+    report['classification_cache'] = {'hits': plan_cache.hits, 'misses': plan_cache.misses}
+
+    if args.save and bpy.data.filepath and not args.dry_run:
+        bpy.ops.wm.save_mainfile()
+        report['saved'] = True
+    return report
+
+
+def main(argv=None):
+    from . import Profiler as profiler
+
+    args = parse_args(argv)
+    with profiler.profiling("Flash AOV headless") as profile:
+        report = run(args)
+    report['profile'] = profile.to_dict()
+    if args.trace:
+        profile.export_chrome_trace(args.trace)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    # 任一场景出错时返回非零退出码，便于提交脚本判断
+    return 1 if any('error' in entry for entry in report['scenes']) else 0
+
+
+if __name__ == "__main__":
+    # 以 blender -b --python headless.py 方式运行时，按插件目录名导入包
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(package_dir))
+    module = importlib.import_module(os.path.basename(package_dir) + ".headless")
+    sys.exit(module.main())
@@ -1,9 +1,21 @@
 from ctypes import alignment
 from os import fstat
+import json
+import time
+
 import bpy
 import mathutils
+from bpy_extras.io_utils import ExportHelper
 from numpy import choose
-from .CompositorOutfileSet import BlenderCompositor  # 导入节点操作文件
+from .CompositorOutfileSet import BlenderCompositor, run_steps  # 导入节点操作文件
+from .CompositorPlan import PlanCache
+from . import Profiler as profiler
+from . import OutputConfig
+from .OutputConfig import (get_project_name, resolve_output_path, assign_paths_to_nodes,
+                           configure_scene, preview_scene, write_report_text,
+                           estimate_scene_output, teardown_scene, create_compositor, finish_configure,
+                           ESTIMATE_TEXT)
+from .OutputEstimate import format_bytes
 
 
 
@@ -48,7 +60,70 @@ translations = {
         "Separate the data layer to a new output node, position, normal, etc": "Separate the data layer to a new output node, position, normal, etc",
         "Separate the cryptomattee layer to a new output node": "Separate the cryptomattee layer to a new output node",
         "Separate the shader AOV layer to a new output node": "Separate the shader AOV layer to a new output node",
-        "Separate the light group layer to a new output node": "Separate the light group layer to a new output node"
+        "Separate the light group layer to a new output node": "Separate the light group layer to a new output node",
+        "Incremental Update": "Incremental Update",
+        "Only apply the differences to existing Flash nodes": "Only apply the differences to existing Flash nodes",
+        "Rendering node configuration completed! {count} changes applied": "Rendering node configuration completed! {count} changes applied",
+        "Dry Run": "Dry Run",
+        "Report the planned changes without modifying the node tree": "Report the planned changes without modifying the node tree",
+        "Dry run: nodes +{nodes_created} -{nodes_removed}, slots +{slots_added} -{slots_removed}, links +{links_created} -{links_removed}": "Dry run: nodes +{nodes_created} -{nodes_removed}, slots +{slots_added} -{slots_removed}, links +{links_created} -{links_removed}",
+        "About {count} changes, {time:.2f}s estimated (approximate: property writes are not counted)": "About {count} changes, {time:.2f}s estimated (approximate: property writes are not counted)",
+        "Export Dry Run": "Export Dry Run",
+        "Write the dry-run report of the current scene to a JSON file": "Write the dry-run report of the current scene to a JSON file",
+        "Dry run exported to {path}": "Dry run exported to {path}",
+        "Last Run": "Last Run",
+        "Export Chrome Trace": "Export Chrome Trace",
+        "Export the timing of the last run as a Chrome trace JSON file": "Export the timing of the last run as a Chrome trace JSON file",
+        "Trace exported to {path}": "Trace exported to {path}",
+        "Configure All Scenes": "Configure All Scenes",
+        "Configure output for all view layers in every scene of the file": "Configure output for all view layers in every scene of the file",
+        "{scene}: {count} changes in {time:.2f}s": "{scene}: {count} changes in {time:.2f}s",
+        "Configured {scenes} scenes: {count} changes in {time:.2f}s": "Configured {scenes} scenes: {count} changes in {time:.2f}s",
+        "Column Height": "Column Height",
+        "Maximum height of a column of view layer nodes before wrapping to a new column": "Maximum height of a column of view layer nodes before wrapping to a new column",
+        "Denoise RGB": "Denoise RGB",
+        "Denoise Light Groups": "Denoise Light Groups",
+        "Prefilter": "Prefilter",
+        "Exclude Passes": "Exclude Passes",
+        "Comma separated pass names or wildcards that are never denoised, e.g. Emit, lgt_rim*": "Comma separated pass names or wildcards that are never denoised, e.g. Emit, lgt_rim*",
+        "{count} denoise passes per frame, {total} for the shot": "{count} denoise passes per frame, {total} for the shot",
+        "Estimate Output Size": "Estimate Output Size",
+        "Estimate the bytes written per frame by every Flash output node": "Estimate the bytes written per frame by every Flash output node",
+        "Show or hide the output nodes of this view layer": "Show or hide the output nodes of this view layer",
+        "Output Estimate": "Output Estimate",
+        "Per Frame": "Per Frame",
+        "Per Shot ({frames} frames)": "Per Shot ({frames} frames)",
+        "Output estimate: {frame} per frame, {shot} for the shot (see {text})": "Output estimate: {frame} per frame, {shot} for the shot (see {text})",
+        "Per-Pass Precision": "Per-Pass Precision",
+        "Write each pass at the smallest adequate EXR bit depth (half for color, full for position, depth and cryptomatte)": "Write each pass at the smallest adequate EXR bit depth (half for color, full for position, depth and cryptomatte)",
+        "Precision Overrides": "Precision Overrides",
+        "Comma separated overrides by pass name, wildcard or category, e.g. Emit=32, lgt_*=16, shaderaov=full": "Comma separated overrides by pass name, wildcard or category, e.g. Emit=32, lgt_*=16, shaderaov=full",
+        "Cryptomatte Format": "Cryptomatte Format",
+        "Shader AOV Format": "Shader AOV Format",
+        "Light Group Format": "Light Group Format",
+        "Same as Base Format": "Same as Base Format",
+        "Same as RGB Format": "Same as RGB Format",
+        "Same as Data Format": "Same as Data Format",
+        "Use the RGB (light groups) or Data (shader AOVs, cryptomatte) format for these outputs": "Use the RGB (light groups) or Data (shader AOVs, cryptomatte) format for these outputs",
+        "Always written lossless in full float": "Always written lossless in full float",
+        "Shard Outputs": "Shard Outputs",
+        "Split multilayer EXR outputs that exceed the channel or size budget into several nodes": "Split multilayer EXR outputs that exceed the channel or size budget into several nodes",
+        "Max Channels": "Max Channels",
+        "Maximum channels per output node (0 for no limit)": "Maximum channels per output node (0 for no limit)",
+        "Max Size (MB)": "Max Size (MB)",
+        "Maximum estimated size per output file and frame in MB (0 for no limit)": "Maximum estimated size per output file and frame in MB (0 for no limit)",
+        "Remove Flash Nodes": "Remove Flash Nodes",
+        "Remove every _Flash node from the compositor of the current scene": "Remove every _Flash node from the compositor of the current scene",
+        "Keep Render Layers": "Keep Render Layers",
+        "Keep the render layer nodes created by Flash AOV": "Keep the render layer nodes created by Flash AOV",
+        "Restore Links": "Restore Links",
+        "Link user nodes fed by removed denoise or axis nodes directly to the render layer": "Link user nodes fed by removed denoise or axis nodes directly to the render layer",
+        "Removed {count} nodes, restored {links} links in {time:.2f}s": "Removed {count} nodes, restored {links} links in {time:.2f}s",
+        "Configure Output (Background)": "Configure Output (Background)",
+        "Configure the view layers in small batches with a progress bar, press Esc to cancel": "Configure the view layers in small batches with a progress bar, press Esc to cancel",
+        "Flash AOV: configuring view layer {done}/{total} (Esc to cancel)": "Flash AOV: configuring view layer {done}/{total} (Esc to cancel)",
+        "Cancelled after {done} of {total} view layers, {count} changes applied": "Cancelled after {done} of {total} view layers, {count} changes applied",
+        "Stopped after {done} of {total} view layers: the file was changed by undo or load": "Stopped after {done} of {total} view layers: the file was changed by undo or load"
     },
     "zh_HANS": {
         "Flash AOV": "闪光AOV",
@@ -87,7 +162,70 @@ translations = {
         "Separate the data layer to a new output node, position, normal, etc": "分离数据层到新的输出节点，位置，法线，等等",
         "Separate the cryptomatte layer to a new output node":   "分离 Cryptomatte 层到新的输出节点",
         "Separate the shader AOV layer to a new output node": "分离 Shader AOV 层到新的输出节点",
-        "Separate the light group layer to a new output node": "分离灯光组层到新的输出节点"
+        "Separate the light group layer to a new output node": "分离灯光组层到新的输出节点",
+        "Incremental Update": "增量更新",
+        "Only apply the differences to existing Flash nodes": "仅对已有的Flash节点应用差异修改",
+        "Rendering node configuration completed! {count} changes applied": "渲染节点配置完成！共执行 {count} 项修改",
+        "Dry Run": "试运行",
+        "Report the planned changes without modifying the node tree": "只报告将要执行的修改，不改动节点树",
+        "Dry run: nodes +{nodes_created} -{nodes_removed}, slots +{slots_added} -{slots_removed}, links +{links_created} -{links_removed}": "试运行：节点 +{nodes_created} -{nodes_removed}，插槽 +{slots_added} -{slots_removed}，连接 +{links_created} -{links_removed}",
+        "About {count} changes, {time:.2f}s estimated (approximate: property writes are not counted)": "约 {count} 项修改，预计 {time:.2f} 秒（近似值，不含属性写入）",
+        "Export Dry Run": "导出试运行报告",
+        "Write the dry-run report of the current scene to a JSON file": "将当前场景的试运行报告写入 JSON 文件",
+        "Dry run exported to {path}": "试运行报告已导出到 {path}",
+        "Last Run": "上次运行",
+        "Export Chrome Trace": "导出 Chrome Trace",
+        "Export the timing of the last run as a Chrome trace JSON file": "将上次运行的耗时导出为 Chrome Trace JSON 文件",
+        "Trace exported to {path}": "已导出到 {path}",
+        "Configure All Scenes": "配置所有场景",
+        "Configure output for all view layers in every scene of the file": "为文件中所有场景的视图层配置输出",
+        "{scene}: {count} changes in {time:.2f}s": "{scene}：{count} 项修改，耗时 {time:.2f} 秒",
+        "Configured {scenes} scenes: {count} changes in {time:.2f}s": "已配置 {scenes} 个场景：共 {count} 项修改，耗时 {time:.2f} 秒",
+        "Column Height": "列高",
+        "Maximum height of a column of view layer nodes before wrapping to a new column": "视图层节点每列的最大高度，超出后换到新的一列",
+        "Denoise RGB": "色彩层降噪",
+        "Denoise Light Groups": "灯光组降噪",
+        "Prefilter": "预过滤",
+        "Exclude Passes": "排除通道",
+        "Comma separated pass names or wildcards that are never denoised, e.g. Emit, lgt_rim*": "不降噪的通道名称或通配符，以逗号分隔，例如 Emit, lgt_rim*",
+        "{count} denoise passes per frame, {total} for the shot": "每帧降噪 {count} 次，整个镜头共 {total} 次",
+        "Estimate Output Size": "估算输出大小",
+        "Estimate the bytes written per frame by every Flash output node": "估算每个 Flash 输出节点每帧写入的字节数",
+        "Show or hide the output nodes of this view layer": "显示或隐藏该视图层的输出节点",
+        "Output Estimate": "输出估算",
+        "Per Frame": "每帧",
+        "Per Shot ({frames} frames)": "整个镜头（{frames} 帧）",
+        "Output estimate: {frame} per frame, {shot} for the shot (see {text})": "输出估算：每帧 {frame}，整个镜头 {shot}（详见 {text}）",
+        "Per-Pass Precision": "逐通道精度",
+        "Write each pass at the smallest adequate EXR bit depth (half for color, full for position, depth and cryptomatte)": "每个通道使用足够的最小 EXR 位深（颜色为半精度，位置、深度与 Cryptomatte 为全精度）",
+        "Precision Overrides": "精度覆盖",
+        "Comma separated overrides by pass name, wildcard or category, e.g. Emit=32, lgt_*=16, shaderaov=full": "按通道名称、通配符或分类覆盖精度，以逗号分隔，例如 Emit=32, lgt_*=16, shaderaov=full",
+        "Cryptomatte Format": "Cryptomatte 格式",
+        "Shader AOV Format": "Shader AOV 格式",
+        "Light Group Format": "灯光组格式",
+        "Same as Base Format": "沿用基础格式",
+        "Same as RGB Format": "沿用 RGB 格式",
+        "Same as Data Format": "沿用 Data 格式",
+        "Use the RGB (light groups) or Data (shader AOVs, cryptomatte) format for these outputs": "这些输出使用 RGB（灯光组）或 Data（Shader AOV、Cryptomatte）的格式设置",
+        "Always written lossless in full float": "始终以无损全精度写入",
+        "Shard Outputs": "拆分输出",
+        "Split multilayer EXR outputs that exceed the channel or size budget into several nodes": "多层 EXR 输出超出通道数或大小预算时拆分为多个节点",
+        "Max Channels": "最大通道数",
+        "Maximum channels per output node (0 for no limit)": "每个输出节点的最大通道数（0 为不限制）",
+        "Max Size (MB)": "最大大小（MB）",
+        "Maximum estimated size per output file and frame in MB (0 for no limit)": "每个输出文件每帧的最大估算大小，单位 MB（0 为不限制）",
+        "Remove Flash Nodes": "移除 Flash 节点",
+        "Remove every _Flash node from the compositor of the current scene": "移除当前场景合成器中的全部 _Flash 节点",
+        "Keep Render Layers": "保留渲染层",
+        "Keep the render layer nodes created by Flash AOV": "保留 Flash AOV 创建的渲染层节点",
+        "Restore Links": "恢复连接",
+        "Link user nodes fed by removed denoise or axis nodes directly to the render layer": "经过被移除的降噪/轴向修正节点的用户节点改为直接连接渲染层",
+        "Removed {count} nodes, restored {links} links in {time:.2f}s": "已移除 {count} 个节点，恢复 {links} 个连接，耗时 {time:.2f}s",
+        "Configure Output (Background)": "后台配置输出",
+        "Configure the view layers in small batches with a progress bar, press Esc to cancel": "分批配置视图层并显示进度，按 Esc 取消",
+        "Flash AOV: configuring view layer {done}/{total} (Esc to cancel)": "Flash AOV：正在配置视图层 {done}/{total}（Esc 取消）",
+        "Cancelled after {done} of {total} view layers, {count} changes applied": "已在 {done}/{total} 个视图层后取消，已应用 {count} 项修改",
+        "Stopped after {done} of {total} view layers: the file was changed by undo or load": "已在 {done}/{total} 个视图层后停止：文件已被撤销或重新加载"
         }
     }
 
@@ -101,6 +239,7 @@ PATH_VARIABLES = [
     ("{scene}", "Scene", "Current scene name"),
     ("{viewlayer}", "View Layer", "Name of the view layer"),
     ("{type}", "Type", "Output type (e.g. rgb, data, cryptomatte)"),
+    ("{shard}", "Shard", "Shard of a split output node (s01, s02...), empty when not split"),
     ("{v}", "Version", "Project version number"),
     ("{prj}", "Project Name", "Base name of the .blend file"),
     ("{cam}", "Camera", "Active camera name"),
@@ -306,6 +445,130 @@ class DataFormatProperties(bpy.types.PropertyGroup):
     )  # type: ignore
 
 
+class SeparateFormatProperties:
+    """分离输出的格式设置：字段与 RGB/Data 相同，子类覆盖节点颜色与默认位深/编码；
+    use_base_format 开启时沿用原先共用的格式组（灯光组沿用 RGB，Shader AOV 与 Cryptomatte 沿用 Data），
+    旧文件与新文件默认保持原有输出格式
+    """
+    use_base_format: bpy.props.BoolProperty(
+        name=translate("Same as Base Format"),
+        description=translate("Use the RGB (light groups) or Data (shader AOVs, cryptomatte) format for these outputs"),
+        default=True
+    )  # type: ignore
+    format: bpy.props.EnumProperty(
+        name="",
+        items=format_properties_dict["format"]["items"],
+        default=format_properties_dict["format"]["default"]
+    )  # type: ignore
+    color_mode: bpy.props.EnumProperty(
+        name="",
+        items=format_properties_dict["color_mode"]["items"],
+        default=format_properties_dict["color_mode"]["default"]
+    )  # type: ignore
+    png_color_depth: bpy.props.EnumProperty(
+        name="",
+        items=format_properties_dict["png_color_depth"]["items"],
+        default=format_properties_dict["png_color_depth"]["default16"]
+    )  # type: ignore
+    png_compression: bpy.props.IntProperty(
+        name="",
+        description=format_properties_dict["png_compression"]["description"],
+        min=format_properties_dict["png_compression"]["min"],
+        max=format_properties_dict["png_compression"]["max"],
+        default=format_properties_dict["png_compression"]["default"],
+        subtype='PERCENTAGE'
+    )  # type: ignore
+    jpg_color_mode: bpy.props.EnumProperty(
+        name="",
+        items=format_properties_dict["jpg_color_mode"]["items"],
+        default=format_properties_dict["jpg_color_mode"]["default"]
+    )  # type: ignore
+    jpg_quality: bpy.props.IntProperty(
+        name="",
+        description=format_properties_dict["jpg_quality"]["description"],
+        min=format_properties_dict["jpg_quality"]["min"],
+        max=format_properties_dict["jpg_quality"]["max"],
+        default=format_properties_dict["jpg_quality"]["default"],
+        subtype='PERCENTAGE'
+    )  # type: ignore
+
+
+# 单独设置时的起始值：Cryptomatte 必须无损全精度（写入时强制），Shader AOV 与灯光组使用半精度
+class CryptomatteFormatProperties(SeparateFormatProperties, bpy.types.PropertyGroup):
+    node_color: bpy.props.FloatVectorProperty(
+        name="", description="Node color", default=(0.2,0.08,0.06),  # 红色
+        subtype='COLOR', size=3, min=0.0, max=1.0
+    )  # type: ignore
+    exr_color_depth: bpy.props.EnumProperty(
+        name="", items=format_properties_dict["exr_color_depth"]["items"],
+        default=format_properties_dict["exr_color_depth"]["default32"]
+    )  # type: ignore
+    exr_codec: bpy.props.EnumProperty(
+        name="", items=format_properties_dict["exr_codec"]["items"],
+        default=format_properties_dict["exr_codec"]["defaultZIP"]
+    )  # type: ignore
+
+
+class ShaderAOVFormatProperties(SeparateFormatProperties, bpy.types.PropertyGroup):
+    node_color: bpy.props.FloatVectorProperty(
+        name="", description="Node color", default=(0.06,0.12,0.2),  # 蓝色
+        subtype='COLOR', size=3, min=0.0, max=1.0
+    )  # type: ignore
+    exr_color_depth: bpy.props.EnumProperty(
+        name="", items=format_properties_dict["exr_color_depth"]["items"],
+        default=format_properties_dict["exr_color_depth"]["default16"]
+    )  # type: ignore
+    exr_codec: bpy.props.EnumProperty(
+        name="", items=format_properties_dict["exr_codec"]["items"],
+        default=format_properties_dict["exr_codec"]["defaultZIP"]
+    )  # type: ignore
+
+
+class LightGroupFormatProperties(SeparateFormatProperties, bpy.types.PropertyGroup):
+    node_color: bpy.props.FloatVectorProperty(
+        name="", description="Node color", default=(0.15,0.15,0.03),  # 黄色
+        subtype='COLOR', size=3, min=0.0, max=1.0
+    )  # type: ignore
+    exr_color_depth: bpy.props.EnumProperty(
+        name="", items=format_properties_dict["exr_color_depth"]["items"],
+        default=format_properties_dict["exr_color_depth"]["default16"]
+    )  # type: ignore
+    exr_codec: bpy.props.EnumProperty(
+        name="", items=format_properties_dict["exr_codec"]["items"],
+        default=format_properties_dict["exr_codec"]["defaultDWAA"]
+    )  # type: ignore
+
+
+# 降噪节点的预过滤与质量选项
+DENOISE_PREFILTER_ITEMS = [
+    ('NONE', "None", "No prefiltering, use when the guiding passes are noise-free"),
+    ('FAST', "Fast", "Denoise the image and the guiding passes together"),
+    ('ACCURATE', "Accurate", "Prefilter the guiding passes before denoising"),
+]
+DENOISE_QUALITY_ITEMS = [
+    ('FOLLOW_SCENE', "Follow Scene", "Use the denoising quality of the scene"),
+    ('HIGH', "High", ""),
+    ('BALANCED', "Balanced", ""),
+    ('FAST', "Fast", ""),
+]
+
+
+class DenoiseCategoryProperties(bpy.types.PropertyGroup):
+    enabled: bpy.props.BoolProperty(
+        name="", default=True
+    )  # type: ignore
+    prefilter: bpy.props.EnumProperty(
+        name="",
+        items=DENOISE_PREFILTER_ITEMS,
+        default='ACCURATE'
+    )  # type: ignore
+    quality: bpy.props.EnumProperty(
+        name="",
+        items=DENOISE_QUALITY_ITEMS,
+        default='FOLLOW_SCENE'
+    )  # type: ignore
+
+
 class FlashAOVProperties(bpy.types.PropertyGroup):
     render_path: bpy.props.StringProperty(
         name="Path",
@@ -336,6 +599,17 @@ class FlashAOVProperties(bpy.types.PropertyGroup):
         name="Path Protection", default=False,
         description=translate("Protect the current output path of the node")
         )# type: ignore
+    incremental_update: bpy.props.BoolProperty(
+        name=translate("Incremental Update"), default=True,
+        description=translate("Only apply the differences to existing Flash nodes")
+    )# type: ignore
+    column_height: bpy.props.IntProperty(
+        name=translate("Column Height"),
+        description=translate("Maximum height of a column of view layer nodes before wrapping to a new column"),
+        default=20000,
+        min=1000,
+        max=1000000
+    )# type: ignore
     
     # 分离控制
     separate_data: bpy.props.BoolProperty(
@@ -351,9 +625,51 @@ class FlashAOVProperties(bpy.types.PropertyGroup):
         name=translate("Separate Light Group"), default=True,
         description=translate("Separate the light group layer to a new output node"))# type: ignore
 
+    # 降噪策略
+    denoise_rgb: bpy.props.PointerProperty(type=DenoiseCategoryProperties)# type: ignore
+    denoise_lightgroup: bpy.props.PointerProperty(type=DenoiseCategoryProperties)# type: ignore
+    denoise_exclude: bpy.props.StringProperty(
+        name=translate("Exclude Passes"),
+        description=translate("Comma separated pass names or wildcards that are never denoised, e.g. Emit, lgt_rim*"),
+        default=""
+    )# type: ignore
+
+    # 逐通道精度
+    precision_policy: bpy.props.BoolProperty(
+        name=translate("Per-Pass Precision"), default=False,
+        description=translate("Write each pass at the smallest adequate EXR bit depth (half for color, full for position, depth and cryptomatte)")
+    )# type: ignore
+    precision_overrides: bpy.props.StringProperty(
+        name=translate("Precision Overrides"),
+        description=translate("Comma separated overrides by pass name, wildcard or category, e.g. Emit=32, lgt_*=16, shaderaov=full"),
+        default=""
+    )# type: ignore
+
+    # 按通道数/大小拆分输出节点
+    shard_outputs: bpy.props.BoolProperty(
+        name=translate("Shard Outputs"), default=False,
+        description=translate("Split multilayer EXR outputs that exceed the channel or size budget into several nodes")
+    )# type: ignore
+    shard_max_channels: bpy.props.IntProperty(
+        name=translate("Max Channels"),
+        description=translate("Maximum channels per output node (0 for no limit)"),
+        default=64,
+        min=0,
+        max=4096
+    )# type: ignore
+    shard_max_size: bpy.props.FloatProperty(
+        name=translate("Max Size (MB)"),
+        description=translate("Maximum estimated size per output file and frame in MB (0 for no limit)"),
+        default=512.0,
+        min=0.0
+    )# type: ignore
+
     # 输出格式
     rgb: bpy.props.PointerProperty(type=RGBFormatProperties)# type: ignore
     data: bpy.props.PointerProperty(type=DataFormatProperties)# type: ignore
+    cryptomatte: bpy.props.PointerProperty(type=CryptomatteFormatProperties)# type: ignore
+    shaderaov: bpy.props.PointerProperty(type=ShaderAOVFormatProperties)# type: ignore
+    lightgroup: bpy.props.PointerProperty(type=LightGroupFormatProperties)# type: ignore
 
 
     rgb_parsed_output_path: bpy.props.StringProperty(
@@ -401,193 +717,305 @@ class MY_OT_ChooseNameVariable(bpy.types.Operator):
         props.render_name = props.render_name + self.variable_name
         return {'FINISHED'}
 
-def resolve_output_path(scene, viewlayer_outfile_nodes) -> dict:
-    import os
+class FLASH_OT_preview_compositor(bpy.types.Operator):
+    bl_idname = "flash_aov.preview_compositor"
+    bl_label = translate("Dry Run")
+    bl_description = translate("Report the planned changes without modifying the node tree")
+    # 只读取场景，不产生撤销步骤
+    bl_options = {'REGISTER'}
 
-    path_template = scene.flash_aov.render_path
-    name_template = scene.flash_aov.render_name
-    v = scene.flash_aov.version_number
-    project_name = os.path.splitext(os.path.basename(bpy.data.filepath))[0] if bpy.data.filepath else "MyProject"
-    formatted_v = f"v{v:02d}"
-    paths_dict = {}
+    def execute(self, context):
+        with profiler.profiling(translate("Dry Run")):
+            report = preview_scene(context.scene)
+        changes = report['changes']
+        self.report({'INFO'}, translate("Dry run: nodes +{nodes_created} -{nodes_removed}, slots +{slots_added} -{slots_removed}, links +{links_created} -{links_removed}").format(
+            **{key: len(changes[key]) for key in ('nodes_created', 'nodes_removed', 'slots_added',
+                                                  'slots_removed', 'links_created', 'links_removed')}))
+        self.report({'INFO'}, translate("About {count} changes, {time:.2f}s estimated (approximate: property writes are not counted)").format(
+            count=report['op_estimate'], time=report['runtime_estimate']))
+        return {'FINISHED'}
 
 
-    for view_layer_name, nodes in viewlayer_outfile_nodes.items():
-        camera = scene.camera
-        try:
-            for node_type, node in nodes.items():
-                resolved_path = path_template.format(
-                    scene=scene.name,
-                    viewlayer=view_layer_name,
-                    type=node_type,
-                    v=formatted_v,
-                    prj=project_name,
-                    cam=camera.name if camera else "Camera",
-                    fps=scene.render.fps,
-                    fstart=scene.frame_start,
-                    fend=scene.frame_end,
-                    w=scene.render.resolution_x,
-                    h=scene.render.resolution_y
-                )
-                resolved_name = name_template.format(
-                    scene=scene.name,
-                    viewlayer=view_layer_name,
-                    type=node_type,
-                    v=formatted_v,
-                    prj=project_name,
-                    cam=camera.name if camera else "Camera",
-                    fps=scene.render.fps,
-                    fstart=scene.frame_start,
-                    fend=scene.frame_end,
-                    w=scene.render.resolution_x,
-                    h=scene.render.resolution_y
-                )
-
-                full_path = os.path.join(resolved_path, resolved_name)
-
-                if resolved_path.startswith("//"):
-                    resolved_path = bpy.path.abspath(resolved_path)
-
-                if view_layer_name not in paths_dict:
-                    paths_dict[view_layer_name] = {}
-
-                paths_dict[view_layer_name][node_type] = full_path
-
-        except Exception as e:
-            if view_layer_name not in paths_dict:
-                paths_dict[view_layer_name] = {}
-
-            paths_dict[view_layer_name][node_type] = f"Error: {str(e)}"
-
-    return paths_dict
-
-def assign_paths_to_nodes(viewlayer_outfile_nodes, paths_dict):
-    """将路径字典赋值给合成器输出节点"""
-    for view_layer_name, nodes in viewlayer_outfile_nodes.items():
-        # 获取该视图层的路径配置
-        viewlayer_paths = paths_dict.get(view_layer_name, {})
-        
-        # 遍历每个输出类型和对应节点
-        for node_type, node in nodes.items():
-            # 获取对应类型的路径
-            path = viewlayer_paths.get(node_type)
-            
-            if path and node:
-                try:
-                    node.base_path = path
-                    # print(f"成功设置路径 | 视图层：{view_layer_name} | 类型：{node_type} | 路径：{path}")
-                except Exception as e:
-                    print(f"路径设置失败 | 视图层：{view_layer_name} | 类型：{node_type} | 错误：{str(e)}")
-            else:
-                missing_info = []
-                if not path: missing_info.append("路径")
-                if not node: missing_info.append("节点")
-                print(f"配置缺失 | 视图层：{view_layer_name} | 类型：{node_type} | 缺失：{'、'.join(missing_info)}")
+class FLASH_OT_export_dry_run(bpy.types.Operator, ExportHelper):
+    bl_idname = "flash_aov.export_dry_run"
+    bl_label = translate("Export Dry Run")
+    bl_description = translate("Write the dry-run report of the current scene to a JSON file")
+    bl_options = {'REGISTER'}
+
+    filename_ext = ".json"
+    filter_glob: bpy.props.StringProperty(default="*.json", options={'HIDDEN'})# type: ignore
+
+    def execute(self, context):
+        report = preview_scene(context.scene)
+        with open(self.filepath, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        self.report({'INFO'}, translate("Dry run exported to {path}").format(path=self.filepath))
+        return {'FINISHED'}
 
 
 class FLASH_OT_setup_compositor(bpy.types.Operator):
     bl_idname = "flash_aov.setup_compositor"
     bl_label = translate("Configure Output")
     bl_description  = translate("Configure output for all view layers in the current scene")
-
-    def read_ui_parameters(self, context):
-        flash_aov = context.scene.flash_aov
-        self.rgb_node_color = flash_aov.rgb.node_color
-        self.rgb_format = flash_aov.rgb.format
-        self.rgb_color_mode = flash_aov.rgb.color_mode
-        self.rgb_exr_color_depth = flash_aov.rgb.exr_color_depth
-        self.rgb_exr_codec = flash_aov.rgb.exr_codec
-        self.rgb_png_color_depth = flash_aov.rgb.png_color_depth
-        self.rgb_png_compression = flash_aov.rgb.png_compression
-        self.rgb_jpg_color_mode = flash_aov.rgb.jpg_color_mode
-        self.rgb_jpg_quality = flash_aov.rgb.jpg_quality
-
-        self.data_node_color = flash_aov.data.node_color
-        self.data_format = flash_aov.data.format
-        self.data_color_mode = flash_aov.data.color_mode
-        self.data_exr_color_depth = flash_aov.data.exr_color_depth
-        self.data_exr_codec = flash_aov.data.exr_codec
-        self.data_png_color_depth = flash_aov.data.png_color_depth
-        self.data_png_compression = flash_aov.data.png_compression
-        self.data_jpg_color_mode = flash_aov.data.jpg_color_mode
-        self.data_jpg_quality = flash_aov.data.jpg_quality
-
-    def set_output_node_parameters(self, viewlayer_outfile_nodes):
-        for view_layer_name, nodes in viewlayer_outfile_nodes.items():
-            for node_type, node in nodes.items():
-                node.use_custom_color = True
-                if node_type in ['rgb', 'lightgroup']:
-                    node.color = [ch**(1/2) for ch in self.rgb_node_color]
-                    if self.rgb_format == 'OPEN_EXR_MULTILAYER' or self.rgb_format == 'OPEN_EXR':
-                        if self.rgb_format == 'OPEN_EXR':
-                            node.format.color_mode = self.rgb_color_mode
-                        node.format.file_format = self.rgb_format
-                        node.format.color_depth = self.rgb_exr_color_depth
-                        node.format.exr_codec = self.rgb_exr_codec
-                    elif self.rgb_format == 'PNG':
-                        node.format.file_format = self.rgb_format
-                        node.format.color_mode = self.rgb_color_mode
-                        node.format.color_depth = self.rgb_png_color_depth
-                        node.format.compression = self.rgb_png_compression
-                    elif self.rgb_format == 'JPEG':
-                        node.format.file_format = self.rgb_format
-                        node.format.color_mode = self.rgb_jpg_color_mode
-                        node.format.quality = self.rgb_jpg_quality
-
-                else:
-                    node.color = [ch**(1/2) for ch in self.data_node_color]
-                    if self.data_format == 'OPEN_EXR_MULTILAYER' or self.data_format == 'OPEN_EXR':
-                        if self.data_format == 'OPEN_EXR':
-                            node.format.color_mode = self.data_color_mode
-                        node.format.file_format = self.data_format
-                        node.format.color_depth = self.data_exr_color_depth
-                        node.format.exr_codec = self.data_exr_codec
-                    elif self.data_format == 'PNG':
-                        node.format.file_format = self.data_format
-                        node.format.color_mode = self.rgb_color_mode
-                        node.format.color_depth = self.data_png_color_depth
-                        node.format.compression = self.data_png_compression
-                    elif self.data_format == 'JPEG':
-                        node.format.file_format = self.data_format
-                        node.format.color_mode = self.data_jpg_color_mode
-                        node.format.quality = self.rgb_jpg_quality
+    # 节点与路径的全部修改记为一个撤销步骤
+    bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
-        flash_aov = context.scene.flash_aov
-
-        compositor = BlenderCompositor(
-            separate_data=flash_aov.separate_data,
-            separate_cryptomatte=flash_aov.separate_cryptomatte,
-            separate_shaderaov=flash_aov.separate_shaderaov,
-            separate_lightgroup=flash_aov.separate_lightgroup,
-        )
-        compositor.enable_denoise = flash_aov.enable_denoise
-        compositor.axis_correct = flash_aov.axis_correct
-        viewlayer_outfile_nodes = compositor.setup_compositor_nodes()
-        self.read_ui_parameters(context)
-        self.set_output_node_parameters(viewlayer_outfile_nodes)
-        
-        paths_dict = resolve_output_path(context.scene, viewlayer_outfile_nodes)
-        viewlayer_outfile_nodes = compositor.get_output_nodes_by_name()
-        if not flash_aov.path_protection:
-            assign_paths_to_nodes(viewlayer_outfile_nodes, paths_dict)
-        self.report({'INFO'}, translate( "Rendering node configuration completed!"))
+        with profiler.profiling(translate("Configure Output")):
+            compositor, paths_dict = configure_scene(context.scene)
+        for warning in compositor.warnings:
+            self.report({'WARNING'}, warning)
+        if compositor.enable_denoise:
+            denoise = compositor.denoise_report()
+            self.report({'INFO'}, translate("{count} denoise passes per frame, {total} for the shot").format(
+                count=denoise['per_frame'], total=denoise['per_shot']))
+        self.report({'INFO'}, translate("Rendering node configuration completed! {count} changes applied").format(
+            count=compositor.op_count))
         
         
         return {'FINISHED'}
 
 
+# 正在分步执行的模态配置操作符
+_running_modal_ops = []
+
+
+def _abort_modal_ops(*args):
+    """undo_pre/load_pre 回调：撤销或加载文件会使节点引用失效，标记正在执行的模态配置中止"""
+    for op in _running_modal_ops:
+        op.aborted = True
+
+
+class FLASH_OT_setup_compositor_modal(bpy.types.Operator):
+    bl_idname = "flash_aov.setup_compositor_modal"
+    bl_label = translate("Configure Output (Background)")
+    bl_description = translate("Configure the view layers in small batches with a progress bar, press Esc to cancel")
+    bl_options = {'REGISTER', 'UNDO'}
+
+    # 每次计时器触发时最多占用的时长（秒），之后把控制权交还界面
+    time_budget = 0.1
+
+    def execute(self, context):
+        # 非交互调用（EXEC_DEFAULT）时一次完成全部视图层
+        self.compositor = create_compositor(context.scene)
+        self.total = len(context.scene.view_layers)
+        viewlayer_outfile_nodes = run_steps(self.compositor.setup_compositor_steps())
+        return self.report_result(context, viewlayer_outfile_nodes)
+
+    def invoke(self, context, event):
+        self.compositor = create_compositor(context.scene)
+        self.steps = self.compositor.setup_compositor_steps()
+        self.done = 0
+        self.total = len(context.scene.view_layers)
+        self.start = time.perf_counter()
+        # 撤销或加载文件后节点引用全部失效，由回调标记中止
+        self.aborted = False
+        _running_modal_ops.append(self)
+        for handlers in (bpy.app.handlers.undo_pre, bpy.app.handlers.load_pre):
+            if _abort_modal_ops not in handlers:
+                handlers.append(_abort_modal_ops)
+
+        wm = context.window_manager
+        wm.progress_begin(0, self.total)
+        self._timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        self.set_status(context)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if self.aborted:
+            # 不再访问任何节点，已完成的视图层保持原状
+            self.cleanup(context)
+            self.report({'WARNING'}, translate("Stopped after {done} of {total} view layers: the file was changed by undo or load").format(
+                done=self.done, total=self.total))
+            return {'CANCELLED'}
+        if event.type == 'ESC':
+            # 完成当前视图层后停止，已配置的视图层保持完整
+            self.compositor.cancelled = True
+        elif event.type != 'TIMER':
+            # 运行期间不允许撤销，节点引用会失效
+            if event.type == 'Z' and (event.ctrl or event.oskey):
+                return {'RUNNING_MODAL'}
+            return {'PASS_THROUGH'}
+
+        # 两次计时器之间用户可能增删了节点，按节点树现状重建索引
+        self.compositor.refresh_indexes()
+        # 每次至少完成一个视图层
+        deadline = time.perf_counter() + self.time_budget
+        try:
+            while True:
+                self.done, self.total = next(self.steps)
+                if time.perf_counter() >= deadline:
+                    break
+        except StopIteration as stop:
+            return self.finish(context, stop.value)
+        except Exception:
+            self.cleanup(context)
+            raise
+
+        context.window_manager.progress_update(self.done)
+        self.set_status(context)
+        return {'RUNNING_MODAL'}
+
+    def set_status(self, context):
+        context.workspace.status_text_set(
+            translate("Flash AOV: configuring view layer {done}/{total} (Esc to cancel)").format(
+                done=self.done, total=self.total))
+
+    def cleanup(self, context):
+        if self in _running_modal_ops:
+            _running_modal_ops.remove(self)
+        if not _running_modal_ops:
+            for handlers in (bpy.app.handlers.undo_pre, bpy.app.handlers.load_pre):
+                if _abort_modal_ops in handlers:
+                    handlers.remove(_abort_modal_ops)
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+
+    def cancel(self, context):
+        # 窗口关闭或加载文件时由 Blender 调用
+        self.cleanup(context)
+
+    def finish(self, context, viewlayer_outfile_nodes):
+        self.cleanup(context)
+        self.compositor.refresh_indexes()
+        return self.report_result(context, viewlayer_outfile_nodes)
+
+    def report_result(self, context, viewlayer_outfile_nodes):
+        compositor = self.compositor
+        finish_configure(compositor, viewlayer_outfile_nodes)
+        for warning in compositor.warnings:
+            self.report({'WARNING'}, warning)
+        if compositor.cancelled and len(viewlayer_outfile_nodes) < self.total:
+            self.report({'WARNING'}, translate("Cancelled after {done} of {total} view layers, {count} changes applied").format(
+                done=len(viewlayer_outfile_nodes), total=self.total, count=compositor.op_count))
+        else:
+            self.report({'INFO'}, translate("Rendering node configuration completed! {count} changes applied").format(
+                count=compositor.op_count))
+        return {'FINISHED'}
+
+
+class FLASH_OT_setup_all_scenes(bpy.types.Operator):
+    bl_idname = "flash_aov.setup_all_scenes"
+    bl_label = translate("Configure All Scenes")
+    bl_description = translate("Configure output for all view layers in every scene of the file")
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        # 所有场景共用分类缓存与项目名称
+        plan_cache = PlanCache()
+        project_name = get_project_name()
+        total_count = 0
+        start = time.perf_counter()
+        with profiler.profiling(translate("Configure All Scenes")):
+            for scene in bpy.data.scenes:
+                scene_start = time.perf_counter()
+                with profiler.span(scene.name):
+                    compositor, paths_dict = configure_scene(scene, plan_cache, project_name)
+                total_count += compositor.op_count
+                for warning in compositor.warnings:
+                    self.report({'WARNING'}, f"{scene.name}: {warning}")
+                self.report({'INFO'}, translate("{scene}: {count} changes in {time:.2f}s").format(
+                    scene=scene.name, count=compositor.op_count, time=time.perf_counter() - scene_start))
+        self.report({'INFO'}, translate("Configured {scenes} scenes: {count} changes in {time:.2f}s").format(
+            scenes=len(bpy.data.scenes), count=total_count, time=time.perf_counter() - start))
+        return {'FINISHED'}
+
+
+# 输出估算中已展开节点列表的视图层（仅界面状态，不保存到文件）
+expanded_estimate_layers = set()
+
+
+class FLASH_OT_toggle_estimate_layer(bpy.types.Operator):
+    bl_idname = "flash_aov.toggle_estimate_layer"
+    bl_label = ""
+    bl_description = translate("Show or hide the output nodes of this view layer")
+    bl_options = {'INTERNAL'}
+
+    view_layer: bpy.props.StringProperty()# type: ignore
+
+    def execute(self, context):
+        expanded_estimate_layers.symmetric_difference_update({self.view_layer})
+        if context.area is not None:
+            context.area.tag_redraw()
+        return {'FINISHED'}
+
+
+class FLASH_OT_estimate_output(bpy.types.Operator):
+    bl_idname = "flash_aov.estimate_output"
+    bl_label = translate("Estimate Output Size")
+    bl_description = translate("Estimate the bytes written per frame by every Flash output node")
+
+    def execute(self, context):
+        report = estimate_scene_output(context.scene)
+        text = write_report_text(report, ESTIMATE_TEXT)
+        self.report({'INFO'}, translate("Output estimate: {frame} per frame, {shot} for the shot (see {text})").format(
+            frame=format_bytes(report['per_frame']), shot=format_bytes(report['per_shot']), text=text.name))
+        for warning in report['warnings']:
+            self.report({'WARNING'}, warning)
+        return {'FINISHED'}
+
+
+class FLASH_OT_teardown(bpy.types.Operator):
+    bl_idname = "flash_aov.teardown"
+    bl_label = translate("Remove Flash Nodes")
+    bl_description = translate("Remove every _Flash node from the compositor of the current scene")
+    bl_options = {'REGISTER', 'UNDO'}
+
+    keep_render_layers: bpy.props.BoolProperty(
+        name=translate("Keep Render Layers"),
+        description=translate("Keep the render layer nodes created by Flash AOV"),
+        default=False
+    )# type: ignore
+    restore_links: bpy.props.BoolProperty(
+        name=translate("Restore Links"),
+        description=translate("Link user nodes fed by removed denoise or axis nodes directly to the render layer"),
+        default=True
+    )# type: ignore
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        with profiler.profiling(translate("Remove Flash Nodes")):
+            report = teardown_scene(context.scene, self.keep_render_layers, self.restore_links)
+        self.report({'INFO'}, translate("Removed {count} nodes, restored {links} links in {time:.2f}s").format(
+            count=report['nodes_removed'], links=report['links_restored'], time=report['time']))
+        return {'FINISHED'}
+
+
+class FLASH_OT_export_trace(bpy.types.Operator, ExportHelper):
+    bl_idname = "flash_aov.export_trace"
+    bl_label = translate("Export Chrome Trace")
+    bl_description = translate("Export the timing of the last run as a Chrome trace JSON file")
+
+    filename_ext = ".json"
+    filter_glob: bpy.props.StringProperty(default="*.json", options={'HIDDEN'})# type: ignore
+
+    @classmethod
+    def poll(cls, context):
+        return profiler.last_profile is not None
+
+    def execute(self, context):
+        profiler.last_profile.export_chrome_trace(self.filepath)
+        self.report({'INFO'}, translate("Trace exported to {path}").format(path=self.filepath))
+        return {'FINISHED'}
+
+
 class FLASH_OT_refresh_version(bpy.types.Operator):
     bl_idname = "flash_aov.refresh_version"
     bl_label = translate("Refresh version variables")
     bl_description = ""
+    bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
         compositor = BlenderCompositor()
         viewlayer_outfile_nodes = compositor.get_output_nodes_by_name()
         paths_dict = resolve_output_path(context.scene, viewlayer_outfile_nodes)
-        assign_paths_to_nodes(viewlayer_outfile_nodes, paths_dict)
-        # print(viewlayer_outfile_nodes)
+        for warning in assign_paths_to_nodes(viewlayer_outfile_nodes, paths_dict):
+            self.report({'WARNING'}, warning)
         self.report({'INFO'}, "路径已刷新")
         return {'FINISHED'}
 
@@ -603,6 +1031,78 @@ class FLASH_PT_aov_panel(bpy.types.Panel):
     def poll(cls, context):
         return context.space_data.tree_type == 'CompositorNodeTree'
 
+    def draw_format(self, box, fmt, label, split_factor):
+        """绘制一个分类的节点颜色与输出格式设置"""
+        split = box.split(factor=split_factor)
+        row = split.row()
+        row.alignment = 'RIGHT'
+        row.label(text=translate("Node Color"))
+        split.prop(fmt, "node_color")
+        #format
+        split = box.split(factor=split_factor)
+        row = split.row()
+        row.alignment = 'RIGHT'
+        row.label(text=label)
+        split.prop(fmt, "format")
+        # OpenEXR MultiLayer
+        if fmt.format == 'OPEN_EXR_MULTILAYER' or fmt.format == 'OPEN_EXR':
+            if fmt.format == 'OPEN_EXR':
+                split = box.split(factor=split_factor)
+                row = split.row()
+                row.alignment = 'RIGHT'
+                row.label(text="Color")
+                row = split.row()
+                row.prop(fmt, "color_mode", toggle=True, expand=True, text=" ")
+
+            split = box.split(factor=split_factor)
+            row = split.row()
+            row.alignment = 'RIGHT'
+            row.label(text="Color Depth")
+            row = split.row()
+            row.prop(fmt, "exr_color_depth", toggle=True, expand=True, text=" ")
+            #codec
+            split = box.split(factor=split_factor)
+            row = split.row()
+            row.alignment = 'RIGHT'
+            row.label(text="Codec")
+            split.prop(fmt, "exr_codec")
+
+        elif fmt.format == 'PNG':
+            split = box.split(factor=split_factor)
+            row = split.row()
+            row.alignment = 'RIGHT'
+            row.label(text="Color")
+            row = split.row()
+            row.prop(fmt, "color_mode", toggle=True, expand=True, text=" ")
+
+            split = box.split(factor=split_factor)
+            row = split.row()
+            row.alignment = 'RIGHT'
+            row.label(text="Color Depth")
+            row = split.row()
+            row.prop(fmt, "png_color_depth", toggle=True, expand=True, text=" ")
+            #codec
+            split = box.split(factor=split_factor)
+            row = split.row()
+            row.alignment = 'RIGHT'
+            row.label(text="Compression")
+            split.prop(fmt, "png_compression")
+
+        elif fmt.format == 'JPEG':
+            split = box.split(factor=split_factor)
+            row = split.row()
+            row.alignment = 'RIGHT'
+            row.label(text="Color")
+            row = split.row()
+            row.prop(fmt, "jpg_color_mode", toggle=True, expand=True, text=" ")
+
+            #Quailty
+            split = box.split(factor=split_factor)
+            row = split.row()
+            row.alignment = 'RIGHT'
+            row.label(text="Quality")
+            split.prop(fmt, "jpg_quality")
+
     def draw(self, context):
         layout = self.layout
         props = context.scene.flash_aov
@@ -611,6 +1111,11 @@ class FLASH_PT_aov_panel(bpy.types.Panel):
         row = layout.row()
         row.scale_y = 1.6
         row.operator("flash_aov.setup_compositor", icon='NODE_SEL')
+        row.operator("flash_aov.preview_compositor", text="", icon='VIEWZOOM')
+        row.operator("flash_aov.export_dry_run", text="", icon='EXPORT')
+        row.operator("flash_aov.setup_compositor_modal", text="", icon='TIME')
+        row.operator("flash_aov.setup_all_scenes", text="", icon='SCENE_DATA')
+        row.operator("flash_aov.teardown", text="", icon='TRASH')
 
 
         box = layout.box()
@@ -655,159 +1160,74 @@ class FLASH_PT_aov_panel(bpy.types.Panel):
         box = layout.box()
         #rgb color
         box.separator()
-        # box = box.column(align=True)
-        split = box.split(factor=split_factor)
-        row = split.row()
-        row.alignment = 'RIGHT'
-        row.label(text=translate("Node Color"))
-        split.prop(props.rgb, "node_color")
-        #format
-        split = box.split(factor=split_factor)
-        row = split.row()
-        row.alignment = 'RIGHT'
-        row.label(text=translate("RGB Format"))
-        split.prop(props.rgb, "format")
-        # OpenEXR MultiLayer
-        if props.rgb.format == 'OPEN_EXR_MULTILAYER' or props.rgb.format == 'OPEN_EXR':
-            if props.rgb.format == 'OPEN_EXR':
+        self.draw_format(box, props.rgb, translate("RGB Format"), split_factor)
+        box.separator()
+
+        #data color
+        self.draw_format(box, props.data, translate("Data Format"), split_factor)
+
+        # 分离到独立节点的分类使用各自的格式
+        for category, label, base_label in [('cryptomatte', "Cryptomatte Format", "Same as Data Format"),
+                                            ('shaderaov', "Shader AOV Format", "Same as Data Format"),
+                                            ('lightgroup', "Light Group Format", "Same as RGB Format")]:
+            if getattr(props, f"separate_{category}"):
+                fmt = getattr(props, category)
+                box.separator()
                 split = box.split(factor=split_factor)
                 row = split.row()
                 row.alignment = 'RIGHT'
-                row.label(text="Color")
-                row = split.row()
-                row.prop(props.rgb, "color_mode", toggle=True, expand=True, text=" ")
-                
-            split = box.split(factor=split_factor)
-            row = split.row()
-            row.alignment = 'RIGHT'
-            row.label(text="Color Depth")
-            row = split.row()
-            row.prop(props.rgb, "exr_color_depth", toggle=True, expand=True, text=" ")
-            #codec
-            split = box.split(factor=split_factor)
-            row = split.row()
-            row.alignment = 'RIGHT'
-            row.label(text="Codec")
-            split.prop(props.rgb, "exr_codec")
-
-        elif props.rgb.format == 'PNG':
-            split = box.split(factor=split_factor)
-            row = split.row()
-            row.alignment = 'RIGHT'
-            row.label(text="Color")
-            row = split.row()
-            row.prop(props.rgb, "color_mode", toggle=True, expand=True, text=" ")
-            
-            split = box.split(factor=split_factor)
-            row = split.row()
-            row.alignment = 'RIGHT'
-            row.label(text="Color Depth")
-            row = split.row()
-            row.prop(props.rgb, "png_color_depth", toggle=True, expand=True, text=" ")
-            #codec
-            split = box.split(factor=split_factor)
-            row = split.row()
-            row.alignment = 'RIGHT'
-            row.label(text="Compression")
-            split.prop(props.rgb, "png_compression")
-            
-        elif props.rgb.format == 'JPEG':
-            split = box.split(factor=split_factor)
-            row = split.row()
-            row.alignment = 'RIGHT'
-            row.label(text="Color")
-            row = split.row()
-            row.prop(props.rgb, "jpg_color_mode", toggle=True, expand=True, text=" ")
-            
-            #Quailty
-            split = box.split(factor=split_factor)
-            row = split.row()
-            row.alignment = 'RIGHT'
-            row.label(text="Quality")
-            split.prop(props.rgb, "jpg_quality")
-            
+                row.label(text=translate(label))
+                split.prop(fmt, "use_base_format", text=translate(base_label))
+                if not fmt.use_base_format:
+                    self.draw_format(box, fmt, translate(label), split_factor)
+                if category == 'cryptomatte':
+                    split = box.split(factor=split_factor)
+                    split.row()
+                    split.label(text=translate("Always written lossless in full float"), icon='INFO')
         box.separator()
-
-        #data color
         split = box.split(factor=split_factor)
         row = split.row()
-        row.alignment = 'RIGHT'
-        row.label(text=translate("Node Color"))
-        split.prop(props.data, "node_color")
-        #format
-        split = box.split(factor=split_factor)
-        row = split.row()
-        row.alignment = 'RIGHT'
-        row.label(text=translate("Data Format"))
-        split.prop(props.data, "format")
-        # OpenEXR MultiLayer
-        if props.data.format == 'OPEN_EXR_MULTILAYER' or props.data.format == 'OPEN_EXR':
-            if props.data.format == 'OPEN_EXR':
+        split.prop(props, "enable_denoise")
+        if props.enable_denoise:
+            # 降噪策略：按分类启用并设置预过滤/质量
+            for label, category in [("Denoise RGB", props.denoise_rgb),
+                                    ("Denoise Light Groups", props.denoise_lightgroup)]:
                 split = box.split(factor=split_factor)
                 row = split.row()
                 row.alignment = 'RIGHT'
-                row.label(text="Color")
-                row = split.row()
-                row.prop(props.data, "color_mode", toggle=True, expand=True, text=" ")
-                
-            split = box.split(factor=split_factor)
-            row = split.row()
-            row.alignment = 'RIGHT'
-            row.label(text="Color Depth")
-            row = split.row()
-            row.prop(props.data, "exr_color_depth", toggle=True, expand=True, text=" ")
-            #codec
-            split = box.split(factor=split_factor)
-            row = split.row()
-            row.alignment = 'RIGHT'
-            row.label(text="Codec")
-            split.prop(props.data, "exr_codec")
-
-            
-        elif props.data.format == 'PNG':
-            split = box.split(factor=split_factor)
-            row = split.row()
-            row.alignment = 'RIGHT'
-            row.label(text="Color")
-            row = split.row()
-            row.prop(props.data, "color_mode", toggle=True, expand=True, text=" ")
-            
+                row.label(text=translate(label))
+                row = split.row(align=True)
+                row.prop(category, "enabled", text="")
+                sub = row.row(align=True)
+                sub.enabled = category.enabled
+                sub.prop(category, "prefilter")
+                sub.prop(category, "quality")
             split = box.split(factor=split_factor)
             row = split.row()
             row.alignment = 'RIGHT'
-            row.label(text="Color Depth")
-            row = split.row()
-            row.prop(props.data, "png_color_depth", toggle=True, expand=True, text=" ")
-            #codec
-            split = box.split(factor=split_factor)
-            row = split.row()
-            row.alignment = 'RIGHT'
-            row.label(text="Compression")
-            split.prop(props.data, "png_compression")
-            
-        elif props.data.format == 'JPEG':
-            split = box.split(factor=split_factor)
-            row = split.row()
-            row.alignment = 'RIGHT'
-            row.label(text="Color")
-            row = split.row()
-            row.prop(props.data, "jpg_color_mode", toggle=True, expand=True, text=" ")
-            
-            #Quailty
+            row.label(text=translate("Exclude Passes"))
+            split.prop(props, "denoise_exclude", text="")
+        split = box.split(factor=split_factor)
+        row = split.row()
+        split.prop(props, "axis_correct")
+        split = box.split(factor=split_factor)
+        row = split.row()
+        split.prop(props, "precision_policy")
+        if props.precision_policy:
             split = box.split(factor=split_factor)
             row = split.row()
             row.alignment = 'RIGHT'
-            row.label(text="Quality")
-            split.prop(props.data, "jpg_quality")
-        
-
-        box.separator()
-        split = box.split(factor=split_factor)
-        row = split.row()
-        split.prop(props, "enable_denoise")
+            row.label(text=translate("Precision Overrides"))
+            split.prop(props, "precision_overrides", text="")
         split = box.split(factor=split_factor)
         row = split.row()
-        split.prop(props, "axis_correct")
+        split.prop(props, "shard_outputs")
+        if props.shard_outputs:
+            split = box.split(factor=split_factor)
+            row = split.row()
+            row = split.row(align=True)
+            row.prop(props, "shard_max_channels")
+            row.prop(props, "shard_max_size")
         split = box.split(factor=split_factor)
         row = split.row()
         split.prop(props, "separate_data")
@@ -820,13 +1240,85 @@ class FLASH_PT_aov_panel(bpy.types.Panel):
         split = box.split(factor=split_factor)
         row = split.row()
         split.prop(props, "separate_lightgroup")
+        split = box.split(factor=split_factor)
+        row = split.row()
+        split.prop(props, "incremental_update")
+        split = box.split(factor=split_factor)
+        row = split.row()
+        split.prop(props, "column_height")
+
+        # 输出带宽与磁盘占用估算
+        estimate = OutputConfig.last_estimates.get(context.scene.name)
+        box = layout.box()
+        row = box.row()
+        row.label(text=translate("Output Estimate"), icon='DISK_DRIVE')
+        row.operator("flash_aov.estimate_output", text="", icon='FILE_REFRESH')
+        if estimate is not None:
+            nodes_by_layer = {}
+            for entry in estimate['nodes']:
+                nodes_by_layer.setdefault(entry['view_layer'], []).append(entry)
+            for view_layer_name, size in list(estimate['view_layers'].items())[:8]:
+                # 每个视图层一个可折叠的子框，展开后列出各输出节点
+                expanded = view_layer_name in expanded_estimate_layers
+                sub = box.box() if expanded else box
+                row = sub.row()
+                op = row.operator("flash_aov.toggle_estimate_layer", text=view_layer_name, emboss=False,
+                                  icon='TRIA_DOWN' if expanded else 'TRIA_RIGHT')
+                op.view_layer = view_layer_name
+                row.label(text=format_bytes(size))
+                if expanded:
+                    col = sub.column(align=True)
+                    for entry in nodes_by_layer.get(view_layer_name, []):
+                        row = col.row()
+                        row.label(text=f"{entry['category']} ({entry['channels']} ch)", icon='OUTPUT')
+                        row.label(text=format_bytes(entry['bytes']))
+            col = box.column(align=True)
+            row = col.row()
+            row.label(text=translate("Per Frame"))
+            row.label(text=format_bytes(estimate['per_frame']))
+            row = col.row()
+            row.label(text=translate("Per Shot ({frames} frames)").format(frames=estimate['frames']))
+            row.label(text=format_bytes(estimate['per_shot']))
+            for warning in estimate['warnings'][:3]:
+                box.label(text=warning, icon='ERROR')
+
+        # 上次运行的耗时统计
+        profile = profiler.last_profile
+        if profile is not None:
+            box = layout.box()
+            row = box.row()
+            row.label(text=f"{translate('Last Run')}: {profile.name}", icon='TIME')
+            row.operator("flash_aov.export_trace", text="", icon='EXPORT')
+            col = box.column(align=True)
+            for name, seconds, calls in profile.summary(limit=8):
+                row = col.row()
+                row.label(text=name)
+                row.label(text=f"{seconds * 1000:.1f} ms  ×{calls}")
+            if profile.counters:
+                col = box.column(align=True)
+                for key, value in profile.counters.items():
+                    row = col.row()
+                    row.label(text=key)
+                    row.label(text=str(value))
 
 
 classes = [
     RGBFormatProperties,
     DataFormatProperties,
+    CryptomatteFormatProperties,
+    ShaderAOVFormatProperties,
+    LightGroupFormatProperties,
+    DenoiseCategoryProperties,
     FlashAOVProperties,
+    FLASH_OT_preview_compositor,
+    FLASH_OT_export_dry_run,
     FLASH_OT_setup_compositor,
+    FLASH_OT_setup_compositor_modal,
+    FLASH_OT_setup_all_scenes,
+    FLASH_OT_toggle_estimate_layer,
+    FLASH_OT_estimate_output,
+    FLASH_OT_teardown,
+    FLASH_OT_export_trace,
     FLASH_OT_refresh_version,
     FLASH_PT_aov_panel,
     MY_OT_ChoosePathVariable,
@@ -0,0 +1,20 @@
+"""pytest 共用夹具：用 bpy 替身导入插件，每个测试使用新场景"""
+import pytest
+
+import fake_bpy
+
+# 插件根目录是一个包，pytest 会导入其 __init__（依赖 bpy），收集测试前先注册替身
+fake_bpy.install()
+
+
+@pytest.fixture(scope='session')
+def addon():
+    package = fake_bpy.load_addon(modules=('CompositorPlan', 'CompositorOutfileSet', 'OutputConfig',
+                                           'main', 'headless'))
+    package.main.register()
+    return package
+
+
+@pytest.fixture
+def scene(addon):
+    return fake_bpy.new_scene('Test')
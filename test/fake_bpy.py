@@ -0,0 +1,973 @@
+"""
+bpy 的内存替身
+只实现插件用到的接口：场景、视图层（通道开关、Shader AOV、灯光组）、
+合成节点树的 nodes/links、输出文件节点的 file_slots/layer_slots、
+带 identifier 的渲染层端口，以及属性组注册。
+不需要 Blender 即可在普通 Python 中运行合成逻辑、基准测试与性能分析：
+
+    import fake_bpy
+    bpy = fake_bpy.install()
+    addon = fake_bpy.load_addon()        # 以包的形式导入插件模块（不执行 __init__ 注册）
+    addon.main.register()
+
+    python test/fake_bpy.py --layers 1,10,100     # 用替身运行 benchmark.py
+    python -m pytest                              # 运行 test/ 中基于替身的测试
+"""
+import importlib
+import os
+import sys
+import types
+
+# 视图层/通道发生变化时递增，渲染层节点据此重建端口
+_revision = [0]
+
+
+def _touch():
+    _revision[0] += 1
+
+
+class Vec:
+    def __init__(self, xy=(0.0, 0.0)):
+        self.x, self.y = float(xy[0]), float(xy[1])
+
+    def __getitem__(self, i):
+        return (self.x, self.y)[i]
+
+    def __iter__(self):
+        return iter((self.x, self.y))
+
+    def __len__(self):
+        return 2
+
+    def __eq__(self, other):
+        return tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return f"Vec({self.x}, {self.y})"
+
+
+class Collection:
+    """bpy_prop_collection：支持按序号与名称访问"""
+    def __init__(self, items=None):
+        self._items = list(items or [])
+
+    def __iter__(self):
+        return iter(list(self._items))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            item = self.get(key)
+            if item is None:
+                raise KeyError(key)
+            return item
+        return self._items[key]
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        for item in self._items:
+            if item.name == key:
+                return item
+        return default
+
+    def keys(self):
+        return [item.name for item in self._items]
+
+    def values(self):
+        return list(self._items)
+
+    def items(self):
+        return [(item.name, item) for item in self._items]
+
+    def find(self, key):
+        for i, item in enumerate(self._items):
+            if item.name == key:
+                return i
+        return -1
+
+
+class IDProps(dict):
+    """自定义属性（如 view_layer.cycles），写入时标记通道变化"""
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        _touch()
+
+
+"""
+属性注册
+bpy.props.* 返回 Prop；注册到 Scene 等类型上后作为描述符按需创建默认值，
+PropertyGroup 按类注解生成实例
+"""
+class Prop:
+    def __init__(self, kind, kwargs):
+        self.kind = kind
+        self.kwargs = kwargs
+
+    def default(self):
+        kw = self.kwargs
+        if self.kind == 'PointerProperty':
+            return make_property_group(kw['type'])
+        if self.kind == 'CollectionProperty':
+            return PropertyCollection(kw['type'])
+        if 'default' in kw:
+            return kw['default']
+        if self.kind == 'EnumProperty':
+            items = kw.get('items')
+            return items[0][0] if items and not callable(items) else ''
+        if self.kind == 'FloatVectorProperty':
+            return (0.0,) * kw.get('size', 3)
+        return {'BoolProperty': False, 'IntProperty': 0, 'FloatProperty': 0.0,
+                'StringProperty': ''}.get(self.kind)
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        values = obj.__dict__.setdefault('_rna', {})
+        if id(self) not in values:
+            values[id(self)] = self.default()
+        return values[id(self)]
+
+    def __set__(self, obj, value):
+        obj.__dict__.setdefault('_rna', {})[id(self)] = value
+
+
+def make_property_group(cls):
+    group = cls.__new__(cls)
+    for klass in reversed(cls.__mro__):
+        for name, annotation in getattr(klass, '__annotations__', {}).items():
+            if isinstance(annotation, Prop):
+                object.__setattr__(group, name, annotation.default())
+    return group
+
+
+class PropertyCollection(Collection):
+    def __init__(self, group_type):
+        super().__init__()
+        self.group_type = group_type
+
+    def add(self):
+        item = make_property_group(self.group_type)
+        self._items.append(item)
+        return item
+
+    def remove(self, index):
+        del self._items[index]
+
+    def clear(self):
+        self._items.clear()
+
+
+"""
+节点树
+"""
+class Socket:
+    def __init__(self, node, name, identifier=None, type='RGBA', is_output=False, enabled=True):
+        self.node = node
+        self.name = name
+        self.identifier = identifier or name
+        self.type = type
+        self.is_output = is_output
+        self.enabled = enabled
+        self.hide = False
+
+    @property
+    def links(self):
+        return self.node.id_data.links.links_of(self)
+
+    @property
+    def is_linked(self):
+        return bool(self.links)
+
+    def as_pointer(self):
+        return id(self)
+
+
+class Link:
+    def __init__(self, from_socket, to_socket):
+        self.from_socket = from_socket
+        self.to_socket = to_socket
+        self.from_node = from_socket.node
+        self.to_node = to_socket.node
+        self.is_valid = True
+
+
+class Links:
+    """按端口建立索引，增删连接为 O(1)"""
+    def __init__(self, tree):
+        self.tree = tree
+        self._links = {}    # id(link) -> link，保持创建顺序
+        self._to = {}       # id(输入端口) -> link
+        self._from = {}     # id(输出端口) -> {id(link): link}
+
+    @property
+    def _items(self):
+        return list(self._links.values())
+
+    def __iter__(self):
+        return iter(list(self._links.values()))
+
+    def __len__(self):
+        return len(self._links)
+
+    def __getitem__(self, i):
+        return list(self._links.values())[i]
+
+    def new(self, from_socket, to_socket):
+        # 输入端口只能有一个连接，新连接替换旧连接
+        old = self._to.get(id(to_socket))
+        if old is not None:
+            self.remove(old)
+        link = Link(from_socket, to_socket)
+        self._links[id(link)] = link
+        self._to[id(to_socket)] = link
+        self._from.setdefault(id(from_socket), {})[id(link)] = link
+        return link
+
+    def remove(self, link):
+        if self._links.pop(id(link), None) is None:
+            return
+        if self._to.get(id(link.to_socket)) is link:
+            del self._to[id(link.to_socket)]
+        self._from.get(id(link.from_socket), {}).pop(id(link), None)
+        link.is_valid = False
+
+    def clear(self):
+        for link in list(self._links.values()):
+            self.remove(link)
+
+    def links_of(self, socket):
+        if socket.is_output:
+            return list(self._from.get(id(socket), {}).values())
+        link = self._to.get(id(socket))
+        return [link] if link is not None else []
+
+
+class ImageFormat:
+    def __init__(self):
+        self.file_format = 'OPEN_EXR_MULTILAYER'
+        self.color_depth = '16'
+        self.exr_codec = 'ZIP'
+        self.color_mode = 'RGBA'
+        self.compression = 15
+        self.quality = 90
+
+
+class Node:
+    type = 'CUSTOM'
+    _inputs = ()
+    _outputs = ()
+
+    def __init__(self, tree, bl_idname):
+        object.__setattr__(self, 'id_data', tree)
+        object.__setattr__(self, 'name', '')
+        self.bl_idname = bl_idname
+        self.label = ''
+        self.location = Vec()
+        self.width = 140.0
+        self.hide = False
+        self.use_custom_color = False
+        self.color = (0.6, 0.6, 0.6)
+        self.mute = False
+        self._props = {}
+        self.inputs = Collection([Socket(self, n, type=t) for n, t in self._inputs])
+        self.outputs = Collection([Socket(self, n, type=t, is_output=True) for n, t in self._outputs])
+
+    @property
+    def dimensions(self):
+        # 近似 Blender 绘制后的像素尺寸：标题 + 每个可见端口一行
+        n = sum(1 for s in self.inputs if s.enabled) + sum(1 for s in self.outputs if s.enabled)
+        return Vec((self.width, 30 if self.hide else 60 + 22 * n))
+
+    def __getitem__(self, key):
+        return self._props[key]
+
+    def __setitem__(self, key, value):
+        self._props[key] = value
+
+    def get(self, key, default=None):
+        return self._props.get(key, default)
+
+    def __contains__(self, key):
+        return key in self._props
+
+    def __delitem__(self, key):
+        del self._props[key]
+
+    def as_pointer(self):
+        return id(self)
+
+    def __setattr__(self, key, value):
+        if key == 'location':
+            value = Vec(value)
+        elif key == 'name':
+            # 与 Blender 一致：重名时自动添加 .001 后缀
+            value = self.id_data.nodes._rename(self, value)
+        object.__setattr__(self, key, value)
+
+
+class CompositorNodeDenoise(Node):
+    type = 'DENOISE'
+    _inputs = (('Image', 'RGBA'), ('Normal', 'VECTOR'), ('Albedo', 'RGBA'))
+    _outputs = (('Image', 'RGBA'),)
+
+    def __init__(self, tree, bl_idname):
+        super().__init__(tree, bl_idname)
+        self.prefilter = 'ACCURATE'
+        self.quality = 'FOLLOW_SCENE'
+        self.use_hdr = True
+
+
+class CompositorNodeSeparateXYZ(Node):
+    type = 'SEPARATE_XYZ'
+    _inputs = (('Vector', 'VECTOR'),)
+    _outputs = (('X', 'VALUE'), ('Y', 'VALUE'), ('Z', 'VALUE'))
+
+
+class CompositorNodeCombineXYZ(Node):
+    type = 'COMBINE_XYZ'
+    _inputs = (('X', 'VALUE'), ('Y', 'VALUE'), ('Z', 'VALUE'))
+    _outputs = (('Vector', 'VECTOR'),)
+
+
+class CompositorNodeComposite(Node):
+    type = 'COMPOSITE'
+    _inputs = (('Image', 'RGBA'), ('Alpha', 'VALUE'))
+
+
+class CompositorNodeViewer(Node):
+    type = 'VIEWER'
+    _inputs = (('Image', 'RGBA'), ('Alpha', 'VALUE'))
+
+
+class FileSlot:
+    """file_slots（path）与 layer_slots（name）共用输入端口名称"""
+    def __init__(self, socket):
+        self._socket = socket
+        self.use_node_format = True
+        self.format = ImageFormat()
+
+    @property
+    def path(self):
+        return self._socket.name
+
+    @path.setter
+    def path(self, value):
+        self._socket.name = value
+        self._socket.identifier = value
+
+    @property
+    def name(self):
+        return self._socket.name
+
+    @name.setter
+    def name(self, value):
+        self.path = value
+
+
+class FileSlots:
+    def __init__(self, node):
+        self.node = node
+
+    def new(self, name):
+        socket = Socket(self.node, name, type='RGBA')
+        socket._slot = FileSlot(socket)
+        self.node.inputs._items.append(socket)
+        return socket
+
+    def remove(self, socket):
+        links = self.node.id_data.links
+        for link in socket.links:
+            links.remove(link)
+        self.node.inputs._items.remove(socket)
+
+    def clear(self):
+        for socket in list(self.node.inputs._items):
+            self.remove(socket)
+
+    def _slots(self):
+        return [socket._slot for socket in self.node.inputs._items]
+
+    def __iter__(self):
+        return iter(self._slots())
+
+    def __len__(self):
+        return len(self.node.inputs._items)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.node.inputs[key]._slot
+        return self._slots()[key]
+
+    def keys(self):
+        return [socket.name for socket in self.node.inputs._items]
+
+    def get(self, key, default=None):
+        socket = self.node.inputs.get(key)
+        return socket._slot if socket else default
+
+
+class CompositorNodeOutputFile(Node):
+    type = 'OUTPUT_FILE'
+
+    def __init__(self, tree, bl_idname):
+        super().__init__(tree, bl_idname)
+        self.base_path = '/tmp/'
+        # 与 Blender 一致：新建节点的格式复制自当前场景的输出设置
+        self.format = ImageFormat()
+        self.format.__dict__.update(sys.modules['bpy'].context.scene.render.image_settings.__dict__)
+        self.active_input_index = 0
+        self.file_slots = FileSlots(self)
+        self.layer_slots = self.file_slots
+        # 与 Blender 一致：新建节点带一个 Image 插槽
+        self.file_slots.new('Image')
+
+
+# 渲染层端口 (identifier, name, type)，顺序与 Blender 一致
+RENDER_PASSES = [
+    ('Image', 'Image', 'RGBA'), ('Alpha', 'Alpha', 'VALUE'), ('Depth', 'Depth', 'VALUE'),
+    ('Mist', 'Mist', 'VALUE'), ('Position', 'Position', 'VECTOR'), ('Normal', 'Normal', 'VECTOR'),
+    ('Vector', 'Vector', 'VECTOR'), ('UV', 'UV', 'VECTOR'), ('IndexOB', 'IndexOB', 'VALUE'),
+    ('IndexMA', 'IndexMA', 'VALUE'), ('DiffDir', 'DiffDir', 'RGBA'), ('DiffInd', 'DiffInd', 'RGBA'),
+    ('DiffCol', 'DiffCol', 'RGBA'), ('GlossDir', 'GlossDir', 'RGBA'), ('GlossInd', 'GlossInd', 'RGBA'),
+    ('GlossCol', 'GlossCol', 'RGBA'), ('TransDir', 'TransDir', 'RGBA'), ('TransInd', 'TransInd', 'RGBA'),
+    ('TransCol', 'TransCol', 'RGBA'), ('VolumeDir', 'VolumeDir', 'RGBA'), ('VolumeInd', 'VolumeInd', 'RGBA'),
+    ('Emit', 'Emit', 'RGBA'), ('Env', 'Env', 'RGBA'), ('AO', 'AO', 'RGBA'),
+    ('Shadow Catcher', 'Shadow Catcher', 'RGBA'),
+    ('Denoising Normal', 'Denoising Normal', 'VECTOR'), ('Denoising Albedo', 'Denoising Albedo', 'RGBA'),
+    ('Denoising Depth', 'Denoising Depth', 'VALUE'),
+] + [(f"Crypto{kind}{i:02d}", f"Crypto{kind}{i:02d}", 'RGBA')
+     for kind in ('Object', 'Material', 'Asset') for i in range(3)]
+DENOISING_PASSES = {'Denoising Normal', 'Denoising Albedo', 'Denoising Depth'}
+CRYPTO_PREFIXES = {'object': 'CryptoObject', 'material': 'CryptoMaterial', 'asset': 'CryptoAsset'}
+
+
+class CompositorNodeRLayers(Node):
+    type = 'R_LAYERS'
+
+    def __init__(self, tree, bl_idname):
+        super().__init__(tree, bl_idname)
+        # 与 Blender 一致：新建节点绑定当前上下文场景，而不是节点树所属的场景
+        self.scene = sys.modules['bpy'].context.scene
+        self._layer = None
+        self._outputs_key = None
+        self._outs = Collection()
+
+    @property
+    def layer(self):
+        view_layers = self.scene.view_layers._items
+        if self._layer in view_layers:
+            return self._layer.name
+        # 视图层被删除后回退到第一个视图层
+        return view_layers[0].name if view_layers else ''
+
+    @layer.setter
+    def layer(self, name):
+        view_layer = self.scene.view_layers.get(name)
+        if view_layer is None:
+            raise TypeError(f"bpy_struct: item.attr = val: enum \"{name}\" not found in ()")
+        self._layer = view_layer
+
+    @property
+    def outputs(self):
+        key = (_revision[0], id(self._layer))
+        if key != self._outputs_key:
+            self._outputs_key = key
+            self._build_outputs()
+        return self._outs
+
+    @outputs.setter
+    def outputs(self, value):
+        pass
+
+    def _build_outputs(self):
+        # 保留已有端口对象，连接不会因重建而失效
+        view_layer = self._layer if self._layer in self.scene.view_layers._items else None
+        old = {socket.identifier: socket for socket in self._outs._items}
+        outputs = []
+        for identifier, name, socket_type in RENDER_PASSES:
+            socket = old.get(identifier) or Socket(self, name, identifier, socket_type, is_output=True)
+            socket.enabled = bool(view_layer) and view_layer.pass_enabled(identifier)
+            outputs.append(socket)
+        if view_layer:
+            for aov in view_layer.aovs:
+                socket_type = 'RGBA' if aov.type == 'COLOR' else 'VALUE'
+                socket = old.get(aov.name) or Socket(self, aov.name, aov.name, socket_type, is_output=True)
+                socket.enabled = True
+                outputs.append(socket)
+            for lightgroup in view_layer.lightgroups:
+                identifier = 'Combined_' + lightgroup.name
+                socket = old.get(identifier) or Socket(self, identifier, identifier, 'RGBA', is_output=True)
+                socket.enabled = True
+                outputs.append(socket)
+        self._outs = Collection(outputs)
+
+
+# NodeSocketVector 等接口端口类型 -> 节点端口类型
+INTERFACE_SOCKET_TYPES = {'NodeSocketVector': 'VECTOR', 'NodeSocketFloat': 'VALUE',
+                          'NodeSocketColor': 'RGBA'}
+
+
+class NodeGroupInput(Node):
+    type = 'GROUP_INPUT'
+
+    def __init__(self, tree, bl_idname):
+        super().__init__(tree, bl_idname)
+        self.outputs = Collection([Socket(self, item.name, type=item.type, is_output=True)
+                                   for item in tree.interface.sockets('INPUT')])
+
+
+class NodeGroupOutput(Node):
+    type = 'GROUP_OUTPUT'
+
+    def __init__(self, tree, bl_idname):
+        super().__init__(tree, bl_idname)
+        self.inputs = Collection([Socket(self, item.name, type=item.type)
+                                  for item in tree.interface.sockets('OUTPUT')])
+
+
+class CompositorNodeGroup(Node):
+    type = 'GROUP'
+
+    def __init__(self, tree, bl_idname):
+        super().__init__(tree, bl_idname)
+        object.__setattr__(self, '_node_tree', None)
+
+    @property
+    def node_tree(self):
+        return self._node_tree
+
+    @node_tree.setter
+    def node_tree(self, group):
+        # 与 Blender 一致：指定节点组后按接口重建端口
+        object.__setattr__(self, '_node_tree', group)
+        links = self.id_data.links
+        for socket in list(self.inputs._items) + list(self.outputs._items):
+            for link in socket.links:
+                links.remove(link)
+        sockets = group.interface.sockets if group else (lambda in_out: [])
+        self.inputs = Collection([Socket(self, item.name, type=item.type)
+                                  for item in sockets('INPUT')])
+        self.outputs = Collection([Socket(self, item.name, type=item.type, is_output=True)
+                                   for item in sockets('OUTPUT')])
+
+
+NODE_CLASSES = {cls.__name__: cls for cls in (
+    CompositorNodeDenoise, CompositorNodeSeparateXYZ, CompositorNodeCombineXYZ,
+    CompositorNodeComposite, CompositorNodeViewer, CompositorNodeOutputFile,
+    CompositorNodeRLayers, NodeGroupInput, NodeGroupOutput, CompositorNodeGroup)}
+
+
+class Nodes(Collection):
+    """按名称建立索引，get/新建/删除为 O(1)"""
+    def __init__(self, tree):
+        super().__init__()
+        self.tree = tree
+        self.active = None
+        self._by_name = {}
+
+    def new(self, bl_idname):
+        node = NODE_CLASSES[bl_idname](self.tree, bl_idname)
+        self._items.append(node)
+        node.name = bl_idname[14:] if bl_idname.startswith('CompositorNode') else bl_idname
+        return node
+
+    def _rename(self, node, name):
+        current = node.__dict__.get('name')
+        if self._by_name.get(current) is node:
+            del self._by_name[current]
+        unique = name
+        i = 0
+        while unique in self._by_name:
+            i += 1
+            unique = f"{name}.{i:03d}"
+        self._by_name[unique] = node
+        return unique
+
+    def get(self, key, default=None):
+        return self._by_name.get(key, default)
+
+    def remove(self, node):
+        links = self.tree.links
+        for socket in list(node.inputs._items) + list(node.outputs._items):
+            for link in socket.links:
+                links.remove(link)
+        self._items.remove(node)
+        if self._by_name.get(node.name) is node:
+            del self._by_name[node.name]
+        if self.active is node:
+            self.active = None
+
+    def clear(self):
+        for node in list(self._items):
+            self.remove(node)
+
+
+class InterfaceSocket:
+    def __init__(self, name, in_out, socket_type):
+        self.name = name
+        self.in_out = in_out
+        self.socket_type = socket_type
+        self.item_type = 'SOCKET'
+        self.type = INTERFACE_SOCKET_TYPES.get(socket_type, 'RGBA')
+
+
+class NodeTreeInterface:
+    """Blender 4.0+ 的节点组接口"""
+    def __init__(self):
+        self.items_tree = Collection()
+
+    def new_socket(self, name, in_out='INPUT', socket_type='NodeSocketFloat'):
+        item = InterfaceSocket(name, in_out, socket_type)
+        self.items_tree._items.append(item)
+        return item
+
+    def sockets(self, in_out):
+        return [item for item in self.items_tree if item.in_out == in_out]
+
+
+class NodeTree:
+    def __init__(self, scene, name='Compositing', type='CompositorNodeTree'):
+        self.scene = scene
+        self.name = name
+        self.type = 'COMPOSITING'
+        self.bl_idname = type
+        self.nodes = Nodes(self)
+        self.links = Links(self)
+        self.interface = NodeTreeInterface()
+
+    @property
+    def users(self):
+        # 节点组的用户数：所有节点树中引用它的组节点
+        data = sys.modules['bpy'].data
+        trees = [scene.node_tree for scene in data.scenes if scene.node_tree] + list(data.node_groups)
+        return sum(1 for tree in trees for node in tree.nodes
+                   if getattr(node, 'node_tree', None) is self)
+
+
+"""
+场景与视图层
+"""
+class Named:
+    def __init__(self, name='', **kwargs):
+        self.name = name
+        self.__dict__.update(kwargs)
+
+    def __setattr__(self, key, value):
+        object.__setattr__(self, key, value)
+        _touch()
+
+
+class NamedList(Collection):
+    def __init__(self, factory):
+        super().__init__()
+        self._factory = factory
+
+    def new(self, name='', **kwargs):
+        # 与 Blender 一致，重名时加 .001 等后缀
+        base, number = name, 0
+        while name and name in self:
+            number += 1
+            name = f"{base}.{number:03d}"
+        item = self._factory(name, **kwargs)
+        self._items.append(item)
+        _touch()
+        return item
+
+    def add(self, name='', **kwargs):
+        return self.new(name, **kwargs)
+
+    def remove(self, item):
+        self._items.remove(item)
+        _touch()
+
+
+# ViewLayer.use_pass_* -> 渲染层端口标识
+PASS_ATTRS = {
+    'combined': 'Image', 'z': 'Depth', 'mist': 'Mist', 'position': 'Position', 'normal': 'Normal',
+    'vector': 'Vector', 'uv': 'UV', 'object_index': 'IndexOB', 'material_index': 'IndexMA',
+    'diffuse_direct': 'DiffDir', 'diffuse_indirect': 'DiffInd', 'diffuse_color': 'DiffCol',
+    'glossy_direct': 'GlossDir', 'glossy_indirect': 'GlossInd', 'glossy_color': 'GlossCol',
+    'transmission_direct': 'TransDir', 'transmission_indirect': 'TransInd',
+    'transmission_color': 'TransCol', 'emit': 'Emit', 'environment': 'Env',
+    'ambient_occlusion': 'AO', 'shadow_catcher': 'Shadow Catcher',
+}
+
+
+class ViewLayer:
+    def __init__(self, name=''):
+        self.name = name
+        self.use = True
+        self.aovs = NamedList(lambda name='', type='COLOR': Named(name, type=type))
+        self.lightgroups = NamedList(lambda name='': Named(name))
+        self.cycles = IDProps(denoising_store_passes=0)
+        self.passes = {'Image', 'Alpha'}
+        self.pass_cryptomatte_depth = 6
+        self.use_pass_cryptomatte_object = False
+        self.use_pass_cryptomatte_material = False
+        self.use_pass_cryptomatte_asset = False
+
+    def __getattr__(self, attr):
+        if attr.startswith('use_pass_') and attr[9:] in PASS_ATTRS:
+            return PASS_ATTRS[attr[9:]] in self.passes
+        raise AttributeError(attr)
+
+    def __setattr__(self, attr, value):
+        if attr.startswith('use_pass_') and attr[9:] in PASS_ATTRS:
+            identifier = PASS_ATTRS[attr[9:]]
+            if value:
+                self.passes.add(identifier)
+            else:
+                self.passes.discard(identifier)
+        else:
+            object.__setattr__(self, attr, value)
+        _touch()
+
+    def pass_enabled(self, identifier):
+        if identifier in DENOISING_PASSES:
+            return bool(self.cycles.get('denoising_store_passes'))
+        if identifier.startswith('Crypto'):
+            for kind, prefix in CRYPTO_PREFIXES.items():
+                if identifier.startswith(prefix) and getattr(self, 'use_pass_cryptomatte_' + kind):
+                    # 每个端口包含两层
+                    return int(identifier[-2:]) < (self.pass_cryptomatte_depth + 1) // 2
+            return False
+        return identifier in self.passes
+
+
+class Render:
+    def __init__(self):
+        self.engine = 'CYCLES'
+        self.fps = 24
+        self.resolution_x = 1920
+        self.resolution_y = 1080
+        self.resolution_percentage = 100
+        # Blender 新场景的输出格式
+        self.image_settings = ImageFormat()
+        self.image_settings.file_format = 'PNG'
+        self.image_settings.color_depth = '8'
+
+
+class Scene:
+    def __init__(self, name='Scene'):
+        self.name = name
+        # 与 Blender 一致：第一次启用节点合成器时才创建节点树
+        self.node_tree = None
+        self._use_nodes = False
+        self.view_layers = NamedList(lambda name='': ViewLayer(name))
+        self.view_layers.new('ViewLayer')
+        self.cycles = IDProps(use_denoising=1)
+        self.camera = None
+        self.render = Render()
+        self.frame_start = 1
+        self.frame_end = 250
+        self._props = {}
+
+    @property
+    def use_nodes(self):
+        return self._use_nodes
+
+    @use_nodes.setter
+    def use_nodes(self, value):
+        self._use_nodes = bool(value)
+        if self._use_nodes and self.node_tree is None:
+            self.node_tree = NodeTree(self)
+
+    def get(self, key, default=None):
+        return self._props.get(key, default)
+
+    def __getitem__(self, key):
+        return self._props[key]
+
+    def __setitem__(self, key, value):
+        self._props[key] = value
+
+
+class Text:
+    def __init__(self, name=''):
+        self.name = name
+        self._body = []
+
+    def clear(self):
+        self._body = []
+
+    def write(self, text):
+        self._body.append(text)
+
+    def as_string(self):
+        return ''.join(self._body)
+
+
+"""
+安装与加载
+"""
+def _type_base(name):
+    class Base:
+        def report(self, kind, message):
+            REPORTS.append((set(kind), message))
+    Base.__name__ = name
+    return Base
+
+
+# 操作符 report() 的记录
+REPORTS = []
+
+
+class WindowManager:
+    """记录模态操作符的进度与计时器"""
+    def __init__(self):
+        self.progress = None
+        self.timers = []
+        self.handlers = []
+
+    def progress_begin(self, low, high):
+        self.progress = low
+
+    def progress_update(self, value):
+        self.progress = value
+
+    def progress_end(self):
+        self.progress = None
+
+    def event_timer_add(self, time_step, window=None):
+        timer = types.SimpleNamespace(time_step=time_step)
+        self.timers.append(timer)
+        return timer
+
+    def event_timer_remove(self, timer):
+        self.timers.remove(timer)
+
+    def modal_handler_add(self, operator):
+        self.handlers.append(operator)
+
+
+def install():
+    """在 sys.modules 中注册 bpy 替身，重复调用返回同一个模块"""
+    if getattr(sys.modules.get('bpy'), '_is_fake', False):
+        return sys.modules['bpy']
+
+    bpy = types.ModuleType('bpy')
+    bpy._is_fake = True
+    scene = Scene()
+    scenes = NamedList(lambda name='': Scene(name))
+    scenes._items.append(scene)
+    bpy.data = types.SimpleNamespace(filepath='', scenes=scenes,
+                                     texts=NamedList(lambda name='': Text(name)),
+                                     node_groups=NamedList(
+                                         lambda name='', type='CompositorNodeTree': NodeTree(None, name, type)))
+    bpy.context = types.SimpleNamespace(
+        scene=scene,
+        view_layer=scene.view_layers[0],
+        preferences=types.SimpleNamespace(
+            view=types.SimpleNamespace(ui_scale=1.0, language='en_US'),
+            system=types.SimpleNamespace(ui_scale=1.0, pixel_size=1.0)),
+        screen=None, window=None, area=None,
+        window_manager=WindowManager(),
+        workspace=types.SimpleNamespace(status_text=None),
+    )
+    bpy.context.workspace.status_text_set = \
+        lambda text: setattr(bpy.context.workspace, 'status_text', text)
+    bpy.path = types.SimpleNamespace(abspath=lambda path: path)
+    bpy.app = types.SimpleNamespace(
+        background=True, version=(4, 2, 0), version_string='4.2.0 (fake)',
+        handlers=types.SimpleNamespace(depsgraph_update_post=[], load_post=[], load_pre=[], undo_pre=[]),
+        timers=types.SimpleNamespace(register=lambda *a, **kw: None,
+                                     unregister=lambda *a, **kw: None,
+                                     is_registered=lambda *a, **kw: False))
+    bpy.ops = types.SimpleNamespace(wm=types.SimpleNamespace(save_mainfile=lambda **kw: {'FINISHED'}))
+
+    types_module = types.ModuleType('bpy.types')
+    for name in ('PropertyGroup', 'Operator', 'Panel', 'UIList', 'Menu', 'Node'):
+        setattr(types_module, name, _type_base(name))
+    types_module.Scene = Scene
+    types_module.ViewLayer = ViewLayer
+    types_module.NodeTree = NodeTree
+    bpy.types = types_module
+
+    props_module = types.ModuleType('bpy.props')
+    for name in ('StringProperty', 'IntProperty', 'FloatProperty', 'BoolProperty', 'EnumProperty',
+                 'FloatVectorProperty', 'PointerProperty', 'CollectionProperty'):
+        setattr(props_module, name, lambda _kind=name, **kwargs: Prop(_kind, kwargs))
+    bpy.props = props_module
+    bpy.utils = types.SimpleNamespace(register_class=lambda cls: None,
+                                      unregister_class=lambda cls: None)
+
+    extras = types.ModuleType('bpy_extras')
+    io_utils = types.ModuleType('bpy_extras.io_utils')
+
+    class ExportHelper:
+        filepath = ''
+    io_utils.ExportHelper = ExportHelper
+    extras.io_utils = io_utils
+    view3d_utils = types.ModuleType('bpy_extras.view3d_utils')
+    view3d_utils.location_3d_to_region_2d = view3d_utils.region_2d_to_location_3d = lambda *args: None
+    extras.view3d_utils = view3d_utils
+
+    mathutils = types.ModuleType('mathutils')
+    mathutils.Vector = tuple
+
+    # 灯光组视口绘制用到的模块，只需能够导入（插件包的 __init__ 会导入 LightGroupMananger）
+    gpu = types.ModuleType('gpu')
+    gpu_extras = types.ModuleType('gpu_extras')
+    batch = types.ModuleType('gpu_extras.batch')
+    batch.batch_for_shader = lambda *args, **kwargs: None
+    gpu_extras.batch = batch
+
+    sys.modules.update({
+        'bpy': bpy, 'bpy.types': types_module, 'bpy.props': props_module,
+        'bpy_extras': extras, 'bpy_extras.io_utils': io_utils, 'bpy_extras.view3d_utils': view3d_utils,
+        'mathutils': mathutils, 'gpu': gpu, 'gpu_extras': gpu_extras, 'gpu_extras.batch': batch,
+    })
+    return bpy
+
+
+def load_addon(name='flash_aov', path=None,
+               modules=('CompositorPlan', 'CompositorOutfileSet', 'OutputConfig', 'main')):
+    """以包的形式导入插件模块（不执行 __init__，无需 gpu 等模块），返回包"""
+    install()
+    if path is None:
+        path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    package = sys.modules.get(name)
+    if package is None:
+        package = types.ModuleType(name)
+        package.__path__ = [path]
+        sys.modules[name] = package
+    for module in modules:
+        importlib.import_module(f"{name}.{module}")
+    return package
+
+
+def new_scene(name='Scene'):
+    """新建场景并设为当前场景"""
+    bpy = install()
+    scene = bpy.data.scenes.new(name)
+    bpy.context.scene = scene
+    bpy.context.view_layer = scene.view_layers[0]
+    return scene
+
+
+def enable_passes(scene, lightgroups=()):
+    """在第一个视图层启用一组常用通道与灯光组，返回该视图层"""
+    view_layer = scene.view_layers[0]
+    view_layer.use_pass_z = True
+    view_layer.use_pass_position = True
+    view_layer.use_pass_normal = True
+    view_layer.use_pass_emit = True
+    view_layer.use_pass_cryptomatte_object = True
+    for name in lightgroups:
+        view_layer.lightgroups.add(name=name)
+    return view_layer
+
+
+def output_nodes(scene):
+    """场景节点树中的输出文件节点（名称 -> 节点）"""
+    return {node.name: node for node in scene.node_tree.nodes if node.type == 'OUTPUT_FILE'}
+
+
+if __name__ == "__main__":
+    # 用替身运行基准测试：python test/fake_bpy.py --layers 1,10,100
+    addon = load_addon(modules=('benchmark',))
+    addon.benchmark.main(sys.argv[1:])
@@ -0,0 +1,20 @@
+"""试运行：不修改节点树，估算与实际操作数一致"""
+import fake_bpy
+from fake_bpy import enable_passes
+
+
+def test_dry_run_matches_configure(addon, scene):
+    OutputConfig = addon.OutputConfig
+    enable_passes(scene)
+    scene.flash_aov.separate_data = True
+
+    report = OutputConfig.preview_scene(scene)
+    assert not scene.use_nodes and scene.node_tree is None
+    assert 'Flash_DryRun.json' not in fake_bpy.install().data.texts
+    compositor, _ = OutputConfig.configure_scene(scene)
+    changes = report['changes']
+    assert len(changes['nodes_created']) == compositor.stats['nodes_created']
+    assert len(changes['slots_added']) == compositor.stats['slots_added']
+    # 近似值：只统计节点、插槽与连接的增删，不含属性写入
+    assert 0 < report['op_estimate'] <= compositor.op_count
+    assert OutputConfig.preview_scene(scene)['op_estimate'] == 0
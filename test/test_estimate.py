@@ -0,0 +1,20 @@
+"""输出估算：按节点、视图层与镜头汇总，配置时不计算"""
+from fake_bpy import enable_passes, output_nodes
+
+
+def test_estimate_lists_every_output_node(addon, scene):
+    OutputConfig = addon.OutputConfig
+    enable_passes(scene)
+    scene.flash_aov.separate_data = True
+    OutputConfig.configure_scene(scene)
+    # 配置不生成估算，由估算操作符按需计算
+    assert scene.name not in OutputConfig.last_estimates
+
+    report = OutputConfig.estimate_scene_output(scene)
+    assert sorted(entry['name'] for entry in report['nodes']) == sorted(output_nodes(scene))
+    assert report['view_layers'] == {'ViewLayer': sum(entry['bytes'] for entry in report['nodes'])}
+    assert report['per_shot'] == report['per_frame'] * report['frames']
+
+    # 重新配置后旧的估算已过期
+    OutputConfig.configure_scene(scene)
+    assert scene.name not in OutputConfig.last_estimates
@@ -0,0 +1,29 @@
+"""分离输出的格式：默认沿用 RGB/Data，单独设置后使用各自的格式"""
+from fake_bpy import enable_passes, output_nodes
+
+
+def test_light_groups_follow_rgb_until_separated(addon, scene):
+    configure_scene = addon.OutputConfig.configure_scene
+    enable_passes(scene, ['key'])
+    flash_aov = scene.flash_aov
+    flash_aov.rgb.exr_color_depth = '16'
+    flash_aov.rgb.exr_codec = 'PIZ'
+
+    configure_scene(scene)
+    fmt = output_nodes(scene)['ViewLayer_lightgroup_OutputFile_Flash'].format
+    assert (fmt.color_depth, fmt.exr_codec) == ('16', 'PIZ')
+
+    flash_aov.lightgroup.use_base_format = False
+    configure_scene(scene)
+    fmt = output_nodes(scene)['ViewLayer_lightgroup_OutputFile_Flash'].format
+    assert (fmt.color_depth, fmt.exr_codec) == ('16', 'DWAA')
+    compositor, _ = configure_scene(scene)
+    assert compositor.op_count == 0, compositor.stats
+
+
+def test_separate_format_defaults(addon, scene):
+    flash_aov = scene.flash_aov
+    defaults = {category: (getattr(flash_aov, category).exr_color_depth, getattr(flash_aov, category).exr_codec)
+                for category in ('cryptomatte', 'shaderaov', 'lightgroup')}
+    assert defaults == {'cryptomatte': ('32', 'ZIP'), 'shaderaov': ('16', 'ZIP'), 'lightgroup': ('16', 'DWAA')}
+    assert all(getattr(flash_aov, category).use_base_format for category in defaults)
@@ -0,0 +1,33 @@
+"""命令行入口：JSON 报告与退出码"""
+import json
+
+
+def test_headless_missing_scene_is_reported(addon, scene, tmp_path):
+    headless = addon.headless
+    path = tmp_path / 'report.json'
+    assert headless.main(['--scene', scene.name, '--scene', 'Missing', '--report', str(path)]) == 1
+    entries = {entry['scene']: entry for entry in json.loads(path.read_text(encoding='utf-8'))['scenes']}
+    assert 'error' not in entries[scene.name]
+    assert entries['Missing']['error'] == "Scene not found: Missing"
+
+
+def test_warnings_go_to_the_report(addon, scene, capsys):
+    headless = addon.headless
+    compositor = addon.OutputConfig.create_compositor(scene)
+    compositor.remove_node_between(None)
+    assert compositor.warnings == ["中间节点为空，无法移除"]
+
+    report = headless.run(headless.parse_args(['--scene', scene.name]))
+    assert report['scenes'][0]['warnings'] == []
+    # 警告只写入报告，标准输出留给 JSON
+    assert capsys.readouterr().out == ''
+
+
+def test_dry_run_keeps_scene_settings(addon, scene):
+    headless = addon.headless
+    flash_aov = scene.flash_aov
+    before = (flash_aov.separate_data, flash_aov.render_name)
+    args = headless.parse_args(['--scene', scene.name, '--dry-run', '--separate-data', '--render-name', 'x_####'])
+    report = headless.run(args)
+    assert 'error' not in report['scenes'][0]
+    assert (flash_aov.separate_data, flash_aov.render_name) == before
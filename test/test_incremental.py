@@ -0,0 +1,55 @@
+"""增量配置：重复运行没有修改，删除的节点在下次运行时修复"""
+import pytest
+
+import fake_bpy
+from fake_bpy import enable_passes, output_nodes
+
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_rerun_reports_no_changes(addon, scene, incremental):
+    configure_scene = addon.OutputConfig.configure_scene
+    enable_passes(scene, ['key'])
+    scene.flash_aov.separate_data = True
+    scene.flash_aov.incremental_update = incremental
+
+    compositor, _ = configure_scene(scene)
+    assert compositor.op_count > 0
+    links = len(scene.node_tree.links)
+
+    compositor, _ = configure_scene(scene)
+    assert compositor.op_count == 0, compositor.stats
+    assert len(scene.node_tree.links) == links
+
+
+def test_rerun_repairs_deleted_node(addon, scene):
+    configure_scene = addon.OutputConfig.configure_scene
+    enable_passes(scene)
+    configure_scene(scene)
+    nodes = scene.node_tree.nodes
+    nodes.remove(nodes['ViewLayer_rgb_OutputFile_Flash'])
+
+    # 失去输出连接的降噪节点在预处理中删除，随输出节点一起重建
+    compositor, _ = configure_scene(scene)
+    assert compositor.stats['nodes_created'] >= 1
+    assert 'ViewLayer_rgb_OutputFile_Flash' in output_nodes(scene)
+    assert scene.node_tree.nodes['ViewLayer_Image_Denoise_Flash'].outputs[0].is_linked
+    compositor, _ = configure_scene(scene)
+    assert compositor.op_count == 0
+
+
+def test_user_node_shift_is_counted(addon):
+    configure_scene = addon.OutputConfig.configure_scene
+    counts = []
+    for name, user_node in (('Plain', False), ('Shifted', True)):
+        scene = fake_bpy.new_scene(name)
+        enable_passes(scene)
+        if user_node:
+            scene.use_nodes = True
+            viewer = scene.node_tree.nodes.new('CompositorNodeViewer')
+            viewer.location = (0, -500)
+        compositor, _ = configure_scene(scene)
+        counts.append(compositor.stats['props_changed'])
+
+    # 下移用户节点同样计入修改数量
+    assert viewer.location.y > 0
+    assert counts[1] == counts[0] + len(compositor.find_user_nodes())
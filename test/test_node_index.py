@@ -0,0 +1,20 @@
+"""_Flash 节点名称解析（FlashNodeIndex）"""
+import pytest
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('Shot_RLayers_Flash', ('Shot', None, 'RLayers')),
+    ('Shot_A_RLayers_Flash', ('Shot_A', None, 'RLayers')),
+    ('Shot_A_rgb-s01_OutputFile_Flash', ('Shot_A', 'rgb-s01', 'OutputFile')),
+    # 视图层名称互为前缀时取最长的已知视图层
+    ('Shot_Position_AxisCorrect_Flash', ('Shot', 'Position', 'AxisCorrect')),
+    ('Shot_A_Position_AxisCorrect_Flash', ('Shot_A', 'Position', 'AxisCorrect')),
+    ('Shot_A_Combined_key_Denoise_Flash', ('Shot_A', 'Combined_key', 'Denoise')),
+    ('Shot_Combined_key_Denoise_Flash', ('Shot', 'Combined_key', 'Denoise')),
+    ('Other_Image_Denoise_Flash', None),
+    ('Render Layers', None),
+    ('Shot_Flash', None),
+])
+def test_flash_node_index_parse(addon, name, expected):
+    index = addon.CompositorOutfileSet.FlashNodeIndex(None, ['Shot', 'Shot_A'])
+    assert index.parse(name) == expected
@@ -0,0 +1,94 @@
+"""规划（build_view_layer_plan/diff_plan）、指纹与分类缓存"""
+
+
+def snapshot(plan_module, name='ViewLayer'):
+    sockets = [('Image', 'Image'), ('Alpha', 'Alpha', True, 'VALUE'), ('Depth', 'Depth', True, 'VALUE'),
+               ('Position', 'Position', True, 'VECTOR'), ('Emit', 'Emit'),
+               ('Denoising Normal', 'Denoising Normal', False, 'VECTOR'),
+               ('Denoising Albedo', 'Denoising Albedo', False),
+               ('CryptoObject00', 'CryptoObject00'), ('CryptoObject01', 'CryptoObject01')]
+    return plan_module.ViewLayerSnapshot(name, sockets, shader_aovs=['mask'], lightgroups=['key'])
+
+
+def tree_state(plan):
+    """与规划完全一致的节点树现状"""
+    state = {'nodes': sorted(plan.node_names()), 'slots': {}, 'sources': {}}
+    for vl_plan in plan.view_layers:
+        routed = {(insert.output, insert.slot): insert for insert in vl_plan.inserts}
+        for output in vl_plan.outputs.values():
+            state['slots'][output.name] = list(output.slots)
+            sources = {}
+            for socket, slot in output.links:
+                insert = routed.get((output.name, slot))
+                if insert is not None:
+                    sources[slot] = (insert.node_names()[-1], 'Image' if insert.kind == 'denoise' else 'Vector')
+                else:
+                    sources[slot] = (vl_plan.render_layer, socket)
+            state['sources'][output.name] = sources
+    return state
+
+
+def test_build_view_layer_plan(addon):
+    plan_module = addon.CompositorPlan
+    vl_plan = plan_module.build_view_layer_plan(snapshot(plan_module), plan_module.PlanSettings(separate_data=1))
+
+    assert set(vl_plan.outputs) == {'rgb', 'data', 'cryptomatte'}
+    rgb = vl_plan.outputs['rgb']
+    assert rgb.name == 'ViewLayer_rgb_OutputFile_Flash'
+    assert rgb.slots[0] == 'rgba' and 'Alpha' not in rgb.slots
+    assert ('Image', 'rgba') in rgb.links
+    # 未分离的 Shader AOV 与灯光组合并到 rgb
+    assert {'shd_mask', 'lgt_key'} <= set(rgb.slots)
+    assert vl_plan.outputs['cryptomatte'].slots == ['CryptoObject00', 'CryptoObject01']
+    assert 'Denoising Normal' not in vl_plan.outputs['data'].slots
+
+    kinds = {(insert.kind, insert.slot) for insert in vl_plan.inserts}
+    assert ('denoise', 'rgba') in kinds and ('denoise', 'Emit') in kinds
+    assert ('axis', 'Position') in kinds
+
+
+def test_fingerprint_ignores_view_layer_name(addon):
+    plan_module = addon.CompositorPlan
+    settings = plan_module.PlanSettings()
+    a = plan_module.build_view_layer_plan(snapshot(plan_module, 'A'), settings)
+    b = plan_module.build_view_layer_plan(snapshot(plan_module, 'B'), settings)
+    assert a.fingerprint == b.fingerprint
+    c = plan_module.build_view_layer_plan(snapshot(plan_module, 'A'), plan_module.PlanSettings(separate_data=1))
+    assert a.fingerprint != c.fingerprint
+
+
+def test_plan_cache_shares_classification(addon):
+    plan_module = addon.CompositorPlan
+    cache = plan_module.PlanCache()
+    settings = plan_module.PlanSettings()
+    plans = [plan_module.build_view_layer_plan(snapshot(plan_module, name), settings, cache)
+             for name in ('A', 'B', 'C')]
+    assert (cache.misses, cache.hits) == (1, 2)
+    assert plans[0].outputs['rgb'].slots == plans[2].outputs['rgb'].slots
+
+
+def test_diff_plan_on_empty_tree(addon):
+    plan_module = addon.CompositorPlan
+    plan = plan_module.build_plan([snapshot(plan_module)], plan_module.PlanSettings())
+    changes = plan_module.diff_plan(plan, {})
+    assert changes['nodes_created'] == sorted(plan.node_names())
+    assert changes['nodes_removed'] == []
+    assert len(changes['inserts']) == len(plan.view_layers[0].inserts)
+
+
+def test_diff_plan_matching_tree_has_no_changes(addon):
+    plan_module = addon.CompositorPlan
+    plan = plan_module.build_plan([snapshot(plan_module)], plan_module.PlanSettings())
+    changes = plan_module.diff_plan(plan, tree_state(plan))
+    assert not any(changes.values())
+
+
+def test_diff_plan_stale_slots_and_nodes(addon):
+    plan_module = addon.CompositorPlan
+    plan = plan_module.build_plan([snapshot(plan_module)], plan_module.PlanSettings())
+    state = tree_state(plan)
+    state['nodes'].append('Old_rgb_OutputFile_Flash')
+    state['slots']['ViewLayer_rgb_OutputFile_Flash'].append('Mist')
+    changes = plan_module.diff_plan(plan, state)
+    assert changes['nodes_removed'] == ['Old_rgb_OutputFile_Flash']
+    assert changes['slots_removed'] == [['ViewLayer_rgb_OutputFile_Flash', 'Mist']]
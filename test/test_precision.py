@@ -0,0 +1,29 @@
+"""逐通道精度策略：位深分配稳定，重复运行没有修改"""
+from fake_bpy import enable_passes, output_nodes
+
+
+def test_precision_policy_is_stable(addon, scene):
+    configure_scene = addon.OutputConfig.configure_scene
+    enable_passes(scene)
+    flash_aov = scene.flash_aov
+    flash_aov.separate_data = True
+    flash_aov.separate_cryptomatte = False
+    flash_aov.precision_policy = True
+    flash_aov.precision_overrides = "Emit=32, Normal=full"
+
+    configure_scene(scene)
+    nodes = output_nodes(scene)
+    assert nodes['ViewLayer_rgb_OutputFile_Flash'].format.color_depth == '16'
+    # Emit 提升到 32 位后与 Cryptomatte 一起放在全精度节点中，Cryptomatte 保持无损
+    full = nodes['ViewLayer_rgb-full_OutputFile_Flash']
+    assert full.format.color_depth == '32'
+    assert {'Emit', 'CryptoObject00'} <= {socket.name for socket in full.inputs}
+
+    compositor, _ = configure_scene(scene)
+    assert compositor.op_count == 0, compositor.stats
+
+    # 单层 EXR 下逐个插槽设置位深，重复运行同样没有修改
+    flash_aov.data.format = 'OPEN_EXR'
+    configure_scene(scene)
+    compositor, _ = configure_scene(scene)
+    assert compositor.op_count == 0, compositor.stats
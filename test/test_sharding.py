@@ -0,0 +1,28 @@
+"""按通道预算拆分多层 EXR：节点名称稳定，关闭后合并"""
+from fake_bpy import enable_passes, output_nodes
+
+
+def test_shard_outputs_are_stable(addon, scene):
+    configure_scene = addon.OutputConfig.configure_scene
+    view_layer = enable_passes(scene, [f"L{i:02d}" for i in range(30)])
+    view_layer.use_pass_diffuse_direct = True
+    scene.render.resolution_x, scene.render.resolution_y = 3840, 2160
+    flash_aov = scene.flash_aov
+    flash_aov.separate_lightgroup = False
+    flash_aov.shard_outputs = True
+    flash_aov.render_name = "{viewlayer}_{type}_{shard}_####"
+
+    configure_scene(scene)
+    nodes = output_nodes(scene)
+    shards = sorted(name for name in nodes if '_rgb-s' in name)
+    assert len(shards) > 1
+    assert shards[0] == 'ViewLayer_rgb-s01_OutputFile_Flash'
+    assert nodes[shards[0]].base_path.endswith('ViewLayer_rgb-s01_s01_####')
+
+    compositor, _ = configure_scene(scene)
+    assert compositor.op_count == 0, compositor.stats
+    assert sorted(output_nodes(scene)) == sorted(nodes)
+
+    flash_aov.shard_outputs = False
+    configure_scene(scene)
+    assert not any('-s0' in name for name in output_nodes(scene))
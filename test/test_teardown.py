@@ -0,0 +1,35 @@
+"""批量拆除：移除全部 _Flash 节点并恢复用户连接"""
+from fake_bpy import enable_passes
+
+
+def test_teardown_restores_user_links(addon, scene):
+    OutputConfig = addon.OutputConfig
+    enable_passes(scene)
+    scene.flash_aov.separate_data = True
+    OutputConfig.configure_scene(scene)
+    tree = scene.node_tree
+    denoise = tree.nodes['ViewLayer_Image_Denoise_Flash']
+    axis = tree.nodes['ViewLayer_Position_AxisCorrect_Flash']
+    viewer = tree.nodes.new('CompositorNodeViewer')
+    composite = tree.nodes.new('CompositorNodeComposite')
+    tree.links.new(denoise.outputs[0], viewer.inputs[0])
+    tree.links.new(axis.outputs[0], composite.inputs[0])
+
+    report = OutputConfig.teardown_scene(scene, keep_render_layers=True)
+
+    assert report['links_restored'] == 2
+    assert report['render_layers_kept'] == 1
+    assert not any(node.name.endswith('_Flash') for node in tree.nodes if node.type != 'R_LAYERS')
+    sources = {(link.from_node.name, link.from_socket.name, link.to_node.name) for link in tree.links}
+    assert sources == {('ViewLayer_RLayers_Flash', 'Image', viewer.name),
+                       ('ViewLayer_RLayers_Flash', 'Position', composite.name)}
+    # 重新配置后旧指纹已清除，视图层完整重建
+    compositor, _ = OutputConfig.configure_scene(scene)
+    assert compositor.skipped_view_layers == []
+    assert 'ViewLayer_Image_Denoise_Flash' in tree.nodes
+
+
+def test_teardown_skips_scene_without_compositor(addon, scene):
+    report = addon.OutputConfig.teardown_scene(scene)
+    assert report['nodes_removed'] == 0
+    assert not scene.use_nodes and scene.node_tree is None